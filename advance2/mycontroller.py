@@ -6,13 +6,16 @@ from time import sleep
 from time import strftime
 import grpc
 
-# Import P4Runtime lib from parent utils dir
+# Import P4Runtime lib from the utils dir shared by the exercises
 # Probably there's a better way of doing this.
 sys.path.append(
     os.path.join(os.path.dirname(os.path.abspath(__file__)),
-                 '../../utils/'))
+                 '../utils/'))
 import p4runtime_lib.bmv2
 import p4runtime_lib.helper
+from p4runtime_lib.counters import CounterPoller
+from p4runtime_lib.session import SwitchSession
+from p4runtime_lib.shadow import ShadowStore
 from p4runtime_lib.error_utils import printGrpcError
 from p4runtime_lib.switch import ShutdownAllSwitchConnections
 
@@ -103,75 +106,70 @@ def writeTunnelRules(p4info_helper, ingress_sw, egress_sw, forward_port, tunnel_
 
 def readTableRules(p4info_helper, sw):
     """
-    Reads the table entries from all tables on the switch.
+    Prints the table entries from all tables on the switch, as recorded by
+    the switch's shadow store (no read from the switch is needed).
 
     :param p4info_helper: the P4Info helper
     :param sw: the switch connection
     """
     print('\n----- Reading tables rules for %s -----' % sw.name)
-    for response in sw.ReadTableEntries():
-        for entity in response.entities:
-            entry = entity.table_entry
-            # TODO For extra credit, you can use the p4info_helper to translate
-            #      the IDs in the entry to names
-            table_name = p4info_helper.get_tables_name(entry.table_id)
-            print('%s: ' % table_name, end='')
-            for i in entry.match:
-                print(p4info_helper.get_match_field_name(table_name, i.field_id), end=' ')
-                print('%r' % (p4info_helper.get_match_field_value(i),), end=' ')
-            action = entry.action.action
-            action_name = p4info_helper.get_actions_name(action.action_id)
-            print('->', action_name, end=' ')
-            for i in action.params:
-                print(p4info_helper.get_action_param_name(action_name, i.param_id), end=' ')
-                print('%r' % i.value, end=' ')
-            # print(entry)
-            # print('-----')
+    for entry in sw.shadow.tableEntries():
+        # TODO For extra credit, you can use the p4info_helper to translate
+        #      the IDs in the entry to names
+        table_name = p4info_helper.get_tables_name(entry.table_id)
+        print('%s: ' % table_name, end='')
+        for i in entry.match:
+            print(p4info_helper.get_match_field_name(table_name, i.field_id), end=' ')
+            print('%r' % (p4info_helper.get_match_field_value(i),), end=' ')
+        action = entry.action.action
+        action_name = p4info_helper.get_actions_name(action.action_id)
+        print('->', action_name, end=' ')
+        for i in action.params:
+            print(p4info_helper.get_action_param_name(action_name, i.param_id), end=' ')
+            print('%r' % i.value, end=' ')
+        # print(entry)
+        # print('-----')
 
 
-def printCounter(p4info_helper, sw, counter_name, index):
+def printCounter(polls, sw, counter_name, index):
     """
-    Reads the specified counter at the specified index from the switch. In our
-    program, the index is the tunnel ID. If the index is 0, it will return all
-    values from the counter.
+    Prints the specified counter at the specified index, as read from the
+    switch by its CounterPoller, with its rates since the previous poll. In
+    our program, the index is the tunnel ID.
 
-    :param p4info_helper: the P4Info helper
+    :param polls: {switch name: CounterPoller.poll() result}
     :param sw:  the switch connection
     :param counter_name: the name of the counter from the P4 program
     :param index: the counter index (in our case, the tunnel ID)
     """
-    for response in sw.ReadCounters(p4info_helper.get_counters_id(counter_name), index):
-        for entity in response.entities:
-            counter = entity.counter_entry
-            print("%s %s %d: %d packets (%d bytes)" % (
-                sw.name, counter_name, index,
-                counter.data.packet_count, counter.data.byte_count
-            ))
-def logCounterToFile(p4info_helper, sw1,sw2, counter_name1,counter_name2, index1,index2, filename):
+    snapshot, rates = polls[sw.name]
+    line = "%s %s %d: %d packets (%d bytes)" % (
+        sw.name, counter_name, index,
+        snapshot.packets[counter_name][index], snapshot.bytes[counter_name][index])
+    if rates is not None:
+        packet_rates, byte_rates = rates[counter_name]
+        line += ", %.1f packets/s (%.1f bytes/s)" % (packet_rates[index], byte_rates[index])
+    print(line)
+
+def logCounterToFile(polls, sw1,sw2, counter_name1,counter_name2, index1,index2, file):
     """
-    Reads the specified counter at the specified index from the switch and logs it to a file.
+    Logs the specified counters at the specified indexes, as read from the
+    switches by their CounterPoller, to an open file.
     """
-    with open(filename, "a") as file:
-        for response in sw1.ReadCounters(p4info_helper.get_counters_id(counter_name1), index1):
-            for entity in response.entities:
-                counter = entity.counter_entry
-                file.write(f"\n {sw1.name} -> {sw2.name} \n{sw1.name}send{counter.data.packet_count}packages,num:{index1}\n")
-        for response in sw2.ReadCounters(p4info_helper.get_counters_id(counter_name2), index1):
-            for entity in response.entities:
-                counter = entity.counter_entry
-                file.write(f"{sw2.name}receive{counter.data.packet_count}packages,num:{index1}\n")
-        for response in sw2.ReadCounters(p4info_helper.get_counters_id(counter_name1), index2):
-            for entity in response.entities:
-                counter = entity.counter_entry
-                file.write(f"\n {sw2.name} -> {sw1.name} \n{sw2.name}send{counter.data.packet_count}packages,num:{index2}\n")
-        for response in sw1.ReadCounters(p4info_helper.get_counters_id(counter_name2), index2):
-            for entity in response.entities:
-                counter = entity.counter_entry
-                file.write(f"{sw1.name}receive{counter.data.packet_count}packages,num:{index2}\n")
+    packet_count = polls[sw1.name][0].packets[counter_name1][index1]
+    file.write(f"\n {sw1.name} -> {sw2.name} \n{sw1.name}send{packet_count}packages,num:{index1}\n")
+    packet_count = polls[sw2.name][0].packets[counter_name2][index1]
+    file.write(f"{sw2.name}receive{packet_count}packages,num:{index1}\n")
+    packet_count = polls[sw2.name][0].packets[counter_name1][index2]
+    file.write(f"\n {sw2.name} -> {sw1.name} \n{sw2.name}send{packet_count}packages,num:{index2}\n")
+    packet_count = polls[sw1.name][0].packets[counter_name2][index2]
+    file.write(f"{sw1.name}receive{packet_count}packages,num:{index2}\n")
+    file.flush()
 
 def main(p4info_file_path, bmv2_file_path):
     # Instantiate a P4Runtime helper from the p4info file
     p4info_helper = p4runtime_lib.helper.P4InfoHelper(p4info_file_path)
+    sessions = {}
 
     try:
         # Create a switch connection object for s1 and s2;
@@ -181,23 +179,28 @@ def main(p4info_file_path, bmv2_file_path):
             name='s1',
             address='127.0.0.1:50051',
             device_id=0,
-            proto_dump_file='logs/s1-p4runtime-requests.txt')
+            proto_dump_file='logs/s1-p4runtime-requests.txt',
+            shadow=ShadowStore(p4info_helper))
         s2 = p4runtime_lib.bmv2.Bmv2SwitchConnection(
             name='s2',
             address='127.0.0.1:50052',
             device_id=1,
-            proto_dump_file='logs/s2-p4runtime-requests.txt')
+            proto_dump_file='logs/s2-p4runtime-requests.txt',
+            shadow=ShadowStore(p4info_helper))
         s3 = p4runtime_lib.bmv2.Bmv2SwitchConnection(
             name='s3',
             address='127.0.0.1:50053',
             device_id=2,
-            proto_dump_file='logs/s3-p4runtime-requests.txt')
+            proto_dump_file='logs/s3-p4runtime-requests.txt',
+            shadow=ShadowStore(p4info_helper))
 
         # Send master arbitration update message to establish this controller as
-        # master (required by P4Runtime before performing any other write operation)
-        s1.MasterArbitrationUpdate()
-        s2.MasterArbitrationUpdate()
-        s3.MasterArbitrationUpdate()
+        # master (required by P4Runtime before performing any other write operation).
+        # The sessions then reconnect to the switches if they restart, and
+        # push the program and the rules written below again.
+        pipeline = dict(p4info=p4info_helper.p4info, bmv2_json_file_path=bmv2_file_path)
+        for sw in (s1, s2, s3):
+            sessions[sw.name] = SwitchSession(sw, pipeline=pipeline).start()
 
         # Install the P4 program on the switches
         s1.SetForwardingPipelineConfig(p4info=p4info_helper.p4info,
@@ -243,37 +246,50 @@ def main(p4info_file_path, bmv2_file_path):
         counter_log_filename1 = "S1S2.txt"
         counter_log_filename2 = "S1S3.txt"
         counter_log_filename3 = "S2S3.txt"
-        while True:
-            sleep(2)
-            print('\n----- Reading tunnel counters -----\n')
-            print('\n----- s1 -> s2 -----\n')
-            printCounter(p4info_helper, s1, "MyIngress.ingressTunnelCounter", 100)
-            printCounter(p4info_helper, s2, "MyIngress.egressTunnelCounter", 100)
-            print('\n----- s2 -> s1 -----\n')
-            printCounter(p4info_helper, s2, "MyIngress.ingressTunnelCounter", 200)
-            printCounter(p4info_helper, s1, "MyIngress.egressTunnelCounter", 200)
-            print('\n----- s1 -> s3 -----\n')
-            printCounter(p4info_helper, s1, "MyIngress.ingressTunnelCounter", 300)
-            printCounter(p4info_helper, s3, "MyIngress.egressTunnelCounter", 300)
-            print('\n----- s3 -> s1 -----\n')
-            printCounter(p4info_helper, s3, "MyIngress.ingressTunnelCounter", 400)
-            printCounter(p4info_helper, s1, "MyIngress.egressTunnelCounter", 400)
-            print('\n----- s2 -> s3 -----\n')
-            printCounter(p4info_helper, s2, "MyIngress.ingressTunnelCounter", 500)
-            printCounter(p4info_helper, s3, "MyIngress.egressTunnelCounter", 500)
-            print('\n----- s3 -> s2 -----\n')
-            printCounter(p4info_helper, s3, "MyIngress.ingressTunnelCounter", 600)
-            printCounter(p4info_helper, s2, "MyIngress.egressTunnelCounter", 600)
-            print('\n------------ Finished ------------\n')
-            logCounterToFile(p4info_helper, s1,s2,"ingressTunnelCounter","egressTunnelCounter",100, 200, counter_log_filename1)
-            logCounterToFile(p4info_helper, s1,s3,"ingressTunnelCounter","egressTunnelCounter",300, 400, counter_log_filename2)
-            logCounterToFile(p4info_helper, s2,s3,"ingressTunnelCounter","egressTunnelCounter",500, 600, counter_log_filename3)
+        counter_names = ["MyIngress.ingressTunnelCounter", "MyIngress.egressTunnelCounter"]
+        # Each poller reads both counter arrays of its switch in one request
+        pollers = dict((sw.name, CounterPoller(sw, p4info_helper, counter_names))
+                       for sw in (s1, s2, s3))
+        with open(counter_log_filename1, "a") as log1, \
+                open(counter_log_filename2, "a") as log2, \
+                open(counter_log_filename3, "a") as log3:
+            while True:
+                sleep(2)
+                # One read per switch, shared by the printed and logged
+                # values below
+                polls = dict((name, sessions[name].call(poller.poll))
+                             for name, poller in pollers.items())
+                print('\n----- Reading tunnel counters -----\n')
+                print('\n----- s1 -> s2 -----\n')
+                printCounter(polls, s1, "MyIngress.ingressTunnelCounter", 100)
+                printCounter(polls, s2, "MyIngress.egressTunnelCounter", 100)
+                print('\n----- s2 -> s1 -----\n')
+                printCounter(polls, s2, "MyIngress.ingressTunnelCounter", 200)
+                printCounter(polls, s1, "MyIngress.egressTunnelCounter", 200)
+                print('\n----- s1 -> s3 -----\n')
+                printCounter(polls, s1, "MyIngress.ingressTunnelCounter", 300)
+                printCounter(polls, s3, "MyIngress.egressTunnelCounter", 300)
+                print('\n----- s3 -> s1 -----\n')
+                printCounter(polls, s3, "MyIngress.ingressTunnelCounter", 400)
+                printCounter(polls, s1, "MyIngress.egressTunnelCounter", 400)
+                print('\n----- s2 -> s3 -----\n')
+                printCounter(polls, s2, "MyIngress.ingressTunnelCounter", 500)
+                printCounter(polls, s3, "MyIngress.egressTunnelCounter", 500)
+                print('\n----- s3 -> s2 -----\n')
+                printCounter(polls, s3, "MyIngress.ingressTunnelCounter", 600)
+                printCounter(polls, s2, "MyIngress.egressTunnelCounter", 600)
+                print('\n------------ Finished ------------\n')
+                logCounterToFile(polls, s1,s2,"MyIngress.ingressTunnelCounter","MyIngress.egressTunnelCounter",100, 200, log1)
+                logCounterToFile(polls, s1,s3,"MyIngress.ingressTunnelCounter","MyIngress.egressTunnelCounter",300, 400, log2)
+                logCounterToFile(polls, s2,s3,"MyIngress.ingressTunnelCounter","MyIngress.egressTunnelCounter",500, 600, log3)
 
     except KeyboardInterrupt:
         print(" Shutting down.")
     except grpc.RpcError as e:
         printGrpcError(e)
 
+    for session in sessions.values():
+        session.close()
     ShutdownAllSwitchConnections()
 
 if __name__ == '__main__':
@@ -2,17 +2,18 @@
 import argparse
 import os
 import sys
+from queue import Queue
 from time import sleep
 from time import strftime
 import grpc
 from scapy.all import Ether, Packet, BitField, raw
 import ipaddress
 
-# Import P4Runtime lib from parent utils dir
+# Import P4Runtime lib from the utils dir shared by the exercises
 # Probably there's a better way of doing this.
 sys.path.append(
     os.path.join(os.path.dirname(os.path.abspath(__file__)),
-                 '../../utils/'))
+                 '../utils/'))
 import p4runtime_lib.bmv2
 import p4runtime_lib.helper
 from p4runtime_lib.switch import ShutdownAllSwitchConnections
@@ -136,32 +137,26 @@ def main(p4info_file_path, bmv2_file_path):
         writeCloneSessionEntry(p4info_helper, s1, 100)
         writeCloneSessionEntry(p4info_helper, s2, 100)
 
+        # Read the stream of every switch in the background and funnel the
+        # PacketIns into one queue, so that reports from all switches are
+        # handled as they arrive
+        packet_ins = Queue()
+        for sw in (s1, s2):
+            sw.StartStreamDispatcher().on(
+                'packet', lambda sw, msg: packet_ins.put((sw, msg)))
+
         print("Waiting for reports...")
         while True:
-            for msg in s1.stream_msg_resp:
-                if (msg.WhichOneof('update') == 'packet'):
-                    packet = Ether(raw(msg.packet.payload))
-                    # Parse CPU header, notify user about the congestion
-                    if packet.type == 0x2333:
-                        errorinfo = ErrorInfo(bytes(packet.load))
-                        print("S1 threshold occurred")
-                        print(f"dst ip addr{str(ipaddress.IPv4Address(errorinfo.src_ip))}")
-                        print(f"tar ip addr{str(ipaddress.IPv4Address(errorinfo.dst_ip))}")
-                        print(f"export{errorinfo.egress_port}")
-                        print(f"current queue threshold{errorinfo.ecn_threshold}")
-            for msg in s2.stream_msg_resp:
-                # Only process PacketIn
-                if (msg.WhichOneof('update') == 'packet'):
-                    packet = Ether(raw(msg.packet.payload))
-                    # Parse CPU header, notify user about the congestion
-                    if packet.type == 0x2333:
-                        errorinfo = ErrorInfo(bytes(packet.load))
-                        print("S2 threshold occurred")
-                        print(f"dst ip addr{str(ipaddress.IPv4Address(errorinfo.src_ip))}")
-                        print(f"tar ip addr{str(ipaddress.IPv4Address(errorinfo.dst_ip))}")
-                        print(f"export{errorinfo.egress_port}")
-                        print(f"current queue threshold{errorinfo.ecn_threshold}")
-            sleep(1)
+            sw, msg = packet_ins.get()
+            packet = Ether(raw(msg.packet.payload))
+            # Parse CPU header, notify user about the congestion
+            if packet.type == 0x2333:
+                errorinfo = ErrorInfo(bytes(packet.load))
+                print("%s threshold occurred" % sw.name.upper())
+                print(f"dst ip addr{str(ipaddress.IPv4Address(errorinfo.src_ip))}")
+                print(f"tar ip addr{str(ipaddress.IPv4Address(errorinfo.dst_ip))}")
+                print(f"export{errorinfo.egress_port}")
+                print(f"current queue threshold{errorinfo.ecn_threshold}")
 
     except KeyboardInterrupt:
         print(" Shutting down.")
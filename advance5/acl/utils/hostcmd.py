@@ -0,0 +1,69 @@
+# Copyright 2017-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Runs shell commands on the Mininet hosts, shared by run_exercise.py and
+the mininet/ scripts."""
+from shlex import quote
+import re
+
+# Max number of hosts whose commands run concurrently
+HOST_JOBS = 64
+
+# Printed by run_commands after each failing command, and once all the
+# commands ran
+FAILED_COMMAND_MARKER = '__p4_command_failed__'
+DONE_MARKER = '__p4_commands_done__'
+
+# The markers are printed on a line of their own, after a newline in case
+# the command output does not end with one
+MARKER_PATTERN = re.compile(r'\r?\n?(%s \d+ \d+|%s)\r?\n' % (FAILED_COMMAND_MARKER, DONE_MARKER))
+
+def run_commands(node, commands):
+    """Runs the shell commands on a Mininet node in order, in a single
+    round trip to its shell, whatever their exit status. Returns the output
+    of the commands and the [(command, exit status)] of the failed ones.
+    Each command is run with eval, so that a syntax error only fails that
+    command (with status 2) instead of the whole batch. Commands ending
+    with & are run in the background and never fail."""
+    commands = [cmd.strip() for cmd in commands if cmd.strip()]
+    if not commands:
+        return '', []
+    batch = []
+    for i, cmd in enumerate(commands):
+        if cmd.endswith('&'):
+            batch.append('eval %s' % quote(cmd))
+        else:
+            batch.append("eval %s || printf '\\n%s %d %%d\\n' $?" % (
+                quote(cmd), FAILED_COMMAND_MARKER, i))
+    batch.append("printf '\\n%s\\n'" % DONE_MARKER)
+    result = node.cmd('; '.join(batch))
+    output = []
+    failed = []
+    done = False
+    pos = 0
+    for match in MARKER_PATTERN.finditer(result):
+        output.append(result[pos:match.start()])
+        pos = match.end()
+        fields = match.group(1).split()
+        if fields[0] == DONE_MARKER:
+            done = True
+        else:
+            failed.append((commands[int(fields[1])], int(fields[2])))
+    output.append(result[pos:])
+    output = ''.join(output)
+    if not done:
+        # The shell did not run the batch to its end
+        raise Exception('Commands failed on %s: %s' % (node.name, output.strip()))
+    return output, failed
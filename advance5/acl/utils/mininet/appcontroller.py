@@ -1,6 +1,8 @@
-import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
+from hostcmd import HOST_JOBS, run_commands
 from shortest_path import ShortestPath
+from switch_cli import SwitchCLIPool
 
 class AppController:
 
@@ -11,6 +13,7 @@ class AppController:
         self.topo = topo
         self.net = net
         self.links = links
+        self.cli_pool = SwitchCLIPool()
 
     def read_entries(self, filename):
         entries = []
@@ -26,15 +29,29 @@ class AppController:
         if sw: thrift_port = sw.thrift_port
 
         print('\n'.join(entries))
-        p = subprocess.Popen(['simple_switch_CLI', '--thrift-port', str(thrift_port)], stdin=subprocess.PIPE)
-        p.communicate(input='\n'.join(entries))
+        results = self.cli_pool.get(thrift_port).run(entries)
+        for r in results:
+            if not r.ok: print('Error in "%s": %s' % (r.command, r.output))
+        return results
 
     def read_register(self, register, idx, thrift_port=9090, sw=None):
         if sw: thrift_port = sw.thrift_port
-        p = subprocess.Popen(['simple_switch_CLI', '--thrift-port', str(thrift_port)], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        stdout, stderr = p.communicate(input="register_read %s %d" % (register, idx))
-        reg_val = [l for l in stdout.split('\n') if ' %s[%d]' % (register, idx) in l][0].split('= ', 1)[1]
-        return int(reg_val)
+        return self.cli_pool.get(thrift_port).register_read(register, idx)
+
+    def read_register_array(self, register, thrift_port=9090, sw=None):
+        "Reads all the cells of a register with a single CLI command"
+        if sw: thrift_port = sw.thrift_port
+        return self.cli_pool.get(thrift_port).register_read(register)
+
+    def configure_host(self, host_name, cmds):
+        """Sets the addresses of a host, then runs its configuration commands
+        in one batch. Returns the [(command, exit status)] of the failed ones."""
+        h = self.net.get(host_name)
+        for link in list(self.topo._host_links[host_name].values()):
+            # use mininet to set ip and mac to let it know the change
+            h.setIP(link['host_ip'], 24)
+            h.setMAC(link['host_mac'])
+        return run_commands(h, cmds)[1]
 
     def start(self):
         shortestpath = ShortestPath(self.links)
@@ -52,42 +69,51 @@ class AppController:
             #    'table_set_default forward _drop',
             #    'table_set_default ipv4_lpm _drop']
 
+        # Shell commands configuring each host, run in one batch per host
+        host_cmds = {}
         for host_name in self.topo._host_links:
             h = self.net.get(host_name)
+            cmds = host_cmds[host_name] = []
             for link in list(self.topo._host_links[host_name].values()):
                 sw = link['sw']
                 #entries[sw].append('table_add send_frame rewrite_mac %d => %s' % (link['sw_port'], link['sw_mac']))
                 #entries[sw].append('table_add forward set_dmac %s => %s' % (link['host_ip'], link['host_mac']))
                 #entries[sw].append('table_add ipv4_lpm set_nhop %s/32 => %s %d' % (link['host_ip'], link['host_ip'], link['sw_port']))
                 iface = h.intfNames()[link['idx']]
-                # use mininet to set ip and mac to let it know the change
-                h.setIP(link['host_ip'], 24)
-                h.setMAC(link['host_mac'])
                 #h.cmd('ifconfig %s %s hw ether %s' % (iface, link['host_ip'], link['host_mac']))
-                h.cmd('arp -i %s -s %s %s' % (iface, link['sw_ip'], link['sw_mac']))
-                h.cmd('ethtool --offload %s rx off tx off' % iface)
-                h.cmd('ip route add %s dev %s' % (link['sw_ip'], iface))
-            h.setDefaultRoute("via %s" % link['sw_ip'])
+                cmds.append('arp -i %s -s %s %s' % (iface, link['sw_ip'], link['sw_mac']))
+                cmds.append('ethtool --offload %s rx off tx off' % iface)
+                cmds.append('ip route add %s dev %s' % (link['sw_ip'], iface))
+            # as done by h.setDefaultRoute, there may be no default route yet
+            cmds.append('ip route del default 2>/dev/null; ip route add default via %s' % link['sw_ip'])
 
+        # Hosts are never used as intermediate hops
+        next_hops = shortestpath.allPairs(exclude=lambda n: n[0]=='h')
         for h in self.net.hosts:
             h_link = list(self.topo._host_links[h.name].values())[0]
             for sw in self.net.switches:
-                path = shortestpath.get(sw.name, h.name, exclude=lambda n: n[0]=='h')
-                if not path: continue
-                if not path[1][0] == 's': continue # next hop is a switch
-                sw_link = self.topo._sw_links[sw.name][path[1]]
+                next_hop = next_hops.get(sw.name, {}).get(h.name)
+                if not next_hop: continue
+                if not next_hop[0] == 's': continue # next hop is a switch
+                sw_link = self.topo._sw_links[sw.name][next_hop]
                 #entries[sw.name].append('table_add send_frame rewrite_mac %d => %s' % (sw_link[0]['port'], sw_link[0]['mac']))
                 #entries[sw.name].append('table_add forward set_dmac %s => %s' % (h_link['host_ip'], sw_link[1]['mac']))
                 #entries[sw.name].append('table_add ipv4_lpm set_nhop %s/32 => %s %d' % (h_link['host_ip'], h_link['host_ip'], sw_link[0]['port']))
 
             for h2 in self.net.hosts:
                 if h == h2: continue
-                path = shortestpath.get(h.name, h2.name, exclude=lambda n: n[0]=='h')
-                if not path: continue
-                h_link = self.topo._host_links[h.name][path[1]]
+                next_hop = next_hops.get(h.name, {}).get(h2.name)
+                if not next_hop: continue
+                h_link = self.topo._host_links[h.name][next_hop]
                 h2_link = list(self.topo._host_links[h2.name].values())[0]
-                h.cmd('ip route add %s via %s' % (h2_link['host_ip'], h_link['sw_ip']))
+                host_cmds[h.name].append('ip route add %s via %s' % (h2_link['host_ip'], h_link['sw_ip']))
 
+        # The hosts are configured concurrently
+        with ThreadPoolExecutor(max_workers=max(1, min(len(host_cmds), HOST_JOBS))) as executor:
+            results = executor.map(self.configure_host, host_cmds.keys(), host_cmds.values())
+            for host_name, failed in zip(host_cmds, results):
+                for cmd, status in failed:
+                    print('Error on %s in "%s": exit status %d' % (host_name, cmd, status))
 
         print("**********")
         print("Configuring entries in p4 tables")
@@ -101,4 +127,4 @@ class AppController:
         print("**********")
 
     def stop(self):
-        pass
+        self.cli_pool.close()
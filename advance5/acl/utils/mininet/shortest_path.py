@@ -1,33 +1,140 @@
+from collections import deque
+import heapq
+
 class ShortestPath:
+    """Shortest paths over an undirected graph.
+
+    Unweighted graphs are searched with BFS; once any edge has a weight (e.g.
+    a link latency) Dijkstra is used instead, with unweighted edges counting
+    as 1. The shortest path tree of each source is computed once and cached
+    until the edges change, so repeated get() calls are cheap and allPairs()
+    gives the next-hop table of the whole graph, also cached.
+
+    `exclude` is either a function of a node or a collection of nodes. Pass
+    a collection (or the same function each time) so that the excluded set
+    is not computed again on every call.
+    """
 
     def __init__(self, edges=[]):
         self.neighbors = {}
+        self.weights = {}
+        self.invalidate()
         for edge in edges:
             self.addEdge(*edge)
 
-    def addEdge(self, a, b):
+    def addEdge(self, a, b, weight=None):
         if a not in self.neighbors: self.neighbors[a] = []
         if b not in self.neighbors[a]: self.neighbors[a].append(b)
 
         if b not in self.neighbors: self.neighbors[b] = []
         if a not in self.neighbors[b]: self.neighbors[b].append(a)
 
-    def get(self, a, b, exclude=lambda node: False):
-        # Shortest path from a to b
-        return self._recPath(a, b, [], exclude)
-
-    def _recPath(self, a, b, visited, exclude):
+        if weight is not None:
+            self.weights[(a, b)] = weight
+            self.weights[(b, a)] = weight
+        self.invalidate()
+
+    def removeEdge(self, a, b):
+        if a in self.neighbors and b in self.neighbors[a]: self.neighbors[a].remove(b)
+        if b in self.neighbors and a in self.neighbors[b]: self.neighbors[b].remove(a)
+        self.weights.pop((a, b), None)
+        self.weights.pop((b, a), None)
+        self.invalidate()
+
+    def invalidate(self):
+        "Drops all cached shortest path trees and next-hop tables"
+        self._trees = {}
+        self._tables = {}
+        # (exclude function, excluded set) of the last call
+        self._last_exclude = (None, frozenset())
+
+    def get(self, a, b, exclude=None):
+        # Shortest path from a to b. Nodes for which exclude(node) is true are
+        # never used as intermediate hops, but can still be the destination.
         if a == b: return [a]
-        new_visited = visited + [a]
-        paths = []
-        for neighbor in self.neighbors[a]:
-            if neighbor in new_visited: continue
-            if exclude(neighbor) and neighbor != b: continue
-            path = self._recPath(neighbor, b, new_visited, exclude)
-            if path: paths.append(path)
-
-        paths.sort(key=len)
-        return [a] + paths[0] if len(paths) else None
+        parents = self._tree(a, self._excluded(exclude))
+        if b not in parents: return None
+        path = [b]
+        while path[-1] != a:
+            path.append(parents[path[-1]])
+        path.reverse()
+        return path
+
+    def nextHop(self, a, b, exclude=None):
+        path = self.get(a, b, exclude)
+        return path[1] if path and len(path) > 1 else None
+
+    def allPairs(self, exclude=None):
+        """Returns the next-hop table {src: {dst: next_hop}} for every pair of
+        connected nodes. The table is shared between callers, don't modify it."""
+        excluded = self._excluded(exclude)
+        if excluded in self._tables:
+            return self._tables[excluded]
+        table = self._tables[excluded] = {}
+        for a in self.neighbors:
+            parents = self._tree(a, excluded)
+            hops = table[a] = {}
+            for b in parents:
+                if b == a: continue
+                # Walk back towards the source; the last node is the next hop
+                n = b
+                while parents[n] != a:
+                    n = parents[n]
+                hops[b] = n
+        return table
+
+    def _excluded(self, exclude):
+        if exclude is None:
+            return frozenset()
+        if not callable(exclude):
+            return frozenset(exclude)
+        if self._last_exclude[0] is not exclude:
+            self._last_exclude = (exclude, frozenset(n for n in self.neighbors if exclude(n)))
+        return self._last_exclude[1]
+
+    def _tree(self, a, excluded):
+        # The excluded nodes are part of the cache key. The source itself is
+        # never excluded.
+        key = (a, excluded)
+        if key not in self._trees:
+            if self.weights:
+                self._trees[key] = self._dijkstra(a, excluded)
+            else:
+                self._trees[key] = self._bfs(a, excluded)
+        return self._trees[key]
+
+    def _bfs(self, a, excluded):
+        parents = {a: None}
+        if a not in self.neighbors: return parents
+        queue = deque([a])
+        while queue:
+            n = queue.popleft()
+            for neighbor in self.neighbors[n]:
+                if neighbor in parents: continue
+                parents[neighbor] = n
+                if neighbor not in excluded: queue.append(neighbor)
+        return parents
+
+    def _dijkstra(self, a, excluded):
+        parents = {a: None}
+        if a not in self.neighbors: return parents
+        dist = {a: 0}
+        done = set()
+        order = 0 # tie breaker, keeps the neighbor order for equal distances
+        heap = [(0, order, a)]
+        while heap:
+            d, _, n = heapq.heappop(heap)
+            if n in done: continue
+            done.add(n)
+            if n in excluded and n != a: continue
+            for neighbor in self.neighbors[n]:
+                nd = d + self.weights.get((n, neighbor), 1)
+                if neighbor not in dist or nd < dist[neighbor]:
+                    dist[neighbor] = nd
+                    parents[neighbor] = n
+                    order += 1
+                    heapq.heappush(heap, (nd, order, neighbor))
+        return parents
 
 if __name__ == '__main__':
 
@@ -76,3 +183,26 @@ if __name__ == '__main__':
     assert sp.get(1, 7) == None
     assert sp.get(7, 2) == None
 
+    # excluded nodes are only allowed at the ends of the path
+    assert sp.get(2, 5, exclude=lambda n: n == 1) in [[2, 4, 3, 5], [2, 4, 6, 5]]
+    assert sp.get(1, 4, exclude=lambda n: n == 1) in [[1, 2, 4], [1, 3, 4]]
+    assert sp.get(2, 3, exclude=lambda n: n in (1, 4)) == None
+
+    assert sp.allPairs()[2][6] == 4
+    assert sp.allPairs() is sp.allPairs()
+    assert sp.allPairs(exclude={1})[2][5] in (4, None) and 5 not in sp.allPairs(exclude={1, 3, 4, 6})[2]
+    assert sp.nextHop(2, 5) == 1
+
+    # the cached trees are dropped when edges change
+    table = sp.allPairs()
+    sp.removeEdge(1, 5)
+    assert sp.allPairs() is not table and sp.allPairs()[1][5] == 3
+    assert sp.get(2, 5) in [[2, 1, 3, 5], [2, 4, 3, 5], [2, 4, 6, 5]]
+    sp.addEdge(2, 5)
+    assert sp.get(2, 5) == [2, 5]
+
+    # weighted edges use Dijkstra
+    wsp = ShortestPath([(1, 2, 1), (2, 3, 1), (1, 3, 5)])
+    assert wsp.get(1, 3) == [1, 2, 3]
+    wsp.addEdge(1, 3, 1)
+    assert wsp.get(1, 3) == [1, 3]
@@ -0,0 +1,108 @@
+import os
+import re
+import subprocess
+import threading
+from collections import namedtuple
+
+PROMPT = b'RuntimeCmd: '
+
+# Output of one CLI command; ok is False if the CLI reported an error
+CLIResult = namedtuple('CLIResult', ['command', 'output', 'ok'])
+
+error_pattern = re.compile(r'^(Error|Invalid|Exception)|\bError:', re.MULTILINE)
+
+class SwitchCLI:
+    """A long-lived simple_switch_CLI session for one switch.
+
+    Commands are written to the CLI's stdin and their output is read back up
+    to the next prompt, so many commands (or many threads) share a single
+    process and Thrift connection instead of spawning a CLI for each one.
+    """
+
+    def __init__(self, thrift_port=9090, cli='simple_switch_CLI'):
+        self.thrift_port = thrift_port
+        env = dict(os.environ, PYTHONUNBUFFERED='1')
+        self.proc = subprocess.Popen([cli, '--thrift-port', str(thrift_port)],
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                     stderr=subprocess.STDOUT, env=env)
+        self.lock = threading.Lock()
+        self.buf = b''
+        # Skip the banner printed before the first prompt
+        self._read_prompt()
+
+    def _read_prompt(self):
+        fd = self.proc.stdout.fileno()
+        while True:
+            idx = self.buf.find(PROMPT)
+            if idx >= 0:
+                out = self.buf[:idx]
+                self.buf = self.buf[idx + len(PROMPT):]
+                return out.decode('utf-8', 'replace').strip()
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                raise Exception('simple_switch_CLI on thrift port %d exited: %s' % (
+                    self.thrift_port, self.buf.decode('utf-8', 'replace')))
+            self.buf += chunk
+
+    def run(self, commands):
+        """Runs a list of commands and returns a CLIResult for each. The
+        commands are sent in one write and their outputs read back in order."""
+        commands = [c.strip() for c in commands if c.strip()]
+        if not commands:
+            return []
+        with self.lock:
+            self.proc.stdin.write(('\n'.join(commands) + '\n').encode('utf-8'))
+            self.proc.stdin.flush()
+            results = []
+            for command in commands:
+                output = self._read_prompt()
+                results.append(CLIResult(command, output, error_pattern.search(output) is None))
+            return results
+
+    def cmd(self, command):
+        return self.run([command])[0]
+
+    def register_read(self, register, idx=None):
+        """Reads one register cell, or the whole register array (as a list) if
+        idx is None"""
+        if idx is None:
+            result = self.cmd('register_read %s' % register)
+        else:
+            result = self.cmd('register_read %s %d' % (register, idx))
+        for line in result.output.split('\n'):
+            if '= ' not in line: continue
+            name, values = line.split('= ', 1)
+            if idx is None and name.strip() == register:
+                return [int(v) for v in values.split(',') if v.strip()]
+            if idx is not None and name.strip() == '%s[%d]' % (register, idx):
+                return int(values)
+        raise Exception('Could not read register %s: %s' % (register, result.output))
+
+    def close(self):
+        if self.proc.poll() is None:
+            try:
+                self.proc.stdin.close()
+            except OSError:
+                pass
+            self.proc.wait()
+
+class SwitchCLIPool:
+    "Keeps one SwitchCLI session per Thrift port, created on first use"
+
+    def __init__(self, cli='simple_switch_CLI'):
+        self.cli = cli
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def get(self, thrift_port):
+        with self.lock:
+            session = self.sessions.get(thrift_port)
+            if session is None or session.proc.poll() is not None:
+                session = self.sessions[thrift_port] = SwitchCLI(thrift_port, self.cli)
+            return session
+
+    def close(self):
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions = {}
@@ -19,11 +19,9 @@ from mininet.log import setLogLevel, info, error, debug
 from mininet.moduledeps import pathCheck
 from sys import exit
 import os
-import tempfile
-import socket
-from time import sleep
 
-from netstat import check_listening_on_port
+from hostcmd import run_commands
+from netstat import check_listening_on_port, wait_ports_ready
 
 SWITCH_START_TIMEOUT = 10 # seconds
 
@@ -33,14 +31,15 @@ class P4Host(Host):
 
         self.defaultIntf().rename("eth0")
 
-        for off in ["rx", "tx", "sg"]:
-            cmd = "/sbin/ethtool --offload eth0 %s off" % off
-            self.cmd(cmd)
+        # One round trip to the host shell for all the commands
+        commands = ["/sbin/ethtool --offload eth0 %s off" % off
+                    for off in ["rx", "tx", "sg"]]
 
         # disable IPv6
-        self.cmd("sysctl -w net.ipv6.conf.all.disable_ipv6=1")
-        self.cmd("sysctl -w net.ipv6.conf.default.disable_ipv6=1")
-        self.cmd("sysctl -w net.ipv6.conf.lo.disable_ipv6=1")
+        commands += ["sysctl -w net.ipv6.conf.all.disable_ipv6=1",
+                     "sysctl -w net.ipv6.conf.default.disable_ipv6=1",
+                     "sysctl -w net.ipv6.conf.lo.disable_ipv6=1"]
+        run_commands(self, commands)
 
         return r
 
@@ -83,7 +82,7 @@ class P4Switch(Switch):
         self.output = open(logfile, 'w')
         self.thrift_port = thrift_port
         if check_listening_on_port(self.thrift_port):
-            error('%s cannot bind port %d because it is bound by another process\n' % (self.name, self.grpc_port))
+            error('%s cannot bind port %d because it is bound by another process\n' % (self.name, self.thrift_port))
             exit(1)
         self.pcap_dump = pcap_dump
         self.enable_debugger = enable_debugger
@@ -104,17 +103,28 @@ class P4Switch(Switch):
     def setup(cls):
         pass
 
+    @classmethod
+    def batchStartup(cls, switches):
+        """Waits for the switches launched by start() together. Called by
+        Mininet.start once all the switches of the class are launched."""
+        failed = wait_switches_started(switches)
+        if failed:
+            for sw in failed:
+                error("P4 switch {} did not start correctly.\n".format(sw.name))
+            exit(1)
+        for sw in switches:
+            info("P4 switch {} has been started.\n".format(sw.name))
+        return switches
+
+    def ready_port(self):
+        """Port the switch listens on once started. This is only reliable if
+        the Thrift server is started at the end of the init process"""
+        return self.thrift_port
+
     def check_switch_started(self, pid):
-        """While the process is running (pid exists), we check if the Thrift
-        server has been started. If the Thrift server is ready, we assume that
-        the switch was started successfully. This is only reliable if the Thrift
-        server is started at the end of the init process"""
-        while True:
-            if not os.path.exists(os.path.join("/proc", str(pid))):
-                return False
-            if check_listening_on_port(self.thrift_port):
-                return True
-            sleep(0.5)
+        "Waits until the switch process `pid` listens on its ready_port()"
+        self.pid = pid
+        return not wait_switches_started([self])
 
     def start(self, controllers):
         "Start up a new P4 switch"
@@ -138,16 +148,11 @@ class P4Switch(Switch):
             args.append("--log-console")
         info(' '.join(args) + "\n")
 
-        pid = None
-        with tempfile.NamedTemporaryFile() as f:
-            # self.cmd(' '.join(args) + ' > /dev/null 2>&1 &')
-            self.cmd(' '.join(args) + ' >' + self.log_file + ' 2>&1 & echo $! >> ' + f.name)
-            pid = int(f.read())
-        debug("P4 switch {} PID is {}.\n".format(self.name, pid))
-        if not self.check_switch_started(pid):
-            error("P4 switch {} did not start correctly.\n".format(self.name))
-            exit(1)
-        info("P4 switch {} has been started.\n".format(self.name))
+        # Mininet reads the PID of backgrounded commands, waiting for the
+        # switch to listen is left to batchStartup
+        self.cmd(' '.join(args) + ' >' + self.log_file + ' 2>&1 &')
+        self.pid = self.lastPid
+        debug("P4 switch {} PID is {}.\n".format(self.name, self.pid))
 
     def stop(self):
         "Terminate P4 switch."
@@ -163,3 +168,10 @@ class P4Switch(Switch):
     def detach(self, intf):
         "Disconnect a data port"
         assert(0)
+
+def wait_switches_started(switches, timeout=SWITCH_START_TIMEOUT):
+    """Waits until the processes of the switches (their `pid`) listen on
+    their ready_port(). Returns the switches which did not start."""
+    switches = list(switches)
+    failed = wait_ports_ready([(sw.pid, sw.ready_port()) for sw in switches], timeout)
+    return [sw for sw in switches if (sw.pid, sw.ready_port()) in failed]
@@ -47,6 +47,10 @@ def run_command(command):
     log('>', command)
     return os.WEXITSTATUS(os.system(command))
 
+def utils_python_path():
+    "The mininet/ scripts import the modules of this dir (e.g. netstat)"
+    return 'PYTHONPATH="$PYTHONPATH:%s"' % sys.path[0]
+
 class Manifest:
     def __init__(self, program_file, language, target, target_config):
         self.program_file = program_file
@@ -188,7 +192,7 @@ def run_mininet(manifest):
     switch_args.append('--json "%s"' % output_file)
 
     program = '"%s/mininet/single_switch_mininet.py"' % sys.path[0]
-    return run_command('python3 %s %s' % (program, ' '.join(switch_args)))
+    return run_command('%s python3 %s %s' % (utils_python_path(), program, ' '.join(switch_args)))
 
 def run_multiswitch(manifest):
     output_file = run_compile_bmv2(manifest)
@@ -240,7 +244,7 @@ def run_multiswitch(manifest):
     script_args.append('--cli-message "%s"' % message_file)
 
     program = '"%s/mininet/multi_switch_mininet.py"' % sys.path[0]
-    return run_command('python3 %s %s' % (program, ' '.join(script_args)))
+    return run_command('%s python3 %s %s' % (utils_python_path(), program, ' '.join(script_args)))
 
 def run_stf(manifest):
     output_file = run_compile_bmv2(manifest)
@@ -14,14 +14,13 @@
 # limitations under the License.
 #
 
-import sys, os, tempfile, socket
-from time import sleep
+import sys, os
 
 from mininet.node import Switch
 from mininet.moduledeps import pathCheck
 from mininet.log import info, error, debug
 
-from p4_mininet import P4Switch, SWITCH_START_TIMEOUT
+from p4_mininet import P4Switch
 from netstat import check_listening_on_port
 
 class P4RuntimeSwitch(P4Switch):
@@ -89,13 +88,8 @@ class P4RuntimeSwitch(P4Switch):
         self.nanomsg = "ipc:///tmp/bm-{}-log.ipc".format(self.device_id)
 
 
-    def check_switch_started(self, pid):
-        for _ in range(SWITCH_START_TIMEOUT * 2):
-            if not os.path.exists(os.path.join("/proc", str(pid))):
-                return False
-            if check_listening_on_port(self.grpc_port):
-                return True
-            sleep(0.5)
+    def ready_port(self):
+        return self.grpc_port
 
     def start(self, controllers):
         info("Starting P4 switch {}.\n".format(self.name))
@@ -124,14 +118,8 @@ class P4RuntimeSwitch(P4Switch):
         cmd = ' '.join(args)
         info(cmd + "\n")
 
-
-        pid = None
-        with tempfile.NamedTemporaryFile() as f:
-            self.cmd(cmd + ' >' + self.log_file + ' 2>&1 & echo $! >> ' + f.name)
-            pid = int(f.read())
-        debug("P4 switch {} PID is {}.\n".format(self.name, pid))
-        if not self.check_switch_started(pid):
-            error("P4 switch {} did not start correctly.\n".format(self.name))
-            exit(1)
-        info("P4 switch {} has been started.\n".format(self.name))
+        # Waited for by batchStartup, see P4Switch.start
+        self.cmd(cmd + ' >' + self.log_file + ' 2>&1 &')
+        self.pid = self.lastPid
+        debug("P4 switch {} PID is {}.\n".format(self.name, self.pid))
 
@@ -20,8 +20,11 @@
 # environment used by the P4 tutorial.
 #
 import os, sys, json, subprocess, re, argparse
-from time import sleep
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from time import time
 
+from hostcmd import HOST_JOBS, run_commands
 from p4_mininet import P4Switch, P4Host
 
 from mininet.net import Mininet
@@ -30,7 +33,11 @@ from mininet.link import TCLink
 from mininet.cli import CLI
 
 from p4runtime_switch import P4RuntimeSwitch
+# The P4Runtime library is shared by all the exercises, from the utils dir
+# at the top of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../utils/'))
 import p4runtime_lib.simple_controller
+from p4runtime_lib.switch import ConnectionManager
 
 def configureP4Switch(**switch_args):
     """ Helper class that is called by mininet to initialize
@@ -132,6 +139,7 @@ class ExerciseRunner:
 
             switch_json : string // json of the compiled p4 example
             bmv2_exe    : string // name or path of the p4 switch binary
+            program_jobs : int   // max number of switches programmed concurrently
 
             topo : Topo object   // The mininet topology instance
             net : Mininet object // The mininet instance
@@ -150,7 +158,8 @@ class ExerciseRunner:
 
 
     def __init__(self, topo_file, log_dir, pcap_dir,
-                       switch_json, bmv2_exe='simple_switch', quiet=False):
+                       switch_json, bmv2_exe='simple_switch', quiet=False,
+                       program_jobs=None):
         """ Initializes some attributes and reads the topology json. Does not
             actually run the exercise. Use run_exercise() for that.
 
@@ -162,6 +171,8 @@ class ExerciseRunner:
                 switch_json : string  // Path to a compiled p4 json for bmv2
                 bmv2_exe    : string  // Path to the p4 behavioral binary
                 quiet : bool          // Enable/disable script debug messages
+                program_jobs : int    // Max number of switches to program
+                                         concurrently (default: all of them)
         """
 
         self.quiet = quiet
@@ -182,6 +193,9 @@ class ExerciseRunner:
         self.pcap_dir = pcap_dir
         self.switch_json = switch_json
         self.bmv2_exe = bmv2_exe
+        self.program_jobs = program_jobs
+        # [(phase name, seconds)] of the network bring-up, see phase()
+        self.phase_times = []
 
 
     def run_exercise(self):
@@ -189,22 +203,46 @@ class ExerciseRunner:
             and starts the mininet CLI. This is the main method to run after
             initializing the object.
         """
-        # Initialize mininet with the topology specified by the config
-        self.create_network()
-        self.net.start()
-        sleep(1)
-
-        # some programming that must happen after the net has started
-        self.program_hosts()
-        self.program_switches()
-
-        # wait for that to finish. Not sure how to do this better
-        sleep(1)
-
-        self.do_net_cli()
-        # stop right after the CLI is exited
-        self.net.stop()
+        # Each phase returns once it is complete, so the next one can start
+        # right away: the switches listen on their Thrift/gRPC port once
+        # net.start() returns (see P4Switch.batchStartup), host commands
+        # have exited, and the switches have acknowledged their pipeline
+        # and entries.
+        with self.phase('create network'):
+            self.create_network()
+        try:
+            with self.phase('start switches'):
+                self.net.start()
+
+            # some programming that must happen after the net has started
+            with self.phase('program hosts'):
+                self.program_hosts()
+            with self.phase('program switches'):
+                self.program_switches()
+            self.log_phase_times()
+
+            self.do_net_cli()
+        finally:
+            # stop right after the CLI is exited, or a phase failed, so that
+            # no switch process or interface is left behind
+            self.net.stop()
+
+
+    @contextmanager
+    def phase(self, name):
+        """ Times a phase of the network bring-up, see log_phase_times.
+        """
+        started = time()
+        try:
+            yield
+        finally:
+            self.phase_times.append((name, time() - started))
 
+    def log_phase_times(self):
+        total = sum(seconds for _, seconds in self.phase_times)
+        self.logger('Network ready in %.2fs:' % total)
+        for name, seconds in self.phase_times:
+            self.logger('  %-20s %.2fs' % (name, seconds))
 
     def parse_links(self, unparsed_links):
         """ Given a list of links descriptions of the form [node1, node2, latency, bandwidth]
@@ -257,9 +295,10 @@ class ExerciseRunner:
                       switch = defaultSwitchClass,
                       controller = None)
 
-    def program_switch_p4runtime(self, sw_name, sw_dict):
+    def program_switch_p4runtime(self, sw_name, sw_dict, connections=None):
         """ This method will use P4Runtime to program the switch using the
-            content of the runtime JSON file as input.
+            content of the runtime JSON file as input. The connection is
+            taken from the `connections` ConnectionManager if one is given.
         """
         sw_obj = self.net.get(sw_name)
         grpc_port = sw_obj.grpc_port
@@ -273,7 +312,8 @@ class ExerciseRunner:
                 device_id=device_id,
                 sw_conf_file=sw_conf_file,
                 workdir=os.getcwd(),
-                proto_dump_fpath=outfile)
+                proto_dump_fpath=outfile,
+                connections=connections)
 
     def program_switch_cli(self, sw_name, sw_dict):
         """ This method will start up the CLI and use the contents of the
@@ -289,28 +329,89 @@ class ExerciseRunner:
         with open(cli_input_commands, 'r') as fin:
             cli_outfile = '%s/%s_cli_output.log'%(self.log_dir, sw_name)
             with open(cli_outfile, 'w') as fout:
-                subprocess.Popen([cli, '--thrift-port', str(thrift_port)],
-                                 stdin=fin, stdout=fout)
+                # The CLI exits once the switch has processed all the commands
+                returncode = subprocess.call([cli, '--thrift-port', str(thrift_port)],
+                                             stdin=fin, stdout=fout)
+        if returncode != 0:
+            raise Exception('%s exited with status %d, see %s' % (cli, returncode, cli_outfile))
+
+    def program_switch(self, sw_name, sw_dict, connections=None):
+        """ Programs a single switch using the BMv2 CLI and/or P4Runtime.
+        """
+        if 'cli_input' in sw_dict:
+            self.program_switch_cli(sw_name, sw_dict)
+        if 'runtime_json' in sw_dict:
+            self.program_switch_p4runtime(sw_name, sw_dict, connections)
 
     def program_switches(self):
         """ This method will program each switch using the BMv2 CLI and/or
             P4Runtime, depending if any command or runtime JSON files were
-            provided for the switches.
+            provided for the switches. Switches are programmed concurrently,
+            at most self.program_jobs at a time. The P4Runtime connections
+            are shared through a ConnectionManager and shut down once all
+            switches are programmed, so that the exercise controllers can
+            then become master.
         """
-        for sw_name, sw_dict in self.switches.items():
-            if 'cli_input' in sw_dict:
-                self.program_switch_cli(sw_name, sw_dict)
-            if 'runtime_json' in sw_dict:
-                self.program_switch_p4runtime(sw_name, sw_dict)
+        to_program = [(sw_name, sw_dict) for sw_name, sw_dict in self.switches.items()
+                      if 'cli_input' in sw_dict or 'runtime_json' in sw_dict]
+        if not to_program:
+            return
+        max_workers = self.program_jobs or len(to_program)
+
+        def timed_program_switch(sw_name, sw_dict):
+            started = time()
+            self.program_switch(sw_name, sw_dict, connections)
+            return time() - started
+
+        failed = []
+        start = time()
+        with ConnectionManager() as connections, \
+                ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(timed_program_switch, sw_name, sw_dict): sw_name
+                       for sw_name, sw_dict in to_program}
+            for done, future in enumerate(as_completed(futures), 1):
+                sw_name = futures[future]
+                try:
+                    elapsed = future.result()
+                except Exception as e:
+                    failed.append(sw_name)
+                    self.logger('[%d/%d] Failed to program switch %s: %r' % (
+                        done, len(to_program), sw_name, e))
+                else:
+                    self.logger('[%d/%d] Switch %s programmed in %.2fs' % (
+                        done, len(to_program), sw_name, elapsed))
+        self.logger('Programmed %d switch(es) in %.2fs' % (
+            len(to_program) - len(failed), time() - start))
+        if failed:
+            raise Exception('Failed to program switch(es): %s' % ', '.join(sorted(failed)))
 
     def program_hosts(self):
-        """ Execute any commands provided in the topology.json file on each Mininet host
+        """ Execute any commands provided in the topology.json file on each Mininet host.
+            The commands of a host run in order in a single shell invocation,
+            and the hosts are programmed concurrently. Failed commands are
+            logged per host.
         """
-        for host_name, host_info in list(self.hosts.items()):
-            h = self.net.get(host_name)
-            if "commands" in host_info:
-                for cmd in host_info["commands"]:
-                    h.cmd(cmd)
+        to_program = [(host_name, host_info["commands"])
+                      for host_name, host_info in self.hosts.items() if "commands" in host_info]
+        if not to_program:
+            return
+
+        def program_host(host_name, commands):
+            return run_commands(self.net.get(host_name), commands)
+
+        with ThreadPoolExecutor(max_workers=min(len(to_program), HOST_JOBS)) as executor:
+            futures = {executor.submit(program_host, host_name, commands): host_name
+                       for host_name, commands in to_program}
+            for future in as_completed(futures):
+                host_name = futures[future]
+                try:
+                    _, failed = future.result()
+                except Exception as e:
+                    self.logger('Failed to program host %s: %r' % (host_name, e))
+                    continue
+                for cmd, status in failed:
+                    self.logger('Host %s: command "%s" exited with status %d' % (
+                        host_name, cmd, status))
 
 
     def do_net_cli(self):
@@ -369,6 +470,8 @@ def get_args():
     parser.add_argument('-j', '--switch_json', type=str, required=False)
     parser.add_argument('-b', '--behavioral-exe', help='Path to behavioral executable',
                                 type=str, required=False, default='simple_switch')
+    parser.add_argument('-J', '--program-jobs', help='Max number of switches to program concurrently',
+                        type=int, required=False, default=None)
     return parser.parse_args()
 
 
@@ -378,7 +481,8 @@ if __name__ == '__main__':
 
     args = get_args()
     exercise = ExerciseRunner(args.topo, args.log_dir, args.pcap_dir,
-                              args.switch_json, args.behavioral_exe, args.quiet)
+                              args.switch_json, args.behavioral_exe, args.quiet,
+                              args.program_jobs)
 
     exercise.run_exercise()
 
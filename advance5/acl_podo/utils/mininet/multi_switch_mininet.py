@@ -144,10 +144,9 @@ def main():
                   host = P4Host,
                   switch = switchClass,
                   controller = None)
+    # Returns once the switches listen on their Thrift port
     net.start()
 
-    sleep(1)
-
     controller = None
     if args.auto_control_plane or 'controller_module' in conf:
         controller = AppController(manifest=manifest, target=args.target,
@@ -18,23 +18,28 @@ from mininet.node import Switch, Host
 from mininet.log import setLogLevel, info, error, debug
 from mininet.moduledeps import pathCheck
 from sys import exit
-from time import sleep
 import os
-import tempfile
-import socket
+
+# Shared with utils/p4_mininet.py: the utils dir must be on the PYTHONPATH
+# (see p4apprunner.py), as it is for run_exercise.py
+from hostcmd import run_commands
+from netstat import wait_ports_ready
+
+SWITCH_START_TIMEOUT = 10 # seconds
 
 class P4Host(Host):
     def config(self, **params):
         r = super(P4Host, self).config(**params)
 
-        for off in ["rx", "tx", "sg"]:
-            cmd = "/sbin/ethtool --offload %s %s off" % (self.defaultIntf().name, off)
-            self.cmd(cmd)
+        # One round trip to the host shell for all the commands
+        commands = ["/sbin/ethtool --offload %s %s off" % (self.defaultIntf().name, off)
+                    for off in ["rx", "tx", "sg"]]
 
         # disable IPv6
-        self.cmd("sysctl -w net.ipv6.conf.all.disable_ipv6=1")
-        self.cmd("sysctl -w net.ipv6.conf.default.disable_ipv6=1")
-        self.cmd("sysctl -w net.ipv6.conf.lo.disable_ipv6=1")
+        commands += ["sysctl -w net.ipv6.conf.all.disable_ipv6=1",
+                     "sysctl -w net.ipv6.conf.default.disable_ipv6=1",
+                     "sysctl -w net.ipv6.conf.lo.disable_ipv6=1"]
+        run_commands(self, commands)
 
         return r
 
@@ -95,19 +100,26 @@ class P4Switch(Switch):
     def setup(cls):
         pass
 
+    @classmethod
+    def batchStartup(cls, switches):
+        """Waits for the switches launched by start() together. Called by
+        Mininet.start once all the switches of the class are launched."""
+        failed = wait_switches_started(switches)
+        if failed:
+            for sw in failed:
+                error("P4 switch {} did not start correctly."
+                      "Check the switch log file.\n".format(sw.name))
+            exit(1)
+        for sw in switches:
+            info("P4 switch {} has been started.\n".format(sw.name))
+        return switches
+
     def check_switch_started(self, pid):
-        """While the process is running (pid exists), we check if the Thrift
-        server has been started. If the Thrift server is ready, we assume that
-        the switch was started successfully. This is only reliable if the Thrift
-        server is started at the end of the init process"""
-        while True:
-            if not os.path.exists(os.path.join("/proc", str(pid))):
-                return False
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(0.5)
-            result = sock.connect_ex(("localhost", self.thrift_port))
-            if result == 0:
-                return  True
+        """Waits until the switch process `pid` accepts connections on its
+        Thrift port. This is only reliable if the Thrift server is started at
+        the end of the init process"""
+        self.pid = pid
+        return not wait_switches_started([self])
 
     def start(self, controllers):
         "Start up a new P4 switch"
@@ -132,18 +144,11 @@ class P4Switch(Switch):
             args.append("--log-console")
         info(' '.join(args) + "\n")
 
-        pid = None
-        with tempfile.NamedTemporaryFile() as f:
-            # self.cmd(' '.join(args) + ' > /dev/null 2>&1 &')
-            self.cmd(' '.join(args) + ' >' + self.log_file + ' 2>&1 & echo $! >> ' + f.name)
-            pid = int(f.read())
-        debug("P4 switch {} PID is {}.\n".format(self.name, pid))
-        sleep(1)
-        if not self.check_switch_started(pid):
-            error("P4 switch {} did not start correctly."
-                  "Check the switch log file.\n".format(self.name))
-            exit(1)
-        info("P4 switch {} has been started.\n".format(self.name))
+        # Mininet reads the PID of backgrounded commands, waiting for the
+        # switch to listen is left to batchStartup
+        self.cmd(' '.join(args) + ' >' + self.log_file + ' 2>&1 &')
+        self.pid = self.lastPid
+        debug("P4 switch {} PID is {}.\n".format(self.name, self.pid))
 
     def stop(self):
         "Terminate P4 switch."
@@ -159,3 +164,11 @@ class P4Switch(Switch):
     def detach(self, intf):
         "Disconnect a data port"
         assert(0)
+
+def wait_switches_started(switches, timeout=SWITCH_START_TIMEOUT):
+    """Waits until the processes of the switches (their `pid`) accept
+    connections on their Thrift port. Returns the switches which did not
+    start."""
+    switches = list(switches)
+    failed = wait_ports_ready([(sw.pid, sw.thrift_port) for sw in switches], timeout)
+    return [sw for sw in switches if (sw.pid, sw.thrift_port) in failed]
@@ -24,7 +24,6 @@ from p4_mininet import P4Switch, P4Host
 
 import argparse
 from subprocess import PIPE, Popen
-from time import sleep
 
 parser = argparse.ArgumentParser(description='Mininet demo')
 parser.add_argument('--behavioral-exe', help='Path to behavioral executable',
@@ -104,8 +103,6 @@ def main():
         h = net.get('h%d' % (n + 1))
         h.describe(sw_addr[n], sw_mac[n])
 
-    sleep(1)
-
     if args.switch_config is not None:
         print()
         print("Reading switch configuration script:", args.switch_config)
@@ -113,7 +110,9 @@ def main():
             switch_config = config_file.read()
 
         print("Configuring switch...")
-        proc = Popen(["simple_switch_CLI"], stdin=PIPE)
+        # Returns once the switch has processed all the commands
+        proc = Popen(["simple_switch_CLI", "--thrift-port", str(args.thrift_port)],
+                     stdin=PIPE, universal_newlines=True)
         proc.communicate(input=switch_config)
 
         print("Configuration complete.")
@@ -13,9 +13,83 @@
 # limitations under the License.
 #
 
-import psutil
+import os
+import socket
+from time import monotonic, sleep
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# st column of /proc/net/tcp for listening sockets
+TCP_LISTEN = '0A'
+
+def _check_proc_net_tcp(port):
+    """Looks for a socket listening on `port` in /proc/net/tcp{,6}, without
+    enumerating every connection of the host. Returns None without procfs."""
+    local_port = ':%04X' % port
+    found = False
+    for path in ('/proc/net/tcp', '/proc/net/tcp6'):
+        try:
+            f = open(path)
+        except (IOError, OSError):
+            continue
+        found = True
+        with f:
+            next(f) # header
+            for line in f:
+                fields = line.split(None, 4)
+                if fields[1].endswith(local_port) and fields[3] == TCP_LISTEN:
+                    return True
+    return False if found else None
+
 def check_listening_on_port(port):
+    if port is None:
+        return False
+    listening = _check_proc_net_tcp(port)
+    if listening is not None:
+        return listening
     for c in psutil.net_connections(kind='inet'):
         if c.status == 'LISTEN' and c.laddr[1] == port:
             return True
     return False
+
+def probe_port(port, host='127.0.0.1', timeout=0.1):
+    "Returns True if a TCP connection to host:port is accepted"
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        return sock.connect_ex((host, port)) == 0
+    finally:
+        sock.close()
+
+def port_ready(port):
+    """Returns True once a server accepts connections on `port`: probed with
+    a connection to localhost, falling back to /proc/net/tcp for servers not
+    listening on the loopback interface"""
+    return probe_port(port) or check_listening_on_port(port)
+
+def wait_ports_ready(targets, timeout=10.0, initial_delay=0.005, max_delay=0.1):
+    """Waits until all the processes of `targets`, a list of (pid, port),
+    accept connections on their port. The ports are probed together, first
+    right away then with an exponentially growing delay, so fast starting
+    servers are not waited for longer than needed. Returns the targets which
+    are not ready: those whose process exited, and after `timeout` seconds
+    those still not listening."""
+    pending = list(targets)
+    failed = []
+    deadline = monotonic() + timeout
+    delay = initial_delay
+    while True:
+        waiting = []
+        for pid, port in pending:
+            if pid is not None and not os.path.exists(os.path.join('/proc', str(pid))):
+                failed.append((pid, port))
+            elif not port_ready(port):
+                waiting.append((pid, port))
+        pending = waiting
+        if not pending or monotonic() >= deadline:
+            return failed + pending
+        sleep(min(delay, max(deadline - monotonic(), 0)))
+        delay = min(delay * 2, max_delay)
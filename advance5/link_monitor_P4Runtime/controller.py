@@ -6,13 +6,14 @@ from time import sleep
 
 import grpc
 
-# Import P4Runtime lib from parent utils dir
+# Import P4Runtime lib from the utils dir shared by the exercises
 # Probably there's a better way of doing this.
 sys.path.append(
     os.path.join(os.path.dirname(os.path.abspath(__file__)),
                  '../../utils/'))
 import p4runtime_lib.bmv2
 import p4runtime_lib.helper
+from p4runtime_lib.shadow import ShadowStore
 from p4runtime_lib.switch import ShutdownAllSwitchConnections
 
 def writeIpv4TableRules(p4info_helper, port, sw,
@@ -42,27 +43,26 @@ def writeSwidTableRules(p4info_helper, swid, sw):
 
 def readTableRules(p4info_helper, sw):
     """
-    Reads the table entries from all tables on the switch.
+    Prints the table entries from all tables on the switch, as recorded by
+    the switch's shadow store (no read from the switch is needed).
 
     :param p4info_helper: the P4Info helper
     :param sw: the switch connection
     """
     print('\n----- Reading tables rules for %s -----' % sw.name)
-    for response in sw.ReadTableEntries():
-        for entity in response.entities:
-            entry = entity.table_entry
-            table_name = p4info_helper.get_tables_name(entry.table_id)
-            print('%s: ' % table_name, end=' ')
-            for m in entry.match:
-                print(p4info_helper.get_match_field_name(table_name, m.field_id), end=' ')
-                print('%r' % (p4info_helper.get_match_field_value(m),), end=' ')
-            action = entry.action.action
-            action_name = p4info_helper.get_actions_name(action.action_id)
-            print('->', action_name, end=' ')
-            for p in action.params:
-                print(p4info_helper.get_action_param_name(action_name, p.param_id), end=' ')
-                print('%r' % p.value, end=' ')
-            print()
+    for entry in sw.shadow.tableEntries():
+        table_name = p4info_helper.get_tables_name(entry.table_id)
+        print('%s: ' % table_name, end=' ')
+        for m in entry.match:
+            print(p4info_helper.get_match_field_name(table_name, m.field_id), end=' ')
+            print('%r' % (p4info_helper.get_match_field_value(m),), end=' ')
+        action = entry.action.action
+        action_name = p4info_helper.get_actions_name(action.action_id)
+        print('->', action_name, end=' ')
+        for p in action.params:
+            print(p4info_helper.get_action_param_name(action_name, p.param_id), end=' ')
+            print('%r' % p.value, end=' ')
+        print()
 
 def printGrpcError(e):
     print("gRPC Error:", e.details(), end=' ')
@@ -83,22 +83,26 @@ def main(p4info_file_path, bmv2_file_path):
             name='s1',
             address='127.0.0.1:50051',
             device_id=0,
-            proto_dump_file='logs/s1-link-monitor-requests.txt')
+            proto_dump_file='logs/s1-link-monitor-requests.txt',
+            shadow=ShadowStore(p4info_helper))
         s2 = p4runtime_lib.bmv2.Bmv2SwitchConnection(
             name='s2',
             address='127.0.0.1:50052',
             device_id=1,
-            proto_dump_file='logs/s2-link-monitor-requests.txt')
+            proto_dump_file='logs/s2-link-monitor-requests.txt',
+            shadow=ShadowStore(p4info_helper))
         s3 = p4runtime_lib.bmv2.Bmv2SwitchConnection(
             name='s3',
             address='127.0.0.1:50053',
             device_id=2,
-            proto_dump_file='logs/s3-link-monitor-requests.txt')
+            proto_dump_file='logs/s3-link-monitor-requests.txt',
+            shadow=ShadowStore(p4info_helper))
         s4 = p4runtime_lib.bmv2.Bmv2SwitchConnection(
             name='s4',
             address='127.0.0.1:50054',
             device_id=3,
-            proto_dump_file='logs/s4-link-monitor-requests.txt')
+            proto_dump_file='logs/s4-link-monitor-requests.txt',
+            shadow=ShadowStore(p4info_helper))
 
         # Send master arbitration update message to establish this controller as
         # master (required by P4Runtime before performing any other write operation)
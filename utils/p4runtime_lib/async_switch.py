@@ -0,0 +1,267 @@
+# Copyright 2017-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import asyncio
+from time import monotonic
+
+import grpc
+from grpc import aio
+from p4.v1 import p4runtime_pb2
+from p4.v1 import p4runtime_pb2_grpc
+
+from .channel import CHANNEL_OPTIONS
+from .metrics import recordWriteRequest
+from .switch import SwitchConnectionBase, requestLogger, writeException
+
+# List of all active asyncio connections
+async_connections = []
+
+async def ShutdownAllAsyncSwitchConnections():
+    await asyncio.gather(*[c.shutdown() for c in list(async_connections)])
+
+class AsyncSwitchConnection(SwitchConnectionBase):
+    """asyncio version of SwitchConnection, built on grpc.aio.
+
+    The methods mirror SwitchConnection's and send the same requests, but
+    they are coroutines (ReadTableEntries and ReadCounters are async
+    generators), so a single event loop can drive many switches without a
+    thread per switch. Stream messages are read with `async for msg in
+    sw.StreamMessages()`. Must be created from within a running event loop.
+    """
+
+    def __init__(self, name=None, address='127.0.0.1:50051', device_id=0,
+                 proto_dump_file=None, shadow=None, election_id=1, metrics=None):
+        super(AsyncSwitchConnection, self).__init__(name, address, device_id, proto_dump_file, shadow,
+                                                    election_id, metrics)
+        interceptors = _aioInterceptors(AsyncMetricsInterceptor(self.metrics, self.metrics_switch))
+        self.request_logger, self.owns_logger = requestLogger(proto_dump_file)
+        if self.request_logger is not None:
+            interceptors += _aioInterceptors(AsyncGrpcRequestLogger(self.request_logger))
+        # aio channels can't be shared with the pool of the sync connections,
+        # but are tuned the same way
+        self.channel = aio.insecure_channel(self.address, options=CHANNEL_OPTIONS,
+                                            interceptors=interceptors)
+        self.client_stub = p4runtime_pb2_grpc.P4RuntimeStub(self.channel)
+        self.requests_stream = asyncio.Queue()
+        self.stream_msg_resp = self.client_stub.StreamChannel(self._requests())
+        self.closed = False
+        async_connections.append(self)
+
+    async def _requests(self):
+        while True:
+            request = await self.requests_stream.get()
+            if request is None:
+                return
+            yield request
+
+    async def shutdown(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self in async_connections:
+            async_connections.remove(self)
+        self.requests_stream.put_nowait(None)
+        self.stream_msg_resp.cancel()
+        await self.channel.close()
+        if self.owns_logger:
+            self.request_logger.close()
+
+    async def StreamMessages(self):
+        "Yields the StreamMessageResponses received from the switch"
+        while True:
+            msg = await self.stream_msg_resp.read()
+            if msg is aio.EOF:
+                return
+            if msg.HasField('arbitration'):
+                self._onArbitration(msg.arbitration)
+            yield msg
+
+    async def MasterArbitrationUpdate(self, dry_run=False, **kwargs):
+        request = self._arbitrationRequest()
+
+        if dry_run:
+            print("P4Runtime MasterArbitrationUpdate: ", request)
+        else:
+            started = monotonic()
+            self.requests_stream.put_nowait(request)
+            msg = await self.stream_msg_resp.read()
+            if msg is aio.EOF:
+                return None
+            if msg.HasField('arbitration'):
+                self._onArbitration(msg.arbitration)
+            self.metrics.observe('p4runtime_arbitration_seconds', monotonic() - started,
+                                 switch=self.metrics_switch)
+            return msg
+
+    async def SetForwardingPipelineConfig(self, p4info, dry_run=False, skip_unchanged=False,
+                                          reconcile=False, **kwargs):
+        request = self._pipelineConfigRequest(p4info, **kwargs)
+        if dry_run:
+            print("P4Runtime SetForwardingPipelineConfig:", request)
+            return True
+        if skip_unchanged and await self.GetPipelineCookie() == request.config.cookie.cookie:
+            if not reconcile:
+                return False
+            request.action = p4runtime_pb2.SetForwardingPipelineConfigRequest.RECONCILE_AND_COMMIT
+        await self.client_stub.SetForwardingPipelineConfig(request)
+        self._recordPipeline(request)
+        return True
+
+    async def GetPipelineCookie(self):
+        try:
+            response = await self.client_stub.GetForwardingPipelineConfig(
+                self._pipelineCookieRequest())
+        except grpc.RpcError as e:
+            if e.code() in (grpc.StatusCode.FAILED_PRECONDITION,
+                            grpc.StatusCode.NOT_FOUND,
+                            grpc.StatusCode.UNIMPLEMENTED):
+                return None
+            raise
+        if not response.config.HasField('cookie'):
+            return None
+        return response.config.cookie.cookie
+
+    async def WriteTableEntry(self, table_entry, dry_run=False):
+        request = self._tableEntryWriteRequest(table_entry)
+        if dry_run:
+            print("P4Runtime Write:", request)
+        else:
+            await self.client_stub.Write(request)
+            self._recordWrite(request)
+
+    async def WriteUpdates(self, updates, dry_run=False):
+        request = self._writeRequest(updates)
+        if dry_run:
+            print("P4Runtime Write:", request)
+            return
+        try:
+            await self.client_stub.Write(request)
+        except grpc.RpcError as e:
+            write_error = writeException(e, request)
+            if write_error is None:
+                raise
+            self._recordWrite(request, set(idx for idx, _, _ in write_error.errors))
+            raise write_error
+        self._recordWrite(request)
+
+    async def ReadTableEntries(self, table_id=None, dry_run=False):
+        request = self._readTableEntriesRequest(table_id)
+        if dry_run:
+            print("P4Runtime Read:", request)
+        else:
+            async for response in self.client_stub.Read(request):
+                yield response
+
+    async def ReadCounters(self, counter_id=None, index=None, dry_run=False):
+        request = self._readCountersRequest(counter_id, index)
+        if dry_run:
+            print("P4Runtime Read:", request)
+        else:
+            async for response in self.client_stub.Read(request):
+                yield response
+
+    async def ReadCounterArrays(self, counter_ids, dry_run=False):
+        request = self._readCounterArraysRequest(counter_ids)
+        if dry_run:
+            print("P4Runtime Read:", request)
+        else:
+            async for response in self.client_stub.Read(request):
+                yield response
+
+    async def ReadEntities(self, entities, dry_run=False):
+        request = self._readEntitiesRequest(entities)
+        if dry_run:
+            print("P4Runtime Read:", request)
+        else:
+            async for response in self.client_stub.Read(request):
+                yield response
+
+    async def ReadPREEntries(self, dry_run=False):
+        request = self._readPREEntriesRequest()
+        if dry_run:
+            print("P4Runtime Read:", request)
+        else:
+            async for response in self.client_stub.Read(request):
+                yield response
+
+    async def WritePREEntry(self, pre_entry, dry_run=False):
+        request = self._preEntryWriteRequest(pre_entry)
+        if dry_run:
+            print("P4Runtime Write:", request)
+        else:
+            await self.client_stub.Write(request)
+            self._recordWrite(request)
+
+class _UnaryStreamInterceptor(aio.UnaryStreamClientInterceptor):
+    "The unary-stream side of an interceptor, see _aioInterceptors"
+
+    def __init__(self, interceptor):
+        self.interceptor = interceptor
+
+    async def intercept_unary_stream(self, continuation, client_call_details, request):
+        return await self.interceptor.intercept_unary_stream(
+            continuation, client_call_details, request)
+
+def _aioInterceptors(interceptor):
+    """Returns the interceptors to pass to an aio channel for an interceptor
+    of both unary-unary and unary-stream calls: aio channels only register
+    each interceptor object for one kind of call."""
+    return [interceptor, _UnaryStreamInterceptor(interceptor)]
+
+class AsyncGrpcRequestLogger(aio.UnaryUnaryClientInterceptor,
+                             aio.UnaryStreamClientInterceptor):
+    """grpc.aio interceptor logging requests through a GrpcRequestLogger"""
+
+    def __init__(self, logger):
+        self.logger = logger
+
+    async def intercept_unary_unary(self, continuation, client_call_details, request):
+        self.logger.log_message(client_call_details.method, request)
+        return await continuation(client_call_details, request)
+
+    async def intercept_unary_stream(self, continuation, client_call_details, request):
+        self.logger.log_message(client_call_details.method, request)
+        return await continuation(client_call_details, request)
+
+class AsyncMetricsInterceptor(aio.UnaryUnaryClientInterceptor,
+                              aio.UnaryStreamClientInterceptor):
+    "grpc.aio version of metrics.MetricsInterceptor"
+
+    def __init__(self, registry, switch):
+        self.registry = registry
+        self.switch = switch
+
+    async def _record(self, method, started, call):
+        code = (await call.code()).name
+        self.registry.observe('p4runtime_rpc_seconds', monotonic() - started,
+                              switch=self.switch, method=method, code=code)
+        self.registry.inc('p4runtime_rpc_total', switch=self.switch, method=method, code=code)
+
+    async def intercept_unary_unary(self, continuation, client_call_details, request):
+        if not self.registry.enabled:
+            return await continuation(client_call_details, request)
+        method = client_call_details.method
+        if isinstance(method, bytes):
+            method = method.decode()
+        method = method.rsplit('/', 1)[-1]
+        if method == 'Write':
+            recordWriteRequest(self.registry, self.switch, request)
+        started = monotonic()
+        call = await continuation(client_call_details, request)
+        # The status is only read once the call is done
+        call.add_done_callback(
+            lambda call: asyncio.ensure_future(self._record(method, started, call)))
+        return call
+
+    intercept_unary_stream = intercept_unary_unary
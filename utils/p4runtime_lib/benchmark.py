@@ -0,0 +1,339 @@
+# Copyright 2017-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Benchmarks of the control-plane hot paths of p4runtime_lib, run against
+an in-process FakeP4RuntimeServer so that neither Mininet nor BMv2 is needed.
+
+    python3 -m p4runtime_lib.benchmark --entries 1000 10000 100000 --json out.json
+
+For each workload size, reports the entries per second, the p50/p99 latency
+of the individual calls (RPCs, encodings, entry builds and diffs, or the
+WriteRequests sent by the batched paths: WriteBatch, applyDiff and
+program_switch) and, with --memory, the peak memory allocated by Python
+while the benchmark ran (tracemalloc slows the code down, so the rates are
+then lower).
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+from time import perf_counter
+
+import google.protobuf.text_format
+from p4.config.v1 import p4info_pb2
+
+from . import bmv2, helper, reconcile, simple_controller
+from .convert import encode
+from .fake_server import FakeP4RuntimeServer
+from .switch import WriteBatch
+
+TABLE = 'MyIngress.ipv4_lpm'
+ACTION = 'MyIngress.ipv4_forward'
+
+# Single-entry RPCs are only timed on this many entries per workload, larger
+# workloads would take too long one RPC at a time
+RPC_SAMPLES = 10000
+
+def buildP4Info():
+    "Returns the P4Info of the benchmark program: one LPM table and action"
+    p4info = p4info_pb2.P4Info()
+    table = p4info.tables.add()
+    table.preamble.id = 1
+    table.preamble.name = TABLE
+    table.size = 1 << 20
+    match_field = table.match_fields.add()
+    match_field.id = 1
+    match_field.name = 'hdr.ipv4.dstAddr'
+    match_field.bitwidth = 32
+    match_field.match_type = p4info_pb2.MatchField.LPM
+    action = p4info.actions.add()
+    action.preamble.id = 2
+    action.preamble.name = ACTION
+    for param_id, name, bitwidth in ((1, 'dstAddr', 48), (2, 'port', 9)):
+        param = action.params.add()
+        param.id = param_id
+        param.name = name
+        param.bitwidth = bitwidth
+    table.action_refs.add().id = action.preamble.id
+    return p4info
+
+def address(i):
+    return '10.%d.%d.%d' % ((i >> 16) & 0xff, (i >> 8) & 0xff, i & 0xff)
+
+def rule(i):
+    "Returns the runtime JSON table entry of the i-th route"
+    return {
+        'table': TABLE,
+        'match': {'hdr.ipv4.dstAddr': [address(i), 32]},
+        'action_name': ACTION,
+        'action_params': {'dstAddr': '08:00:00:00:%02x:%02x' % ((i >> 8) & 0xff, i & 0xff),
+                          'port': i % 512},
+    }
+
+def buildEntries(p4info_helper, n):
+    entries = []
+    for i in range(n):
+        r = rule(i)
+        entries.append(p4info_helper.buildTableEntry(
+            table_name=r['table'], match_fields={'hdr.ipv4.dstAddr': (address(i), 32)},
+            action_name=r['action_name'], action_params=r['action_params']))
+    return entries
+
+@contextlib.contextmanager
+def timedFlushes(latencies):
+    "Appends the duration of each WriteBatch.Flush sending updates to latencies"
+    flush = WriteBatch.Flush
+
+    def timedFlush(batch):
+        if not batch.updates:
+            return
+        started = perf_counter()
+        flush(batch)
+        latencies.append(perf_counter() - started)
+    WriteBatch.Flush = timedFlush
+    try:
+        yield latencies
+    finally:
+        WriteBatch.Flush = flush
+
+def changedEntries(p4info_helper, n):
+    "Returns the entries of buildEntries, with one route in ten moved to port 511"
+    entries = buildEntries(p4info_helper, n)
+    for entry in entries[::10]:
+        entry.action.action.params[1].value = (511).to_bytes(2, 'big')
+    return entries
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return sorted_values[int(round(p / 100.0 * (len(sorted_values) - 1)))]
+
+
+class Result(object):
+
+    def __init__(self, name, entries, seconds, latencies=(), peak_memory=None):
+        self.name = name
+        self.entries = entries
+        self.seconds = seconds
+        latencies = sorted(latencies)
+        self.p50 = percentile(latencies, 50)
+        self.p99 = percentile(latencies, 99)
+        self.peak_memory = peak_memory
+
+    def toJson(self):
+        return {
+            'name': self.name,
+            'entries': self.entries,
+            'seconds': self.seconds,
+            'entries_per_sec': self.entries / self.seconds if self.seconds else None,
+            'p50_ms': None if self.p50 is None else self.p50 * 1000,
+            'p99_ms': None if self.p99 is None else self.p99 * 1000,
+            'peak_memory_mib': None if self.peak_memory is None else self.peak_memory / 2**20,
+        }
+
+    def __str__(self):
+        def ms(value):
+            return '%9.3f' % (value * 1000) if value is not None else '%9s' % '-'
+        memory = '%9.1f' % (self.peak_memory / 2**20) if self.peak_memory is not None else '%9s' % '-'
+        return '%-28s %9d %12.0f %s %s %s' % (
+            self.name, self.entries, self.entries / self.seconds if self.seconds else 0,
+            ms(self.p50), ms(self.p99), memory)
+
+HEADER = '%-28s %9s %12s %9s %9s %9s' % (
+    'benchmark', 'entries', 'entries/s', 'p50 ms', 'p99 ms', 'peak MiB')
+
+
+class Benchmark(object):
+    "Runs the benchmarks of one workload size against a fake server"
+
+    def __init__(self, server, workdir, n, memory=False):
+        self.server = server
+        self.workdir = workdir
+        self.n = n
+        self.memory = memory
+        self.p4info_path = os.path.join(workdir, 'benchmark.p4info.txt')
+        self.bmv2_json_path = os.path.join(workdir, 'benchmark.json')
+        self.p4info_helper = helper.P4InfoHelper(self.p4info_path)
+        self.results = []
+
+    def measure(self, name, entries, fn):
+        """Runs fn(), which returns the latencies of its calls (or None),
+        and records its Result"""
+        if self.memory:
+            tracemalloc.start()
+        started = perf_counter()
+        latencies = fn() or ()
+        seconds = perf_counter() - started
+        peak_memory = None
+        if self.memory:
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        result = Result(name, entries, seconds, latencies, peak_memory)
+        self.results.append(result)
+        print(result)
+        sys.stdout.flush()
+        return result
+
+    def connect(self):
+        sw = bmv2.Bmv2SwitchConnection(name='bench', address=self.server.address, device_id=0)
+        sw.MasterArbitrationUpdate()
+        return sw
+
+    def resetPipeline(self, sw):
+        sw.SetForwardingPipelineConfig(p4info=self.p4info_helper.p4info,
+                                       bmv2_json_file_path=self.bmv2_json_path)
+
+    def run(self):
+        n = self.n
+        p4info_helper = self.p4info_helper
+
+        def benchEncode():
+            latencies = []
+            for i in range(n):
+                started = perf_counter()
+                encode(address(i), 32)
+                latencies.append(perf_counter() - started)
+            return latencies
+        self.measure('convert.encode', n, benchEncode)
+
+        def benchBuild():
+            latencies = []
+            for i in range(min(n, RPC_SAMPLES)):
+                r = rule(i)
+                started = perf_counter()
+                p4info_helper.buildTableEntry(
+                    table_name=TABLE, match_fields={'hdr.ipv4.dstAddr': (address(i), 32)},
+                    action_name=ACTION, action_params=r['action_params'])
+                latencies.append(perf_counter() - started)
+            return latencies
+        self.measure('buildTableEntry', min(n, RPC_SAMPLES), benchBuild)
+
+        entries = buildEntries(p4info_helper, n)
+        sw = self.connect()
+        try:
+            self.resetPipeline(sw)
+
+            def benchWriteSingle():
+                latencies = []
+                for entry in entries[:RPC_SAMPLES]:
+                    started = perf_counter()
+                    sw.WriteTableEntry(entry)
+                    latencies.append(perf_counter() - started)
+                return latencies
+            self.measure('WriteTableEntry', min(n, RPC_SAMPLES), benchWriteSingle)
+
+            self.resetPipeline(sw)
+
+            def benchWriteBatch():
+                with timedFlushes([]) as latencies, sw.WriteBatch() as batch:
+                    for entry in entries:
+                        batch.Insert(entry)
+                return latencies
+            self.measure('WriteBatch', n, benchWriteBatch)
+
+            def benchRead():
+                started = perf_counter()
+                count = sum(len(response.entities) for response in sw.ReadTableEntries())
+                assert count == n, "Read %d entries instead of %d" % (count, n)
+                return [perf_counter() - started]
+            self.measure('ReadTableEntries', n, benchRead)
+
+            current = reconcile.readEntities(sw)
+
+            def benchDiff():
+                started = perf_counter()
+                diff = list(reconcile.streamDiff(entries, current))
+                assert not diff, "%d updates for an unchanged switch" % len(diff)
+                return [perf_counter() - started]
+            self.measure('streamDiff (unchanged)', n, benchDiff)
+
+            changed = changedEntries(p4info_helper, n)
+
+            def benchApplyDiff():
+                with timedFlushes([]) as latencies:
+                    reconcile.applyDiff(sw, reconcile.streamDiff(changed, current))
+                return latencies
+            self.measure('applyDiff (1/10 changed)', n, benchApplyDiff)
+            del current, changed
+        finally:
+            sw.shutdown()
+        del entries
+
+        runtime_json = self.writeRuntimeJson(n)
+
+        def benchProgram():
+            # Times the WriteRequests of the new switch, the whole call when
+            # nothing needs to be written
+            started = perf_counter()
+            with open(runtime_json) as f, contextlib.redirect_stdout(io.StringIO()), \
+                    timedFlushes([]) as latencies:
+                simple_controller.program_switch(
+                    addr=self.server.address, device_id=0, sw_conf_file=f,
+                    workdir=self.workdir, proto_dump_fpath=None)
+            return latencies or [perf_counter() - started]
+        # Forgets the pipeline, so that program_switch pushes it again
+        self.server.device(0).clear()
+        self.measure('program_switch (new)', n, benchProgram)
+        self.measure('program_switch (unchanged)', n, benchProgram)
+        return self.results
+
+    def writeRuntimeJson(self, n):
+        path = os.path.join(self.workdir, 'runtime-%d.json' % n)
+        with open(path, 'w') as f:
+            f.write('{"target": "bmv2", "p4info": "benchmark.p4info.txt", '
+                    '"bmv2_json": "benchmark.json", "table_entries": [\n')
+            for i in range(n):
+                if i:
+                    f.write(',\n')
+                json.dump(rule(i), f)
+            f.write('\n]}\n')
+        return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='p4runtime_lib benchmarks')
+    parser.add_argument('--entries', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='workload sizes, in table entries (default: 1000 10000 100000)')
+    parser.add_argument('--memory', action='store_true',
+                        help='report the peak memory of each benchmark (slower)')
+    parser.add_argument('--json', type=str, default=None,
+                        help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='p4runtime-bench-')
+    results = []
+    try:
+        with open(os.path.join(workdir, 'benchmark.p4info.txt'), 'w') as f:
+            f.write(google.protobuf.text_format.MessageToString(buildP4Info()))
+        with open(os.path.join(workdir, 'benchmark.json'), 'w') as f:
+            f.write('{}')
+        with FakeP4RuntimeServer() as server:
+            print(HEADER)
+            for n in args.entries:
+                results.extend(Benchmark(server, workdir, n, memory=args.memory).run())
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump([r.toJson() for r in results], f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -13,18 +13,39 @@
 # limitations under the License.
 #
 from .switch import SwitchConnection
+from .async_switch import AsyncSwitchConnection
+from .cache import loadFile, memoizeFile
 from p4.tmp import p4config_pb2
 
 
-def buildDeviceConfig(bmv2_json_file_path=None):
-    "Builds the device config for BMv2"
+def _deviceConfig(bmv2_json):
     device_config = p4config_pb2.P4DeviceConfig()
     device_config.reassign = True
-    with open(bmv2_json_file_path) as f:
-        device_config.device_data = f.read().encode('utf-8')
+    device_config.device_data = bmv2_json
     return device_config
 
+def buildDeviceConfig(bmv2_json_file_path=None):
+    "Builds the device config for BMv2"
+    return _deviceConfig(loadFile(bmv2_json_file_path))
+
+def serializeDeviceConfig(bmv2_json_file_path=None):
+    """Returns the serialized device config for BMv2, encoded once per BMv2
+    JSON file and shared by all the switches"""
+    return memoizeFile('bmv2', bmv2_json_file_path, lambda data, digest:
+                       _deviceConfig(data).SerializeToString())[1]
+
 
 class Bmv2SwitchConnection(SwitchConnection):
     def buildDeviceConfig(self, **kwargs):
         return buildDeviceConfig(**kwargs)
+
+    def serializeDeviceConfig(self, **kwargs):
+        return serializeDeviceConfig(**kwargs)
+
+
+class AsyncBmv2SwitchConnection(AsyncSwitchConnection):
+    def buildDeviceConfig(self, **kwargs):
+        return buildDeviceConfig(**kwargs)
+
+    def serializeDeviceConfig(self, **kwargs):
+        return serializeDeviceConfig(**kwargs)
@@ -0,0 +1,116 @@
+# Copyright 2017-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import google.protobuf.text_format
+from p4.config.v1 import p4info_pb2
+
+# Directory of the on-disk cache of binary P4Info files, keyed by the hash
+# of the text P4Info. It is private to the user; set P4RUNTIME_CACHE_DIR to
+# an empty string to disable.
+CACHE_DIR = os.environ.get('P4RUNTIME_CACHE_DIR', os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+    'p4runtime_lib'))
+
+# Most files kept in memory by memoizeFile, the least recently used go first
+MEMO_MAX_ENTRIES = 64
+
+# (kind, path, mtime, size) -> (sha256 hex digest of the file, value)
+_memo = OrderedDict()
+_memo_lock = threading.RLock()
+
+def memoizeFile(kind, path, load):
+    """Returns (digest, value) for the file at `path`, with value computed by
+    load(data, digest) only the first time the file (in its current version)
+    is seen by this process"""
+    st = os.stat(path)
+    key = (kind, os.path.realpath(path), st.st_mtime_ns, st.st_size)
+    with _memo_lock:
+        if key in _memo:
+            _memo.move_to_end(key)
+            return _memo[key]
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        _memo[key] = value = (digest, load(data, digest))
+        while len(_memo) > MEMO_MAX_ENTRIES:
+            _memo.popitem(last=False)
+        return value
+
+def fileDigest(path):
+    "Returns the sha256 hex digest of a file, computed once per file version"
+    return memoizeFile('digest', path, lambda data, digest: None)[0]
+
+def _readCache(name):
+    """Returns the data of a cache entry, or None if it is missing or does not
+    match the digest it was written with"""
+    if not CACHE_DIR:
+        return None
+    try:
+        with open(os.path.join(CACHE_DIR, name), 'rb') as f:
+            entry = f.read()
+    except OSError:
+        return None
+    digest, data = entry[:32], entry[32:]
+    if hashlib.sha256(data).digest() != digest:
+        return None
+    return data
+
+def _writeCache(name, data):
+    if not CACHE_DIR:
+        return
+    # Written to a temporary file first, so that concurrent controllers never
+    # read a partial file
+    try:
+        os.makedirs(CACHE_DIR, mode=0o700, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(hashlib.sha256(data).digest() + data)
+        os.replace(tmp_path, os.path.join(CACHE_DIR, name))
+    except OSError:
+        pass
+
+def _loadP4Info(data, digest):
+    p4info = p4info_pb2.P4Info()
+    name = 'p4info-%s.bin' % digest
+    cached = _readCache(name)
+    if cached is not None:
+        try:
+            p4info.ParseFromString(cached)
+            return p4info
+        except Exception:
+            p4info.Clear()
+    google.protobuf.text_format.Merge(data.decode('utf-8'), p4info)
+    _writeCache(name, p4info.SerializeToString())
+    return p4info
+
+def loadP4Info(p4info_filepath):
+    """Returns the P4Info of a p4info text file.
+
+    The text format is only parsed the first time a given file content is
+    seen; afterwards the binary P4Info is read from the on-disk cache. Within
+    a process, all the callers share the same P4Info object, which must not
+    be modified.
+    """
+    return memoizeFile('p4info', p4info_filepath, _loadP4Info)[1]
+
+def loadFile(path):
+    """Returns the content of a file as bytes, read once per file version and
+    shared by all the callers of this process"""
+    return memoizeFile('file', path, lambda data, digest: data)[1]
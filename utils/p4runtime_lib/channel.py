@@ -0,0 +1,130 @@
+# Copyright 2017-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import threading
+
+import grpc
+
+# Table reads of large switches easily exceed the 4MB gRPC default
+MAX_MESSAGE_LENGTH = 64 * 1024 * 1024
+
+# Keepalive pings detect dead switches on idle connections. gRPC servers
+# reject pings sent more often than every 5 minutes when no data is
+# exchanged, so that is the interval used.
+KEEPALIVE_TIME_MS = 5 * 60 * 1000
+KEEPALIVE_TIMEOUT_MS = 20 * 1000
+
+CHANNEL_OPTIONS = [
+    ('grpc.max_receive_message_length', MAX_MESSAGE_LENGTH),
+    ('grpc.max_send_message_length', MAX_MESSAGE_LENGTH),
+    ('grpc.keepalive_time_ms', KEEPALIVE_TIME_MS),
+    ('grpc.keepalive_timeout_ms', KEEPALIVE_TIMEOUT_MS),
+    ('grpc.keepalive_permit_without_calls', 1),
+    ('grpc.http2.max_pings_without_data', 0),
+]
+
+class _PooledChannel(object):
+
+    def __init__(self, address, options):
+        self.channel = grpc.insecure_channel(address, options=options)
+        self.refs = 0
+        self.state = grpc.ChannelConnectivity.IDLE
+        self.channel.subscribe(self._onStateChange)
+
+    def _onStateChange(self, state):
+        self.state = state
+
+    def close(self):
+        self.channel.unsubscribe(self._onStateChange)
+        self.channel.close()
+
+
+class ChannelPool(object):
+    """Shares one gRPC channel per server address between its users.
+
+    Channels are reference counted: each acquire() must be paired with a
+    release(), and the channel is closed once its last user releases it.
+    The connectivity state of each channel is tracked, see state() and
+    isHealthy(). gRPC reconnects channels by itself after a failure, and
+    waitReady() asks for it to happen right away instead of after the backoff.
+    """
+
+    def __init__(self, options=None):
+        self.options = list(CHANNEL_OPTIONS if options is None else options)
+        self.channels = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.channels)
+
+    def acquire(self, address):
+        "Returns the channel to `address`, opening it if needed"
+        with self.lock:
+            pooled = self.channels.get(address)
+            if pooled is None:
+                pooled = self.channels[address] = _PooledChannel(address, self.options)
+            pooled.refs += 1
+            return pooled.channel
+
+    def release(self, address):
+        with self.lock:
+            pooled = self.channels.get(address)
+            if pooled is None:
+                return
+            pooled.refs -= 1
+            if pooled.refs > 0:
+                return
+            del self.channels[address]
+        pooled.close()
+
+    def stub(self, address, stub_class=None):
+        """Returns a new stub (a P4RuntimeStub by default) on the channel to
+        `address`. Release the channel once the stub is not used anymore."""
+        if stub_class is None:
+            from p4.v1 import p4runtime_pb2_grpc
+            stub_class = p4runtime_pb2_grpc.P4RuntimeStub
+        return stub_class(self.acquire(address))
+
+    def state(self, address):
+        "Returns the grpc.ChannelConnectivity of the channel, None if not open"
+        pooled = self.channels.get(address)
+        return None if pooled is None else pooled.state
+
+    def isHealthy(self, address):
+        return self.state(address) in (grpc.ChannelConnectivity.IDLE,
+                                       grpc.ChannelConnectivity.CONNECTING,
+                                       grpc.ChannelConnectivity.READY)
+
+    def waitReady(self, address, timeout=None):
+        """Connects the channel and waits until it is ready. Returns False if
+        it is not after `timeout` seconds."""
+        pooled = self.channels.get(address)
+        if pooled is None:
+            raise KeyError("No channel open to %s" % address)
+        try:
+            grpc.channel_ready_future(pooled.channel).result(timeout=timeout)
+        except grpc.FutureTimeoutError:
+            return False
+        return True
+
+    def close(self):
+        "Closes all the channels, whether released or not"
+        with self.lock:
+            channels = list(self.channels.values())
+            self.channels = {}
+        for pooled in channels:
+            pooled.close()
+
+# Pool used by the switch connections unless given another one
+channel_pool = ChannelPool()
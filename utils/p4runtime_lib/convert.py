@@ -0,0 +1,243 @@
+# Copyright 2017-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import numbers
+import operator
+import re
+import socket
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+'''
+This package contains several helper functions for encoding to and decoding from byte strings:
+- integers
+- IPv4 address strings
+- IPv6 address strings
+- Ethernet address strings
+
+Besides the generic encode(), which infers the type of the value, there are
+typed encoders (e.g. encodeNum, encodeIPv4), makeEncoder() which returns an
+encoder for a given bitwidth, and vectorized variants (e.g. encodeNums,
+encodeIPv4s) which encode a whole list or NumPy array in one call.
+'''
+
+mac_pattern = re.compile(r'^([\da-fA-F]{2}:){5}([\da-fA-F]{2})$')
+def matchesMac(mac_addr_string):
+    return mac_pattern.match(mac_addr_string) is not None
+
+def encodeMac(mac_addr_string):
+    return bytes.fromhex(mac_addr_string.replace(':', ''))
+
+def decodeMac(encoded_mac_addr):
+    return encoded_mac_addr.hex(':')
+
+def encodeMacs(mac_addr_strings):
+    return [bytes.fromhex(m.replace(':', '')) for m in mac_addr_strings]
+
+ip_pattern = re.compile(r'^(\d{1,3}\.){3}(\d{1,3})$')
+def matchesIPv4(ip_addr_string):
+    return ip_pattern.match(ip_addr_string) is not None
+
+def encodeIPv4(ip_addr_string):
+    return socket.inet_aton(ip_addr_string)
+
+def decodeIPv4(encoded_ip_addr):
+    return socket.inet_ntoa(encoded_ip_addr)
+
+def encodeIPv4s(ip_addrs):
+    """Encodes a list of IPv4 address strings, or a list/array of addresses
+    as integers"""
+    if np is not None and isinstance(ip_addrs, np.ndarray) and ip_addrs.dtype.kind in 'iu':
+        return encodeNums(ip_addrs, 32)
+    inet_aton = socket.inet_aton
+    return [inet_aton(ip) if type(ip) is str else operator.index(ip).to_bytes(4, 'big')
+            for ip in ip_addrs]
+
+def matchesIPv6(ip_addr_string):
+    try:
+        socket.inet_pton(socket.AF_INET6, ip_addr_string)
+    except (OSError, ValueError):
+        return False
+    return True
+
+def encodeIPv6(ip_addr_string):
+    return socket.inet_pton(socket.AF_INET6, ip_addr_string)
+
+def decodeIPv6(encoded_ip_addr):
+    return socket.inet_ntop(socket.AF_INET6, encoded_ip_addr)
+
+def encodeIPv6s(ip_addr_strings):
+    inet_pton = socket.inet_pton
+    return [inet_pton(socket.AF_INET6, ip) for ip in ip_addr_strings]
+
+def bitwidthToBytes(bitwidth):
+    return (bitwidth + 7) // 8
+
+def encodeNum(number, bitwidth):
+    # Also accepts NumPy integer scalars
+    number = operator.index(number)
+    byte_len = (bitwidth + 7) // 8
+    if number >= 1 << bitwidth or number < 0:
+        raise Exception("Number, %d, does not fit in %d bits" % (number, bitwidth))
+    return number.to_bytes(byte_len, 'big')
+
+def decodeNum(encoded_number):
+    return int.from_bytes(encoded_number, 'big')
+
+def encodeNums(numbers, bitwidth):
+    """Encodes a list or NumPy array of non-negative integers. NumPy arrays of
+    fields up to 64 bits are converted in a single vectorized operation."""
+    byte_len = (bitwidth + 7) // 8
+    if np is not None and isinstance(numbers, np.ndarray) and bitwidth <= 64:
+        if len(numbers) == 0:
+            return []
+        if numbers.min() < 0 or (bitwidth < 64 and numbers.max() >= 1 << bitwidth):
+            raise Exception("Numbers do not fit in %d bits" % bitwidth)
+        # Big-endian 64-bit words, keeping only the low byte_len bytes
+        raw = numbers.astype('>u8').view(np.uint8).reshape(-1, 8)[:, 8 - byte_len:].tobytes()
+        return [raw[i:i + byte_len] for i in range(0, len(raw), byte_len)]
+    if np is not None and isinstance(numbers, np.ndarray):
+        numbers = numbers.tolist()
+    return [encodeNum(n, bitwidth) for n in numbers]
+
+def decodeNums(encoded_numbers):
+    return [int.from_bytes(n, 'big') for n in encoded_numbers]
+
+def toCanonical(encoded_bytes):
+    """Returns the canonical P4Runtime representation of a byte string, i.e.
+    the shortest one without leading zero bytes (but at least one byte)"""
+    return encoded_bytes.lstrip(b'\x00') or b'\x00'
+
+def encodeNumCanonical(number):
+    number = operator.index(number)
+    if number < 0:
+        raise Exception("Cannot encode negative number %d" % number)
+    return number.to_bytes(max(1, (number.bit_length() + 7) // 8), 'big')
+
+def _encodeString(x, byte_len):
+    # Try the address format matching the field width first
+    if byte_len == 4 and matchesIPv4(x):
+        return encodeIPv4(x)
+    if byte_len == 6 and matchesMac(x):
+        return encodeMac(x)
+    if byte_len == 16 and ':' in x and matchesIPv6(x):
+        return encodeIPv6(x)
+    if matchesMac(x):
+        return encodeMac(x)
+    elif matchesIPv4(x):
+        return encodeIPv4(x)
+    # Assume that the string is already encoded
+    return x
+
+def encode(x, bitwidth):
+    'Tries to infer the type of `x` and encode it'
+    byte_len = (bitwidth + 7) // 8
+    if (type(x) == list or type(x) == tuple) and len(x) == 1:
+        x = x[0]
+    encoded_bytes = None
+    if isinstance(x, numbers.Integral):
+        encoded_bytes = encodeNum(x, bitwidth)
+    elif type(x) == str:
+        encoded_bytes = _encodeString(x, byte_len)
+    elif type(x) == bytes:
+        encoded_bytes = x
+    else:
+        raise Exception("Encoding objects of %r is not supported" % type(x))
+    assert(len(encoded_bytes) == byte_len)
+    return encoded_bytes
+
+def makeEncoder(bitwidth):
+    """Returns a function encoding a single value of the given bitwidth, with
+    a fast path for integers. Use it when encoding many values of one field."""
+    byte_len = (bitwidth + 7) // 8
+    limit = 1 << bitwidth
+    def encodeValue(x):
+        if type(x) is int:
+            if x >= limit or x < 0:
+                raise Exception("Number, %d, does not fit in %d bits" % (x, bitwidth))
+            return x.to_bytes(byte_len, 'big')
+        return encode(x, bitwidth)
+    return encodeValue
+
+if __name__ == '__main__':
+    # TODO These tests should be moved out of main eventually
+    mac = "aa:bb:cc:dd:ee:ff"
+    enc_mac = encodeMac(mac)
+    assert(enc_mac == b'\xaa\xbb\xcc\xdd\xee\xff')
+    dec_mac = decodeMac(enc_mac)
+    assert(mac == dec_mac)
+
+    ip = "10.0.0.1"
+    enc_ip = encodeIPv4(ip)
+    assert(enc_ip == b'\x0a\x00\x00\x01')
+    dec_ip = decodeIPv4(enc_ip)
+    assert(ip == dec_ip)
+
+    ip6 = "2001:db8::1"
+    enc_ip6 = encodeIPv6(ip6)
+    assert(enc_ip6 == b'\x20\x01\x0d\xb8' + b'\x00' * 11 + b'\x01')
+    assert(decodeIPv6(enc_ip6) == ip6)
+
+    num = 1337
+    byte_len = 5
+    enc_num = encodeNum(num, byte_len * 8)
+    assert(enc_num == b'\x00\x00\x00\x05\x39')
+    dec_num = decodeNum(enc_num)
+    assert(num == dec_num)
+
+    assert(matchesIPv4('10.0.0.1'))
+    assert(not matchesIPv4('10.0.0.1.5'))
+    assert(not matchesIPv4('1000.0.0.1'))
+    assert(not matchesIPv4('10001'))
+
+    assert(encode(mac, 6 * 8) == enc_mac)
+    assert(encode(ip, 4 * 8) == enc_ip)
+    assert(encode(ip6, 16 * 8) == enc_ip6)
+    assert(encode(num, 5 * 8) == enc_num)
+    assert(encode((num,), 5 * 8) == enc_num)
+    assert(encode([num], 5 * 8) == enc_num)
+    assert(makeEncoder(5 * 8)(num) == enc_num)
+    assert(makeEncoder(6 * 8)(mac) == enc_mac)
+
+    assert(toCanonical(enc_num) == b'\x05\x39')
+    assert(toCanonical(b'\x00\x00') == b'\x00')
+    assert(encodeNumCanonical(num) == b'\x05\x39')
+    assert(encodeNumCanonical(0) == b'\x00')
+
+    assert(encodeNums([num, 0], 16) == [b'\x05\x39', b'\x00\x00'])
+    assert(decodeNums(encodeNums([num, 0], 16)) == [num, 0])
+    assert(encodeIPv4s([ip, 0x0a000001]) == [enc_ip, enc_ip])
+    assert(encodeMacs([mac]) == [enc_mac])
+
+    if np is not None:
+        assert(encodeNum(np.int64(num), 5 * 8) == enc_num)
+        assert(encode(np.uint16(num), 5 * 8) == enc_num)
+        assert(makeEncoder(5 * 8)(np.int64(num)) == enc_num)
+        assert(encodeNumCanonical(np.int64(num)) == b'\x05\x39')
+        assert(encodeIPv4s([np.uint32(0x0a000001)]) == [enc_ip])
+    assert(encodeIPv6s([ip6]) == [enc_ip6])
+    if np is not None:
+        assert(encodeNums(np.array([num, 0]), 16) == [b'\x05\x39', b'\x00\x00'])
+        assert(encodeIPv4s(np.array([0x0a000001])) == [enc_ip])
+
+    num = 256
+    byte_len = 2
+    try:
+        enc_num = encodeNum(num, 8)
+        raise Exception("expected exception")
+    except Exception as e:
+        print(e)
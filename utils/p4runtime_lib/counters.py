@@ -0,0 +1,110 @@
+# Copyright 2017-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from time import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class CounterSnapshot(object):
+    """Values of whole counter arrays read from a switch at `timestamp`.
+
+    `packets` and `bytes` map each counter name to a NumPy array indexed by
+    the counter index.
+    """
+
+    def __init__(self, timestamp, packets, bytes):
+        self.timestamp = timestamp
+        self.packets = packets
+        self.bytes = bytes
+
+    def deltas(self, prev):
+        """Returns {counter name: (packet deltas, byte deltas)} since the
+        `prev` snapshot. Counters that went backwards (e.g. after a pipeline
+        push) count from zero."""
+        deltas = {}
+        for name in self.packets:
+            deltas[name] = (
+                _delta(self.packets[name], prev.packets[name]),
+                _delta(self.bytes[name], prev.bytes[name]))
+        return deltas
+
+    def rates(self, prev):
+        """Returns {counter name: (packets/s, bytes/s)} since the `prev`
+        snapshot"""
+        elapsed = self.timestamp - prev.timestamp
+        if elapsed <= 0:
+            raise Exception("Snapshots must be taken at different times")
+        return dict((name, (packets / elapsed, bytes / elapsed))
+                    for name, (packets, bytes) in self.deltas(prev).items())
+
+
+def _delta(cur, prev):
+    return np.where(cur >= prev, cur - prev, cur).astype(np.int64)
+
+
+class CounterPoller(object):
+    """Reads whole counter arrays from a switch, all of them in one
+    ReadRequest, and keeps the previous snapshot to compute rates.
+
+    :param sw: the switch connection
+    :param p4info_helper: the P4Info helper
+    :param counter_names: names (or aliases) of the counters to read
+    """
+
+    def __init__(self, sw, p4info_helper, counter_names):
+        if np is None:
+            raise Exception("CounterPoller requires NumPy")
+        self.sw = sw
+        self.names_by_id = {}
+        self.sizes = {}
+        for name in counter_names:
+            counter = p4info_helper.get('counters', name=name)
+            self.names_by_id[counter.preamble.id] = name
+            self.sizes[name] = counter.size
+        self.prev = None
+
+    def snapshot(self):
+        "Reads the counters and returns a CounterSnapshot"
+        indexes = dict((name, []) for name in self.sizes)
+        packets = dict((name, []) for name in self.sizes)
+        bytes = dict((name, []) for name in self.sizes)
+        for response in self.sw.ReadCounterArrays(list(self.names_by_id)):
+            for entity in response.entities:
+                counter = entity.counter_entry
+                name = self.names_by_id[counter.counter_id]
+                indexes[name].append(counter.index.index)
+                packets[name].append(counter.data.packet_count)
+                bytes[name].append(counter.data.byte_count)
+        timestamp = time()
+
+        packet_arrays = {}
+        byte_arrays = {}
+        for name, size in self.sizes.items():
+            packet_arrays[name] = np.zeros(size, dtype=np.int64)
+            byte_arrays[name] = np.zeros(size, dtype=np.int64)
+            packet_arrays[name][indexes[name]] = packets[name]
+            byte_arrays[name][indexes[name]] = bytes[name]
+        return CounterSnapshot(timestamp, packet_arrays, byte_arrays)
+
+    def poll(self):
+        """Takes a new snapshot and returns it with the rates since the
+        previous poll (None on the first poll)"""
+        snapshot = self.snapshot()
+        rates = snapshot.rates(self.prev) if self.prev is not None else None
+        self.prev = snapshot
+        return snapshot, rates
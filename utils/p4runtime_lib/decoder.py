@@ -0,0 +1,217 @@
+# Copyright 2017-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# A decoded table entry. match is a tuple of (match field name, value) with
+# the value as returned by P4InfoHelper.get_match_field_value, and params a
+# tuple of (param name, value) pairs. Values are the raw byte strings.
+TableEntryRecord = namedtuple('TableEntryRecord',
+                              ['table', 'match', 'action', 'params', 'priority',
+                               'is_default_action'])
+
+DEFAULT_BATCH_SIZE = 10000
+
+# Prefix of the action param columns of readBatches
+PARAM_PREFIX = 'param.'
+
+class TableEntryDecoder(object):
+    """Decodes the table entries read from a switch into TableEntryRecords.
+
+    The id to name maps are built once from the P4Info, so that decoding an
+    entry is a few dict lookups. read() streams the records of a
+    ReadTableEntries call one response at a time, and readBatches() turns
+    them into columnar NumPy (or Arrow) batches of a bounded size.
+    """
+
+    def __init__(self, p4info_helper):
+        p4info = p4info_helper.p4info
+        self.p4info_helper = p4info_helper
+        self.tables = {}
+        # (table id, match field id) -> match field name
+        self.match_fields = {}
+        for t in p4info.tables:
+            self.tables[t.preamble.id] = t.preamble.name
+            for mf in t.match_fields:
+                self.match_fields[t.preamble.id, mf.id] = mf.name
+        self.actions = {}
+        # (action id, param id) -> param name
+        self.params = {}
+        for a in p4info.actions:
+            self.actions[a.preamble.id] = a.preamble.name
+            for p in a.params:
+                self.params[a.preamble.id, p.id] = p.name
+
+    def decode(self, entry):
+        "Returns the TableEntryRecord of a p4runtime_pb2.TableEntry"
+        table_id = entry.table_id
+        match = []
+        for m in entry.match:
+            kind = m.WhichOneof('field_match_type')
+            if kind == 'exact':
+                value = m.exact.value
+            elif kind == 'lpm':
+                value = (m.lpm.value, m.lpm.prefix_len)
+            elif kind == 'ternary':
+                value = (m.ternary.value, m.ternary.mask)
+            elif kind == 'range':
+                value = (m.range.low, m.range.high)
+            else:
+                value = self.p4info_helper.get_match_field_value(m)
+            match.append((self.match_fields[table_id, m.field_id], value))
+        action_name = None
+        params = ()
+        if entry.action.HasField('action'):
+            action = entry.action.action
+            action_id = action.action_id
+            action_name = self.actions[action_id]
+            params = tuple((self.params[action_id, p.param_id], p.value) for p in action.params)
+        return TableEntryRecord(self.tables[table_id], tuple(match), action_name, params,
+                                entry.priority, entry.is_default_action)
+
+    def read(self, sw, table_name=None):
+        """Reads the entries of a table (or of all tables) and yields their
+        TableEntryRecords as the responses arrive"""
+        table_id = None
+        if table_name is not None:
+            table_id = self.p4info_helper.get_tables_id(table_name)
+        decode = self.decode
+        for response in sw.ReadTableEntries(table_id=table_id):
+            for entity in response.entities:
+                yield decode(entity.table_entry)
+
+    def readBatches(self, sw, table_name, batch_size=DEFAULT_BATCH_SIZE, arrow=False):
+        """Reads the entries of a table and yields them as columnar batches of
+        at most batch_size entries: dicts of NumPy arrays, or pyarrow
+        RecordBatches if arrow is True.
+
+        Each match field gives a column of values (as integers), plus a
+        '<name>.prefix_len', '<name>.mask' or '<name>.high' column for LPM,
+        ternary and range fields. The 'action' column holds the action names
+        and there is one 'param.<name>' column per action param name (0 when
+        the entry's action has no such param), followed by 'priority'.
+        """
+        if np is None:
+            raise Exception("readBatches requires NumPy")
+        if arrow and pa is None:
+            raise Exception("readBatches(arrow=True) requires pyarrow")
+        table = self.p4info_helper.get('tables', name=table_name)
+        columns = self._batchColumns(table)
+        rows = dict((name, []) for name in columns)
+        count = 0
+        for response in sw.ReadTableEntries(table_id=table.preamble.id):
+            for entity in response.entities:
+                self._appendRow(rows, entity.table_entry)
+                count += 1
+                if count == batch_size:
+                    yield self._batch(columns, rows, arrow)
+                    rows = dict((name, []) for name in columns)
+                    count = 0
+        if count:
+            yield self._batch(columns, rows, arrow)
+
+    def _batchColumns(self, table):
+        # column name -> bitwidth (None for the action names)
+        columns = {}
+        for mf in table.match_fields:
+            columns[mf.name] = mf.bitwidth
+            kind = mf.MatchType.Name(mf.match_type)
+            if kind == 'LPM':
+                columns[mf.name + '.prefix_len'] = 32
+            elif kind == 'TERNARY':
+                columns[mf.name + '.mask'] = mf.bitwidth
+            elif kind == 'RANGE':
+                columns[mf.name + '.high'] = mf.bitwidth
+        columns['action'] = None
+        for ref in table.action_refs:
+            action = self.p4info_helper.get('actions', id=ref.id)
+            for p in action.params:
+                # Prefixed so that params do not collide with match fields
+                name = PARAM_PREFIX + p.name
+                columns[name] = max(columns.get(name, 0), p.bitwidth)
+        columns['priority'] = 32
+        return columns
+
+    def _appendRow(self, rows, entry):
+        table_id = entry.table_id
+        filled = set()
+        for m in entry.match:
+            name = self.match_fields[table_id, m.field_id]
+            kind = m.WhichOneof('field_match_type')
+            if kind == 'exact':
+                rows[name].append(int.from_bytes(m.exact.value, 'big'))
+            elif kind == 'lpm':
+                rows[name].append(int.from_bytes(m.lpm.value, 'big'))
+                rows[name + '.prefix_len'].append(m.lpm.prefix_len)
+                filled.add(name + '.prefix_len')
+            elif kind == 'ternary':
+                rows[name].append(int.from_bytes(m.ternary.value, 'big'))
+                rows[name + '.mask'].append(int.from_bytes(m.ternary.mask, 'big'))
+                filled.add(name + '.mask')
+            elif kind == 'range':
+                rows[name].append(int.from_bytes(m.range.low, 'big'))
+                rows[name + '.high'].append(int.from_bytes(m.range.high, 'big'))
+                filled.add(name + '.high')
+            else:
+                continue
+            filled.add(name)
+        action = entry.action.action
+        rows['action'].append(self.actions.get(action.action_id))
+        filled.add('action')
+        for p in action.params:
+            name = PARAM_PREFIX + self.params[action.action_id, p.param_id]
+            if name in rows:
+                rows[name].append(int.from_bytes(p.value, 'big'))
+                filled.add(name)
+        rows['priority'].append(entry.priority)
+        filled.add('priority')
+        # Fields left out of the entry (e.g. don't care matches, params of
+        # other actions) are 0
+        for name, values in rows.items():
+            if name not in filled:
+                values.append(0)
+
+    def _batch(self, columns, rows, arrow):
+        if arrow:
+            arrays = []
+            for name, bitwidth in columns.items():
+                if bitwidth is not None and bitwidth > 64:
+                    # Too wide for Arrow integers (e.g. IPv6 addresses)
+                    byte_len = (bitwidth + 7) // 8
+                    arrays.append(pa.array([v.to_bytes(byte_len, 'big') for v in rows[name]]))
+                elif bitwidth is not None:
+                    arrays.append(pa.array(rows[name], type=pa.uint64()))
+                else:
+                    arrays.append(pa.array(rows[name]))
+            return pa.RecordBatch.from_arrays(arrays, names=list(columns))
+
+        arrays = {}
+        for name, bitwidth in columns.items():
+            if bitwidth is not None and bitwidth <= 64:
+                arrays[name] = np.array(rows[name], dtype=np.uint64)
+            else:
+                # Action names, and values too wide for NumPy integers (e.g.
+                # IPv6 addresses) kept as Python integers
+                arrays[name] = np.array(rows[name], dtype=object)
+        return arrays
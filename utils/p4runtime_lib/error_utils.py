@@ -27,6 +27,18 @@ class P4RuntimeErrorFormatException(Exception):
         super(P4RuntimeErrorFormatException, self).__init__(message)
 
 
+# Raised when some of the updates of a batched Write request were rejected by
+# the switch. `errors` is a list of (index, update, p4.Error) tuples, one for
+# each failed update, and `grpc_error` is the original grpc.RpcError.
+class P4RuntimeWriteException(Exception):
+    def __init__(self, grpc_error, errors):
+        self.grpc_error = grpc_error
+        self.errors = errors
+        super(P4RuntimeWriteException, self).__init__(
+            "%d update(s) in batch failed: %s" % (len(errors), ', '.join(
+                "[%d] %s" % (idx, p4_error.message) for idx, _, p4_error in errors)))
+
+
 # Parse the binary details of the gRPC error. This is required to print some
 # helpful debugging information in tha case of batched Write / Read
 # requests. Returns None if there are no useful binary details and throws
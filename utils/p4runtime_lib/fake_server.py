@@ -0,0 +1,275 @@
+# Copyright 2017-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from concurrent import futures
+from queue import Queue
+import threading
+
+from google.rpc import code_pb2, status_pb2
+import grpc
+from p4.v1 import p4runtime_pb2
+from p4.v1 import p4runtime_pb2_grpc
+
+from .switch import entityKey
+
+def _electionId(election_id):
+    return (election_id.high << 64) | election_id.low
+
+class FakeDevice(object):
+    "In-memory state of one device of a FakeP4RuntimeServer"
+
+    def __init__(self):
+        self.p4info = None
+        self.cookie = None
+        # entityKey -> (Entity field name, entity)
+        self.entries = {}
+        # election id -> response queue of the client's stream
+        self.clients = {}
+
+    def primary(self):
+        return max(self.clients) if self.clients else None
+
+    def clear(self):
+        "Forgets the pipeline config and the entries, like a switch restart"
+        self.p4info = None
+        self.cookie = None
+        self.entries = {}
+
+
+class FakeP4Runtime(p4runtime_pb2_grpc.P4RuntimeServicer):
+    """P4Runtime service keeping table entries, multicast groups and clone
+    sessions in memory, without checking them against the P4Info.
+
+    It follows the P4Runtime rules the controllers depend on: the client
+    with the highest election id is the primary of a device and the only one
+    allowed to write, all the clients of a device are told when the primary
+    changes, writes of existing (or missing) entries fail with per-update
+    errors, and pushing a pipeline clears the device (unless it is pushed
+    with RECONCILE_AND_COMMIT). Packet-outs and
+    counters are not implemented: counter reads return nothing.
+    """
+
+    def __init__(self):
+        self.devices = {}
+        self.lock = threading.Lock()
+        # Requests served, by RPC name
+        self.calls = dict((name, 0) for name in
+                          ('Write', 'Read', 'SetForwardingPipelineConfig',
+                           'GetForwardingPipelineConfig', 'StreamChannel'))
+
+    def device(self, device_id):
+        with self.lock:
+            device = self.devices.get(device_id)
+            if device is None:
+                device = self.devices[device_id] = FakeDevice()
+            return device
+
+    def _checkPrimary(self, request, context):
+        device = self.device(request.device_id)
+        if _electionId(request.election_id) != device.primary():
+            context.abort(grpc.StatusCode.PERMISSION_DENIED, "Not the primary controller")
+        return device
+
+    def _notifyArbitration(self, device_id, device):
+        # Called with self.lock held
+        primary = device.primary()
+        for election_id, responses in device.clients.items():
+            response = p4runtime_pb2.StreamMessageResponse()
+            arbitration = response.arbitration
+            arbitration.device_id = device_id
+            arbitration.election_id.high = primary >> 64
+            arbitration.election_id.low = primary & 0xffffffffffffffff
+            if election_id == primary:
+                arbitration.status.code = code_pb2.OK
+            else:
+                arbitration.status.code = code_pb2.ALREADY_EXISTS
+            responses.put(response)
+
+    def StreamChannel(self, request_iterator, context):
+        self.calls['StreamChannel'] += 1
+        responses = Queue()
+        # [(device_id, election_id)] of this stream, once arbitrated
+        client = []
+
+        def readRequests():
+            try:
+                for request in request_iterator:
+                    if request.HasField('arbitration'):
+                        self._arbitrate(client, request.arbitration, responses)
+            except grpc.RpcError:
+                pass
+            responses.put(None)
+        threading.Thread(target=readRequests, daemon=True).start()
+
+        try:
+            while True:
+                response = responses.get()
+                if response is None:
+                    return
+                yield response
+        finally:
+            self._disconnect(client, responses)
+
+    def _arbitrate(self, client, arbitration, responses):
+        device = self.device(arbitration.device_id)
+        election_id = _electionId(arbitration.election_id)
+        with self.lock:
+            if client:
+                device.clients.pop(client[0][1], None)
+                client[0] = (arbitration.device_id, election_id)
+            else:
+                client.append((arbitration.device_id, election_id))
+            device.clients[election_id] = responses
+            self._notifyArbitration(arbitration.device_id, device)
+
+    def _disconnect(self, client, responses):
+        if not client:
+            return
+        device_id, election_id = client[0]
+        device = self.device(device_id)
+        with self.lock:
+            if device.clients.get(election_id) is not responses:
+                return
+            was_primary = device.primary() == election_id
+            del device.clients[election_id]
+            if was_primary and device.clients:
+                self._notifyArbitration(device_id, device)
+
+    def SetForwardingPipelineConfig(self, request, context):
+        self.calls['SetForwardingPipelineConfig'] += 1
+        device = self._checkPrimary(request, context)
+        with self.lock:
+            device.p4info = request.config.p4info
+            device.cookie = request.config.cookie.cookie
+            if request.action != p4runtime_pb2.SetForwardingPipelineConfigRequest.RECONCILE_AND_COMMIT:
+                device.entries = {}
+        return p4runtime_pb2.SetForwardingPipelineConfigResponse()
+
+    def GetForwardingPipelineConfig(self, request, context):
+        self.calls['GetForwardingPipelineConfig'] += 1
+        device = self.device(request.device_id)
+        if device.p4info is None:
+            context.abort(grpc.StatusCode.FAILED_PRECONDITION, "No forwarding pipeline config set")
+        response = p4runtime_pb2.GetForwardingPipelineConfigResponse()
+        response.config.cookie.cookie = device.cookie
+        if request.response_type != request.COOKIE_ONLY:
+            response.config.p4info.CopyFrom(device.p4info)
+        return response
+
+    def Write(self, request, context):
+        self.calls['Write'] += 1
+        device = self._checkPrimary(request, context)
+        errors = []
+        with self.lock:
+            for update in request.updates:
+                errors.append(self._apply(device, update))
+        if any(error.canonical_code != code_pb2.OK for error in errors):
+            # Per-update errors, as parsed by error_utils
+            status = status_pb2.Status(code=code_pb2.UNKNOWN, message="Write failure")
+            for error in errors:
+                status.details.add().Pack(error)
+            context.set_trailing_metadata([('grpc-status-details-bin', status.SerializeToString())])
+            context.abort(grpc.StatusCode.UNKNOWN, "Write failure")
+        return p4runtime_pb2.WriteResponse()
+
+    def _apply(self, device, update):
+        field = update.entity.WhichOneof('entity')
+        if field not in ('table_entry', 'packet_replication_engine_entry'):
+            return p4runtime_pb2.Error(canonical_code=code_pb2.UNIMPLEMENTED,
+                                       message="Unsupported entity %s" % field)
+        entity = getattr(update.entity, field)
+        key = entityKey(entity)
+        exists = key in device.entries
+        if update.type == p4runtime_pb2.Update.INSERT and exists:
+            return p4runtime_pb2.Error(canonical_code=code_pb2.ALREADY_EXISTS,
+                                       message="Entry already exists")
+        # Default actions always exist
+        if (update.type != p4runtime_pb2.Update.INSERT and not exists
+                and not (field == 'table_entry' and entity.is_default_action)):
+            return p4runtime_pb2.Error(canonical_code=code_pb2.NOT_FOUND,
+                                       message="Entry not found")
+        if update.type == p4runtime_pb2.Update.DELETE:
+            del device.entries[key]
+        else:
+            copy = type(entity)()
+            copy.CopyFrom(entity)
+            device.entries[key] = (field, copy)
+        return p4runtime_pb2.Error(canonical_code=code_pb2.OK)
+
+    def Read(self, request, context):
+        self.calls['Read'] += 1
+        device = self.device(request.device_id)
+        with self.lock:
+            entries = list(device.entries.items())
+        response = p4runtime_pb2.ReadResponse()
+        for requested in request.entities:
+            field = requested.WhichOneof('entity')
+            for key, (entry_field, entry) in entries:
+                if entry_field == field and self._matches(requested, key, entry):
+                    getattr(response.entities.add(), field).CopyFrom(entry)
+        yield response
+
+    def _matches(self, requested, key, entry):
+        if requested.HasField('table_entry'):
+            wanted = requested.table_entry
+            if wanted.table_id and wanted.table_id != entry.table_id:
+                return False
+            if wanted.match or wanted.is_default_action:
+                return entityKey(wanted) == key
+            # Wildcard reads don't return default actions
+            return not entry.is_default_action
+        wanted = requested.packet_replication_engine_entry
+        if wanted.HasField('multicast_group_entry'):
+            group_id = wanted.multicast_group_entry.multicast_group_id
+            return key[0] == 'multicast_group' and group_id in (0, key[1])
+        session_id = wanted.clone_session_entry.session_id
+        return key[0] == 'clone_session' and session_id in (0, key[1])
+
+    def Capabilities(self, request, context):
+        return p4runtime_pb2.CapabilitiesResponse(p4runtime_api_version='1.3.0')
+
+
+class FakeP4RuntimeServer(object):
+    """Serves a FakeP4Runtime on a local port, in the current process:
+
+        with FakeP4RuntimeServer() as server:
+            sw = SwitchConnection(address=server.address)
+    """
+
+    def __init__(self, address='127.0.0.1:0', max_workers=16):
+        self.service = FakeP4Runtime()
+        self.server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers),
+                                  options=[('grpc.max_receive_message_length', -1),
+                                           ('grpc.max_send_message_length', -1)])
+        p4runtime_pb2_grpc.add_P4RuntimeServicer_to_server(self.service, self.server)
+        host = address.rsplit(':', 1)[0]
+        self.port = self.server.add_insecure_port(address)
+        self.address = '%s:%d' % (host, self.port)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        self.server.start()
+        return self
+
+    def stop(self, grace=None):
+        self.server.stop(grace)
+
+    def device(self, device_id=0):
+        "Returns the FakeDevice holding the state of a device"
+        return self.service.device(device_id)
@@ -0,0 +1,392 @@
+# Copyright 2017-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import re
+
+from p4.v1 import p4runtime_pb2
+from p4.config.v1 import p4info_pb2
+
+from .cache import loadP4Info
+from .convert import encode, makeEncoder
+
+# Synthesized accessors, e.g. get_tables_id(name) or get_actions_name(id)
+GET_ID_PATTERN = re.compile(r"^get_(\w+)_id$")
+GET_NAME_PATTERN = re.compile(r"^get_(\w+)_name$")
+
+class P4InfoHelper(object):
+    def __init__(self, p4_info_filepath):
+        # Load the p4info file, from the binary cache if it was seen before
+        self.p4info = loadP4Info(p4_info_filepath)
+        self._build_indexes()
+
+    def _build_indexes(self):
+        """Indexes all P4Info entities once so that lookups by name, alias or id
+        don't need to scan the P4Info lists"""
+        # entity_type -> {name or alias: entity} and entity_type -> {id: entity}
+        self._by_name = {}
+        self._by_id = {}
+        for field in self.p4info.DESCRIPTOR.fields:
+            if field.label != field.LABEL_REPEATED or field.message_type is None \
+                    or 'preamble' not in field.message_type.fields_by_name:
+                continue
+            by_name = self._by_name[field.name] = {}
+            by_id = self._by_id[field.name] = {}
+            for o in getattr(self.p4info, field.name):
+                pre = o.preamble
+                by_name.setdefault(pre.name, o)
+                if pre.alias:
+                    by_name.setdefault(pre.alias, o)
+                by_id.setdefault(pre.id, o)
+
+        # table name -> ({match field name: match field}, {id: match field})
+        self._match_fields = {}
+        for t in self.p4info.tables:
+            self._match_fields[t.preamble.name] = (
+                {mf.name: mf for mf in t.match_fields},
+                {mf.id: mf for mf in t.match_fields})
+
+        # action name -> ({param name: param}, {id: param})
+        self._action_params = {}
+        for a in self.p4info.actions:
+            self._action_params[a.preamble.name] = (
+                {p.name: p for p in a.params},
+                {p.id: p for p in a.params})
+
+    def get(self, entity_type, name=None, id=None):
+        if name is not None and id is not None:
+            raise AssertionError("name or id must be None")
+
+        if name:
+            o = self._by_name.get(entity_type, {}).get(name)
+        else:
+            o = self._by_id.get(entity_type, {}).get(id)
+        if o is not None:
+            return o
+
+        if name:
+            raise AttributeError("Could not find %r of type %s" % (name, entity_type))
+        else:
+            raise AttributeError("Could not find id %r of type %s" % (id, entity_type))
+
+    def get_id(self, entity_type, name):
+        return self.get(entity_type, name=name).preamble.id
+
+    def get_name(self, entity_type, id):
+        return self.get(entity_type, id=id).preamble.name
+
+    def get_alias(self, entity_type, id):
+        return self.get(entity_type, id=id).preamble.alias
+
+    def __getattr__(self, attr):
+        # Synthesize convenience functions for name to id lookups for top-level entities
+        # e.g. get_tables_id(name_string) or get_actions_id(name_string)
+        m = GET_ID_PATTERN.search(attr)
+        if m:
+            primitive = m.group(1)
+            fn = lambda name: self.get_id(primitive, name)
+            # Cache the function so that __getattr__ is only hit once per name
+            self.__dict__[attr] = fn
+            return fn
+
+        # Synthesize convenience functions for id to name lookups
+        # e.g. get_tables_name(id) or get_actions_name(id)
+        m = GET_NAME_PATTERN.search(attr)
+        if m:
+            primitive = m.group(1)
+            fn = lambda id: self.get_name(primitive, id)
+            self.__dict__[attr] = fn
+            return fn
+
+        raise AttributeError("%r object has no attribute %r" % (self.__class__, attr))
+
+    def get_match_field(self, table_name, name=None, id=None):
+        by_name, by_id = self._match_fields.get(table_name, ({}, {}))
+        if name is not None:
+            mf = by_name.get(name)
+        else:
+            mf = by_id.get(id)
+        if mf is not None:
+            return mf
+        raise AttributeError("%r has no attribute %r" % (table_name, name if name is not None else id))
+
+    def get_match_field_id(self, table_name, match_field_name):
+        return self.get_match_field(table_name, name=match_field_name).id
+
+    def get_match_field_name(self, table_name, match_field_id):
+        return self.get_match_field(table_name, id=match_field_id).name
+
+    def get_match_field_pb(self, table_name, match_field_name, value):
+        p4info_match = self.get_match_field(table_name, match_field_name)
+        bitwidth = p4info_match.bitwidth
+        p4runtime_match = p4runtime_pb2.FieldMatch()
+        p4runtime_match.field_id = p4info_match.id
+        match_type = p4info_match.match_type
+        if match_type == p4info_pb2.MatchField.EXACT:
+            exact = p4runtime_match.exact
+            exact.value = encode(value, bitwidth)
+        elif match_type == p4info_pb2.MatchField.LPM:
+            lpm = p4runtime_match.lpm
+            lpm.value = encode(value[0], bitwidth)
+            lpm.prefix_len = value[1]
+        elif match_type == p4info_pb2.MatchField.TERNARY:
+            lpm = p4runtime_match.ternary
+            lpm.value = encode(value[0], bitwidth)
+            lpm.mask = encode(value[1], bitwidth)
+        elif match_type == p4info_pb2.MatchField.RANGE:
+            lpm = p4runtime_match.range
+            lpm.low = encode(value[0], bitwidth)
+            lpm.high = encode(value[1], bitwidth)
+        else:
+            raise Exception("Unsupported match type with type %r" % match_type)
+        return p4runtime_match
+
+    def get_match_field_value(self, match_field):
+        match_type = match_field.WhichOneof("field_match_type")
+        if match_type == 'valid':
+            return match_field.valid.value
+        elif match_type == 'exact':
+            return match_field.exact.value
+        elif match_type == 'lpm':
+            return (match_field.lpm.value, match_field.lpm.prefix_len)
+        elif match_type == 'ternary':
+            return (match_field.ternary.value, match_field.ternary.mask)
+        elif match_type == 'range':
+            return (match_field.range.low, match_field.range.high)
+        else:
+            raise Exception("Unsupported match type with type %r" % match_type)
+
+    def get_action_param(self, action_name, name=None, id=None):
+        by_name, by_id = self._action_params.get(action_name, ({}, {}))
+        if name is not None:
+            p = by_name.get(name)
+        else:
+            p = by_id.get(id)
+        if p is not None:
+            return p
+        raise AttributeError("action %r has no param %r, (has: %r)" % (
+            action_name, name if name is not None else id, list(by_name)))
+
+    def get_action_param_id(self, action_name, param_name):
+        return self.get_action_param(action_name, name=param_name).id
+
+    def get_action_param_name(self, action_name, param_id):
+        return self.get_action_param(action_name, id=param_id).name
+
+    def get_action_param_pb(self, action_name, param_name, value):
+        p4info_param = self.get_action_param(action_name, param_name)
+        p4runtime_param = p4runtime_pb2.Action.Param()
+        p4runtime_param.param_id = p4info_param.id
+        p4runtime_param.value = encode(value, p4info_param.bitwidth)
+        return p4runtime_param
+
+    def buildTableEntry(self,
+                        table_name,
+                        match_fields=None,
+                        default_action=False,
+                        action_name=None,
+                        action_params=None,
+                        priority=None):
+        table_entry = p4runtime_pb2.TableEntry()
+        table_entry.table_id = self.get_tables_id(table_name)
+
+        if priority is not None:
+            table_entry.priority = priority
+
+        if match_fields:
+            table_entry.match.extend([
+                self.get_match_field_pb(table_name, match_field_name, value)
+                for match_field_name, value in match_fields.items()
+            ])
+
+        if default_action:
+            table_entry.is_default_action = True
+
+        if action_name:
+            action = table_entry.action.action
+            action.action_id = self.get_actions_id(action_name)
+            if action_params:
+                action.params.extend([
+                    self.get_action_param_pb(action_name, field_name, value)
+                    for field_name, value in action_params.items()
+                ])
+        return table_entry
+
+    def buildTableEntryEncoder(self,
+                               table_name,
+                               action_name,
+                               match_fields=None,
+                               action_params=None,
+                               priority=False):
+        """Returns a TableEntryEncoder building entries of `table_name` with
+        action `action_name`. Use it instead of buildTableEntry when building
+        many entries of the same shape."""
+        return TableEntryEncoder(self, table_name, action_name,
+                                 match_fields=match_fields,
+                                 action_params=action_params,
+                                 priority=priority)
+
+    def buildMulticastGroupEntry(self, multicast_group_id, replicas):
+        mc_entry = p4runtime_pb2.PacketReplicationEngineEntry()
+        mc_entry.multicast_group_entry.multicast_group_id = multicast_group_id
+        for replica in replicas:
+            r = p4runtime_pb2.Replica()
+            r.egress_port = replica['egress_port']
+            r.instance = replica['instance']
+            mc_entry.multicast_group_entry.replicas.extend([r])
+        return mc_entry
+
+    def buildCloneSessionEntry(self, clone_session_id, replicas, packet_length_bytes=0):
+        clone_entry = p4runtime_pb2.PacketReplicationEngineEntry()
+        clone_entry.clone_session_entry.session_id = clone_session_id
+        clone_entry.clone_session_entry.packet_length_bytes = packet_length_bytes
+        clone_entry.clone_session_entry.class_of_service = 0  # PI currently supports only CoS=0 for clone session entry
+        for replica in replicas:
+            r = p4runtime_pb2.Replica()
+            r.egress_port = replica['egress_port']
+            r.instance = replica['instance']
+            clone_entry.clone_session_entry.replicas.extend([r])
+        return clone_entry
+
+
+def _exact_setter(field_id, bitwidth):
+    encode_value = makeEncoder(bitwidth)
+    def set_match(table_entry, value):
+        m = table_entry.match.add()
+        m.field_id = field_id
+        m.exact.value = encode_value(value)
+    return set_match
+
+def _lpm_setter(field_id, bitwidth):
+    encode_value = makeEncoder(bitwidth)
+    def set_match(table_entry, value):
+        m = table_entry.match.add()
+        m.field_id = field_id
+        m.lpm.value = encode_value(value[0])
+        m.lpm.prefix_len = value[1]
+    return set_match
+
+def _ternary_setter(field_id, bitwidth):
+    encode_value = makeEncoder(bitwidth)
+    def set_match(table_entry, value):
+        m = table_entry.match.add()
+        m.field_id = field_id
+        m.ternary.value = encode_value(value[0])
+        m.ternary.mask = encode_value(value[1])
+    return set_match
+
+def _range_setter(field_id, bitwidth):
+    encode_value = makeEncoder(bitwidth)
+    def set_match(table_entry, value):
+        m = table_entry.match.add()
+        m.field_id = field_id
+        m.range.low = encode_value(value[0])
+        m.range.high = encode_value(value[1])
+    return set_match
+
+MATCH_SETTERS = {
+    p4info_pb2.MatchField.EXACT: _exact_setter,
+    p4info_pb2.MatchField.LPM: _lpm_setter,
+    p4info_pb2.MatchField.TERNARY: _ternary_setter,
+    p4info_pb2.MatchField.RANGE: _range_setter,
+}
+
+def _param_setter(param_id, bitwidth):
+    encode_value = makeEncoder(bitwidth)
+    def set_param(action, value):
+        p = action.params.add()
+        p.param_id = param_id
+        p.value = encode_value(value)
+    return set_param
+
+
+class TableEntryEncoder(object):
+    """Builds TableEntry messages for a fixed table and action.
+
+    The table, match fields and action params are resolved against the P4Info
+    once, when the encoder is created, so building an entry only encodes the
+    values. A row holds one value per column, in the order given by `columns`:
+    the match fields, then the action params, then the priority (if
+    `priority` is True). Match values use the same format as buildTableEntry,
+    e.g. (value, prefix_len) for LPM and (value, mask) for ternary fields.
+    """
+
+    def __init__(self, p4info_helper, table_name, action_name,
+                 match_fields=None, action_params=None, priority=False):
+        table = p4info_helper.get('tables', name=table_name)
+        action = p4info_helper.get('actions', name=action_name)
+        table_name = table.preamble.name
+        action_name = action.preamble.name
+        self.table_id = table.preamble.id
+        self.action_id = action.preamble.id
+
+        if match_fields is None:
+            match_fields = [mf.name for mf in table.match_fields]
+        if action_params is None:
+            action_params = [p.name for p in action.params]
+
+        self.match_setters = []
+        for match_field_name in match_fields:
+            mf = p4info_helper.get_match_field(table_name, match_field_name)
+            if mf.match_type not in MATCH_SETTERS:
+                raise Exception("Unsupported match type with type %r" % mf.match_type)
+            self.match_setters.append(MATCH_SETTERS[mf.match_type](mf.id, mf.bitwidth))
+
+        self.param_setters = []
+        for param_name in action_params:
+            p = p4info_helper.get_action_param(action_name, param_name)
+            self.param_setters.append(_param_setter(p.id, p.bitwidth))
+
+        self.priority = priority
+        self.columns = list(match_fields) + list(action_params)
+        if priority:
+            self.columns.append('priority')
+
+    def build(self, row):
+        "Builds a TableEntry from a tuple/list or a dict of column values"
+        if isinstance(row, dict):
+            row = [row[column] for column in self.columns]
+        elif len(row) != len(self.columns):
+            raise Exception("Expected %d values %r, got %d" % (
+                len(self.columns), self.columns, len(row)))
+
+        table_entry = p4runtime_pb2.TableEntry()
+        table_entry.table_id = self.table_id
+        i = 0
+        for set_match in self.match_setters:
+            set_match(table_entry, row[i])
+            i += 1
+        action = table_entry.action.action
+        action.action_id = self.action_id
+        for set_param in self.param_setters:
+            set_param(action, row[i])
+            i += 1
+        if self.priority:
+            table_entry.priority = row[i]
+        return table_entry
+
+    def buildMany(self, rows):
+        "Yields a TableEntry for each row"
+        build = self.build
+        for row in rows:
+            yield build(row)
+
+    def buildFromColumns(self, columns):
+        """Yields a TableEntry for each row of the given columns, either a dict
+        of column name to values or a sequence of columns in `columns` order.
+        Columns can be lists or NumPy arrays."""
+        if isinstance(columns, dict):
+            columns = [columns[column] for column in self.columns]
+        # NumPy arrays are converted to lists of Python ints in one go
+        columns = [c.tolist() if hasattr(c, 'tolist') else c for c in columns]
+        return self.buildMany(zip(*columns))
@@ -0,0 +1,351 @@
+# Copyright 2017-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import socket
+import threading
+from time import monotonic
+
+import grpc
+from p4.v1 import p4runtime_pb2
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Upper bounds of the write batch size histogram buckets, in updates
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+
+# Default port of PrometheusServer, the usual exporter port. Prometheus' own
+# 9090 is also the first Thrift port given to the BMv2 switches.
+PROMETHEUS_PORT = 9100
+
+UPDATE_TYPE_NAMES = dict((value, name.lower()) for name, value in
+                         p4runtime_pb2.Update.Type.items())
+
+class Histogram(object):
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # One count per bucket, plus the +Inf bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def toJson(self):
+        cumulative = []
+        total = 0
+        for count in self.counts:
+            total += count
+            cumulative.append(total)
+        return {
+            'buckets': dict(zip(list(self.buckets) + ['+Inf'], cumulative)),
+            'count': self.count,
+            'sum': self.sum,
+        }
+
+
+class MetricsRegistry(object):
+    """Counters, histograms and gauges of the controller, by name and labels.
+
+    The switch connections record their RPCs here (see MetricsInterceptor)
+    and the stream dispatchers their message counts and queue depths. The
+    values are read with snapshot(), or exported by the sinks: a
+    PrometheusServer scrapes the registry, while push sinks (StatsdSink)
+    are registered with addSink() and told about every recorded value.
+    Set `enabled` to False to stop recording.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.lock = threading.Lock()
+        # (name, labels) -> value, with labels a sorted tuple of pairs
+        self.counters = {}
+        self.histograms = {}
+        # (name, labels) -> function returning the current value
+        self.gauges = {}
+        self.sinks = []
+
+    def addSink(self, sink):
+        self.sinks.append(sink)
+
+    def removeSink(self, sink):
+        self.sinks.remove(sink)
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+        for sink in self.sinks:
+            sink.count(name, value, key[1])
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+        for sink in self.sinks:
+            sink.observe(name, value, key[1])
+
+    def setGauge(self, name, fn, **labels):
+        "Registers fn() as the value of a gauge, read when exported"
+        with self.lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = fn
+
+    def removeGauges(self, **labels):
+        "Removes the gauges having all the given labels"
+        labels = set(labels.items())
+        with self.lock:
+            for key in [key for key in self.gauges if labels <= set(key[1])]:
+                del self.gauges[key]
+
+    def gaugeValues(self):
+        with self.lock:
+            gauges = list(self.gauges.items())
+        values = []
+        for key, fn in gauges:
+            try:
+                values.append((key, fn()))
+            except Exception:
+                pass # e.g. the connection was shut down
+        return values
+
+    def snapshot(self):
+        """Returns the current values as a dict of metric name ->
+        {labels: value}, with labels a tuple of (name, value) pairs and
+        histograms as dicts (see Histogram.toJson). 'time' holds the
+        monotonic time of the snapshot, see rates()."""
+        snapshot = {'time': monotonic()}
+        with self.lock:
+            for (name, labels), value in self.counters.items():
+                snapshot.setdefault(name, {})[labels] = value
+            for (name, labels), histogram in self.histograms.items():
+                snapshot.setdefault(name, {})[labels] = histogram.toJson()
+        for (name, labels), value in self.gaugeValues():
+            snapshot.setdefault(name, {})[labels] = value
+        return snapshot
+
+    def prometheusText(self):
+        "Returns the metrics in the Prometheus text exposition format"
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, histogram.toJson())
+                                for key, histogram in self.histograms.items())
+        gauges = sorted(self.gaugeValues())
+        last_name = None
+        for (name, labels), value in counters:
+            if name != last_name:
+                lines.append('# TYPE %s counter' % name)
+                last_name = name
+            lines.append('%s%s %s' % (name, _labelsText(labels), value))
+        for (name, labels), value in gauges:
+            if name != last_name:
+                lines.append('# TYPE %s gauge' % name)
+                last_name = name
+            lines.append('%s%s %s' % (name, _labelsText(labels), value))
+        for (name, labels), histogram in histograms:
+            if name != last_name:
+                lines.append('# TYPE %s histogram' % name)
+                last_name = name
+            for bound, count in histogram['buckets'].items():
+                lines.append('%s_bucket%s %d' % (
+                    name, _labelsText(labels + (('le', str(bound)),)), count))
+            lines.append('%s_count%s %d' % (name, _labelsText(labels), histogram['count']))
+            lines.append('%s_sum%s %s' % (name, _labelsText(labels), histogram['sum']))
+        return '\n'.join(lines) + '\n'
+
+def _labelsText(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                             for name, value in labels)
+
+def rates(previous, current):
+    """Returns the per-second rates of the counters between two snapshots,
+    as {name: {labels: rate}}"""
+    elapsed = current['time'] - previous['time']
+    result = {}
+    if elapsed <= 0:
+        return result
+    for name, values in current.items():
+        if name == 'time':
+            continue
+        for labels, value in values.items():
+            if not isinstance(value, (int, float)) or not name.endswith('_total'):
+                continue
+            before = previous.get(name, {}).get(labels, 0)
+            result.setdefault(name, {})[labels] = (value - before) / elapsed
+    return result
+
+# Registry used by the switch connections unless given another one
+registry = MetricsRegistry()
+
+
+class MetricsInterceptor(grpc.UnaryUnaryClientInterceptor,
+                         grpc.UnaryStreamClientInterceptor):
+    """Records the latency and status of the unary and server streaming
+    RPCs of a switch connection (all but StreamChannel), and the sizes of
+    the write batches:
+
+        p4runtime_rpc_seconds{switch,method,code}   latency histogram
+        p4runtime_rpc_total{switch,method,code}
+        p4runtime_write_batch_size{switch}          updates per WriteRequest
+        p4runtime_updates_total{switch,type}        updates by type
+    """
+
+    def __init__(self, registry, switch):
+        self.registry = registry
+        self.switch = switch
+
+    def _start(self, client_call_details, request):
+        method = client_call_details.method.rsplit('/', 1)[-1]
+        if method == 'Write':
+            recordWriteRequest(self.registry, self.switch, request)
+        return method, monotonic()
+
+    def _done(self, method, started, call):
+        code = call.code()
+        code = code.name if code is not None else 'UNKNOWN'
+        self.registry.observe('p4runtime_rpc_seconds', monotonic() - started,
+                              switch=self.switch, method=method, code=code)
+        self.registry.inc('p4runtime_rpc_total', switch=self.switch, method=method, code=code)
+
+    def intercept_unary_unary(self, continuation, client_call_details, request):
+        if not self.registry.enabled:
+            return continuation(client_call_details, request)
+        method, started = self._start(client_call_details, request)
+        call = continuation(client_call_details, request)
+        call.add_done_callback(lambda call: self._done(method, started, call))
+        return call
+
+    # Reads complete once their last response has been received
+    intercept_unary_stream = intercept_unary_unary
+
+def recordWriteRequest(registry, switch, request):
+    registry.observe('p4runtime_write_batch_size', len(request.updates),
+                     buckets=BATCH_SIZE_BUCKETS, switch=switch)
+    counts = {}
+    for update in request.updates:
+        counts[update.type] = counts.get(update.type, 0) + 1
+    for update_type, count in counts.items():
+        registry.inc('p4runtime_updates_total', count, switch=switch,
+                     type=UPDATE_TYPE_NAMES.get(update_type, update_type))
+
+
+class PrometheusServer(object):
+    """Serves the metrics of a registry on http://<address>:<port>/metrics,
+    from a background thread. Listens on localhost by default; pass port=0
+    for an ephemeral port, then read it from `port`."""
+
+    def __init__(self, registry=registry, port=PROMETHEUS_PORT, address='127.0.0.1'):
+        metrics_registry = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics_registry.prometheusText().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass # scrapes are not logged
+
+        self.server = ThreadingHTTPServer((address, port), Handler)
+        self.port = self.server.server_address[1]
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name='metrics-http')
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class StatsdSink(object):
+    """Sends the recorded values to a StatsD server over UDP, with the labels
+    as tags (the DogStatsD/Telegraf "|#name:value" extension). Latencies
+    (metrics ending in _seconds) are sent as timings in milliseconds, other
+    histograms as histograms ("h"). The gauges are sent every
+    `gauge_interval` seconds by a background thread.
+
+        registry.addSink(StatsdSink(registry).start())
+    """
+
+    def __init__(self, registry=registry, host='127.0.0.1', port=8125, prefix='',
+                 gauge_interval=10.0):
+        self.registry = registry
+        self.address = (host, port)
+        self.prefix = prefix
+        self.gauge_interval = gauge_interval
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def _send(self, name, value, kind, labels):
+        line = '%s%s:%s|%s' % (self.prefix, name, value, kind)
+        if labels:
+            line += '|#' + ','.join('%s:%s' % label for label in labels)
+        try:
+            self.socket.sendto(line.encode('utf-8'), self.address)
+        except OSError:
+            pass # metrics are never worth failing or blocking the controller
+
+    def count(self, name, value, labels):
+        self._send(name, value, 'c', labels)
+
+    def observe(self, name, value, labels):
+        if name.endswith('_seconds'):
+            self._send(name[:-len('_seconds')] + '_ms', '%.3f' % (value * 1000), 'ms', labels)
+        else:
+            self._send(name, value, 'h', labels)
+
+    def sendGauges(self):
+        for (name, labels), value in self.registry.gaugeValues():
+            self._send(name, value, 'g', labels)
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='metrics-statsd')
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def _run(self):
+        while not self.stopped.wait(self.gauge_interval):
+            self.sendGauges()
+
+    def stop(self):
+        self.stopped.set()
+        self.socket.close()
@@ -0,0 +1,175 @@
+# Copyright 2017-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from p4.v1 import p4runtime_pb2
+
+from .switch import entityKey, entityValue
+
+INSERT = p4runtime_pb2.Update.INSERT
+MODIFY = p4runtime_pb2.Update.MODIFY
+DELETE = p4runtime_pb2.Update.DELETE
+
+def readEntities(sw):
+    """Reads the table entries, multicast groups and clone sessions of the
+    switch. Returns {entityKey: entity}."""
+    current = {}
+    for response in sw.ReadTableEntries():
+        for entity in response.entities:
+            current[entityKey(entity.table_entry)] = entity.table_entry
+    for response in sw.ReadPREEntries():
+        for entity in response.entities:
+            pre_entry = entity.packet_replication_engine_entry
+            current[entityKey(pre_entry)] = pre_entry
+    return current
+
+def diffEntities(desired, current, delete=True):
+    """Returns the [(update type, entity)] turning the `current` entities
+    ({entityKey: entity}, see readEntities) into the `desired` ones.
+
+    Entities already on the switch with the same value are left alone, and
+    with delete=True, entities that are not desired are deleted. Default
+    actions always exist, so missing ones are written with MODIFY (wildcard
+    reads don't return them). If several desired entities have the same key,
+    the last one wins.
+    """
+    by_key = {}
+    for entity in desired:
+        by_key[entityKey(entity)] = entity
+
+    deletes = []
+    modifies = []
+    inserts = []
+    if delete:
+        for key, entity in current.items():
+            if key not in by_key:
+                deletes.append((DELETE, entity))
+    for key, entity in by_key.items():
+        existing = current.get(key)
+        if existing is None:
+            if isinstance(entity, p4runtime_pb2.TableEntry) and entity.is_default_action:
+                modifies.append((MODIFY, entity))
+            else:
+                inserts.append((INSERT, entity))
+        elif entityValue(existing) != entityValue(entity):
+            modifies.append((MODIFY, entity))
+    return deletes + modifies + inserts
+
+def _newEntityUpdate(entity):
+    if isinstance(entity, p4runtime_pb2.TableEntry) and entity.is_default_action:
+        return MODIFY
+    return INSERT
+
+def streamDiff(desired, current, delete=True):
+    """Yields the same updates as diffEntities, but `desired` may be any
+    iterable, e.g. a generator building the entities one at a time.
+
+    Against an empty switch (no `current` entities), each entity is yielded
+    as soon as it is built, and a repeated key is written again with MODIFY.
+    Otherwise only the keys of the desired entities and the updates are held
+    until the deletes have been yielded.
+    """
+    if not current:
+        seen = set()
+        for entity in desired:
+            key = entityKey(entity)
+            yield (MODIFY if key in seen else _newEntityUpdate(entity)), entity
+            seen.add(key)
+        return
+
+    seen = set()
+    changes = {}
+    for entity in desired:
+        key = entityKey(entity)
+        seen.add(key)
+        existing = current.get(key)
+        if existing is None:
+            changes[key] = (_newEntityUpdate(entity), entity)
+        elif entityValue(existing) != entityValue(entity):
+            changes[key] = (MODIFY, entity)
+        else:
+            changes.pop(key, None)
+    if delete:
+        for key, entity in current.items():
+            if key not in seen:
+                yield DELETE, entity
+    for update_type in (MODIFY, INSERT):
+        for update in changes.values():
+            if update[0] == update_type:
+                yield update
+
+def applyDiff(sw, diff, **kwargs):
+    """Writes a diff to the switch in batched WriteRequests, see WriteBatch.
+
+    The updates of one WriteRequest may be applied in any order, so the
+    deletes are sent in their own WriteRequests before the other updates, to
+    free table space for the inserts.
+    """
+    with sw.WriteBatch(**kwargs) as batch:
+        for update_type, entity in diff:
+            if update_type != DELETE and batch.updates and \
+                    batch.updates[-1].type == DELETE:
+                batch.Flush()
+            batch.Update(update_type, entity)
+
+def reconcile(sw, desired, delete=True, dry_run=False):
+    """Reads the switch state and writes the minimal set of updates making it
+    match the `desired` entities. With dry_run=True nothing is written.
+    Returns the diff (see diffEntities)."""
+    diff = diffEntities(desired, readEntities(sw), delete=delete)
+    if not dry_run:
+        applyDiff(sw, diff)
+    return diff
+
+UPDATE_SYMBOLS = {INSERT: '+', MODIFY: '~', DELETE: '-'}
+
+def entityToString(p4info_helper, entity):
+    if isinstance(entity, p4runtime_pb2.PacketReplicationEngineEntry):
+        if entity.HasField('multicast_group_entry'):
+            group = entity.multicast_group_entry
+            return 'Group %d => (%s)' % (group.multicast_group_id,
+                                         ', '.join('%d' % r.egress_port for r in group.replicas))
+        clone = entity.clone_session_entry
+        return 'Clone Session %d => (%s) (%s)' % (
+            clone.session_id, ', '.join('%d' % r.egress_port for r in clone.replicas),
+            '%dB' % clone.packet_length_bytes if clone.packet_length_bytes else 'NO_TRUNCATION')
+
+    table_name = p4info_helper.get_tables_name(entity.table_id)
+    if entity.match:
+        match_str = ', '.join('%s=%r' % (
+            p4info_helper.get_match_field_name(table_name, m.field_id),
+            p4info_helper.get_match_field_value(m)) for m in entity.match)
+    elif entity.is_default_action:
+        match_str = '(default action)'
+    else:
+        match_str = '(any)'
+    if entity.priority:
+        match_str += ' priority=%d' % entity.priority
+    if entity.action.HasField('action'):
+        action = entity.action.action
+        action_name = p4info_helper.get_actions_name(action.action_id)
+        params = ', '.join('%s=%r' % (
+            p4info_helper.get_action_param_name(action_name, p.param_id), p.value)
+            for p in action.params)
+        action_str = '%s(%s)' % (action_name, params)
+    else:
+        action_str = str(entity.action).strip()
+    return '%s: %s => %s' % (table_name, match_str, action_str)
+
+def updateToString(p4info_helper, update_type, entity):
+    return '%s %s' % (UPDATE_SYMBOLS[update_type], entityToString(p4info_helper, entity))
+
+def diffToString(p4info_helper, diff):
+    "Formats a diff as one '+', '~' or '-' line per update"
+    return '\n'.join(updateToString(p4info_helper, update_type, entity)
+                     for update_type, entity in diff)
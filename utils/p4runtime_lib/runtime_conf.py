@@ -0,0 +1,218 @@
+# Copyright 2017-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import json
+import re
+from sys import intern
+
+READ_SIZE = 1 << 16
+
+whitespace_pattern = re.compile(r'[ \t\r\n]*')
+
+def _tuple(value):
+    # JSON lists (e.g. [address, prefix_len]) are stored as tuples
+    return tuple(value) if isinstance(value, list) else value
+
+def _str(value):
+    # Formats values as they appeared in the JSON file
+    return str(list(value)) if isinstance(value, tuple) else str(value)
+
+
+class TableRule(object):
+    "A table entry of a runtime JSON file"
+    __slots__ = ('table', 'match', 'action_name', 'action_params', 'priority',
+                 'default_action')
+
+    def __init__(self, table, match=None, action_name=None, action_params=(),
+                 priority=None, default_action=None):
+        self.table = table
+        # Tuples of (name, value) pairs, in the order of the file
+        self.match = match
+        self.action_name = action_name
+        self.action_params = action_params
+        self.priority = priority
+        self.default_action = default_action
+
+    @classmethod
+    def fromJson(cls, flow):
+        # Names repeat in every rule, so a single copy of each is kept
+        match = flow.get('match') # None if not found
+        if match is not None:
+            match = tuple((intern(name), _tuple(value)) for name, value in match.items())
+        return cls(intern(flow['table']), match, intern(flow['action_name']),
+                   tuple((intern(name), value) for name, value in flow['action_params'].items()),
+                   flow.get('priority'), flow.get('default_action'))
+
+    def build(self, p4info_helper):
+        return p4info_helper.buildTableEntry(
+            table_name=self.table,
+            match_fields=dict(self.match) if self.match is not None else None,
+            default_action=self.default_action,
+            action_name=self.action_name,
+            action_params=dict(self.action_params),
+            priority=self.priority)
+
+    def __str__(self):
+        if self.match is not None:
+            match_str = ', '.join('%s=%s' % (name, _str(value)) for name, value in self.match)
+        elif self.default_action:
+            match_str = '(default action)'
+        else:
+            match_str = '(any)'
+        params = ', '.join('%s=%s' % (name, _str(value)) for name, value in self.action_params)
+        return "%s: %s => %s(%s)" % (self.table, match_str, self.action_name, params)
+
+
+class GroupRule(object):
+    "A multicast group entry of a runtime JSON file"
+    __slots__ = ('multicast_group_id', 'replicas')
+
+    def __init__(self, multicast_group_id, replicas):
+        self.multicast_group_id = multicast_group_id
+        # Tuple of (egress_port, instance) pairs
+        self.replicas = replicas
+
+    @classmethod
+    def fromJson(cls, rule):
+        return cls(rule['multicast_group_id'],
+                   tuple((r['egress_port'], r['instance']) for r in rule['replicas']))
+
+    def build(self, p4info_helper):
+        return p4info_helper.buildMulticastGroupEntry(self.multicast_group_id, [
+            {'egress_port': port, 'instance': instance} for port, instance in self.replicas])
+
+    def __str__(self):
+        ports_str = ', '.join('%d' % port for port, _ in self.replicas)
+        return 'Group {0} => ({1})'.format(self.multicast_group_id, ports_str)
+
+
+class CloneRule(object):
+    "A clone session entry of a runtime JSON file"
+    __slots__ = ('clone_session_id', 'replicas', 'packet_length_bytes')
+
+    def __init__(self, clone_session_id, replicas, packet_length_bytes=None):
+        self.clone_session_id = clone_session_id
+        self.replicas = replicas
+        self.packet_length_bytes = packet_length_bytes
+
+    @classmethod
+    def fromJson(cls, rule):
+        return cls(rule['clone_session_id'],
+                   tuple((r['egress_port'], r['instance']) for r in rule['replicas']),
+                   rule.get('packet_length_bytes'))
+
+    def build(self, p4info_helper):
+        return p4info_helper.buildCloneSessionEntry(self.clone_session_id, [
+            {'egress_port': port, 'instance': instance} for port, instance in self.replicas],
+            self.packet_length_bytes or 0)
+
+    def __str__(self):
+        if self.packet_length_bytes is not None:
+            packet_length_bytes = str(self.packet_length_bytes)+"B"
+        else:
+            packet_length_bytes = "NO_TRUNCATION"
+        ports_str = ', '.join('%d' % port for port, _ in self.replicas)
+        return 'Clone Session {0} => ({1}) ({2})'.format(
+            self.clone_session_id, ports_str, packet_length_bytes)
+
+
+# Runtime JSON keys holding lists of rules, and the class of their rules
+RULE_CLASSES = {
+    'table_entries': TableRule,
+    'multicast_group_entries': GroupRule,
+    'clone_session_entries': CloneRule,
+}
+
+
+class _JSONStream(object):
+    """Reads JSON values one at a time from a file, holding only a chunk of
+    the file in memory"""
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = self.f.read(READ_SIZE)
+        if not chunk:
+            self.eof = True
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+
+    def peek(self):
+        "Skips whitespace and returns the next character ('' at the end)"
+        while True:
+            self.pos = whitespace_pattern.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) or self.eof:
+                return self.buf[self.pos:self.pos + 1]
+            self._fill()
+
+    def expect(self, chars):
+        c = self.peek()
+        if not c or c not in chars:
+            raise ValueError("Expected one of %r at %r" % (chars, self.buf[self.pos:self.pos + 40]))
+        self.pos += 1
+        return c
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self._fill()
+                continue
+            if end == len(self.buf) and not self.eof:
+                # A number may go on in the next chunk
+                self._fill()
+                continue
+            self.pos = end
+            return obj
+
+    def items(self):
+        "Yields the items of the array starting at the current position"
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(',]') == ']':
+                return
+
+
+def loadRuntimeConf(f):
+    """Loads a runtime JSON file. The rule lists (see RULE_CLASSES) are parsed
+    one rule at a time into compact rule objects, so that the whole file is
+    never held in memory as nested dicts."""
+    stream = _JSONStream(f)
+    conf = {}
+    stream.expect('{')
+    if stream.peek() == '}':
+        return conf
+    while True:
+        key = stream.value()
+        stream.expect(':')
+        rule_class = RULE_CLASSES.get(key)
+        if rule_class is not None and stream.peek() == '[':
+            conf[key] = [rule_class.fromJson(rule) for rule in stream.items()]
+        else:
+            conf[key] = stream.value()
+        if stream.expect(',}') == '}':
+            return conf
@@ -0,0 +1,358 @@
+# Copyright 2017-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import random
+import threading
+from time import monotonic
+
+import grpc
+
+from . import reconcile
+
+# Seconds waited for the switch on the first reconnect attempt, doubled on
+# each failed attempt up to the max
+RECONNECT_INITIAL_BACKOFF = 0.1
+RECONNECT_MAX_BACKOFF = 10.0
+
+# Seconds between the reads keeping the shadow store of a backup up to date
+SHADOW_SYNC_INTERVAL = 5.0
+
+class SwitchSession(object):
+    """Keeps a switch connection usable across stream failures, switch
+    restarts and changes of primary controller.
+
+    Once started, the session reads the stream channel of the connection
+    with a StreamDispatcher (see SwitchConnection.StartStreamDispatcher).
+    When the stream breaks (or an RPC made through call() finds the switch
+    unreachable), a background thread reconnects with exponential backoff
+    and sends the MasterArbitrationUpdate again. If this controller is the
+    primary, it then pushes the pipeline again when the switch lost it
+    (`pipeline` holds the SetForwardingPipelineConfig kwargs) and replays
+    the entries: the `desired` entities (a list, or a function returning
+    one) if given, else the entries recorded by the shadow store of the
+    connection. Only the missing or changed entries are written, see
+    reconcile.diffEntities.
+
+    Several controllers can run sessions on the same switch with different
+    election ids (see SwitchConnectionBase). The backups keep their stream
+    open and their shadow store in sync with the switch, every
+    `sync_interval` seconds. When the switch makes one of them primary, it
+    reads the switch state a last time and takes over right away, calling
+    on_primary(session); on_backup(session) is called when it loses the
+    primary role. Without a primary (e.g. after the primary left without
+    the switch promoting anyone), a backup claims the role again.
+
+    Other errors of the session thread (e.g. entries the switch rejects on
+    replay) are printed and the step is retried with backoff. The thread
+    exits once the session is closed or the connection shut down.
+
+    The outages and takeovers are counted and timed, see stats().
+    """
+
+    def __init__(self, sw, pipeline=None, desired=None,
+                 initial_backoff=RECONNECT_INITIAL_BACKOFF,
+                 max_backoff=RECONNECT_MAX_BACKOFF, on_recovered=None,
+                 on_primary=None, on_backup=None, sync_interval=SHADOW_SYNC_INTERVAL):
+        self.sw = sw
+        self.pipeline = pipeline
+        self.desired = desired
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.sync_interval = sync_interval
+        # Called as on_recovered(session) after each recovery
+        self.on_recovered = on_recovered
+        self.on_primary = on_primary
+        self.on_backup = on_backup
+        self.up = threading.Event()
+        self.primary = threading.Event()
+        # Wakes up the session thread, see _run
+        self.wakeup = threading.Event()
+        # Set by close(), cuts the backoff waits short
+        self.closing = threading.Event()
+        self.lost = False
+        self.claimed = False
+        self.closed = False
+        self.thread = None
+        # Metrics
+        self.outages = 0
+        self.reconnect_attempts = 0
+        self.pipeline_pushes = 0
+        self.replayed_updates = 0
+        self.downtime = 0.0
+        self.last_downtime = None
+        self.down_since = None
+        self.takeovers = 0
+        self.last_takeover = None
+
+    def start(self):
+        """Sends the MasterArbitrationUpdate and starts watching the
+        connection. Returns the session; check isPrimary() or waitPrimary()
+        before writing."""
+        dispatcher = self.sw.StartStreamDispatcher()
+        dispatcher.on('arbitration', self._onArbitration)
+        self.sw.MasterArbitrationUpdate()
+        self._watch()
+        self.up.set()
+        if self.sw.is_primary:
+            self.primary.set()
+        elif self.sw.shadow is not None:
+            self._syncShadow()
+        self.thread = threading.Thread(target=self._run,
+                                       name='session-%s' % (self.sw.name or self.sw.address))
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def close(self):
+        "Stops recovering the connection, without shutting it down"
+        self.closed = True
+        self.closing.set()
+        self.wakeup.set()
+        if self.thread is not None and threading.current_thread() is not self.thread:
+            self.thread.join()
+
+    def isUp(self):
+        return self.up.is_set()
+
+    def waitUp(self, timeout=None):
+        "Waits until the session is up, returns False after `timeout` seconds"
+        return self.up.wait(timeout)
+
+    def isPrimary(self):
+        return self.primary.is_set()
+
+    def waitPrimary(self, timeout=None):
+        """Waits until this controller is the primary of the switch, returns
+        False after `timeout` seconds"""
+        return self.primary.wait(timeout)
+
+    def call(self, fn, *args, **kwargs):
+        """Returns fn(*args, **kwargs), which makes RPCs on the connection.
+        If it fails because the switch is unreachable, the session is
+        recovered and fn is called again. Pass timeout=<seconds> to give up
+        (raising the RpcError) if the session is not up again by then."""
+        timeout = kwargs.pop('timeout', None)
+        while True:
+            try:
+                return fn(*args, **kwargs)
+            except grpc.RpcError as e:
+                if self._stopped() or e.code() != grpc.StatusCode.UNAVAILABLE:
+                    raise
+                self._setLost()
+                if not self._waitRecovered(timeout):
+                    raise
+
+    def stats(self):
+        "Returns the session metrics as a dict"
+        downtime = self.downtime
+        if self.down_since is not None:
+            downtime += monotonic() - self.down_since
+        return {
+            'up': self.isUp(),
+            'primary': self.isPrimary(),
+            'election_id': self.sw.election_id,
+            'outages': self.outages,
+            'reconnect_attempts': self.reconnect_attempts,
+            'pipeline_pushes': self.pipeline_pushes,
+            'replayed_updates': self.replayed_updates,
+            'downtime': downtime,
+            'last_downtime': self.last_downtime,
+            'takeovers': self.takeovers,
+            'last_takeover': self.last_takeover,
+        }
+
+    def _stopped(self):
+        return self.closed or self.sw.closed
+
+    def _waitRecovered(self, timeout):
+        # Like waitUp, but gives up as soon as the session is stopped
+        deadline = None if timeout is None else monotonic() + timeout
+        while not self._stopped():
+            wait = 0.5 if deadline is None else min(0.5, deadline - monotonic())
+            if self.up.wait(max(wait, 0)):
+                return True
+            if deadline is not None and monotonic() >= deadline:
+                return False
+        return False
+
+    def _setLost(self):
+        self.up.clear()
+        self.lost = True
+        self.wakeup.set()
+
+    def _connectionLost(self, e):
+        # RpcErrors of a lost stream or an unreachable switch, retried by
+        # _recover; other errors (e.g. a rejected write) are retried with
+        # backoff by the caller
+        return isinstance(e, grpc.RpcError) and (
+            self.lost or e.code() == grpc.StatusCode.UNAVAILABLE)
+
+    def _watch(self):
+        stream = self.sw.stream_msg_resp
+
+        def onDone(_):
+            # Ignores the streams replaced by a reconnect
+            if stream is self.sw.stream_msg_resp and not self.closed:
+                self._setLost()
+        stream.add_done_callback(onDone)
+
+    def _onArbitration(self, sw, msg):
+        # Called on the dispatcher thread, which must not block: the role
+        # change is handled by the session thread
+        self.wakeup.set()
+
+    def _run(self):
+        backoff = self.initial_backoff
+        while True:
+            if self.primary.is_set() or self.sw.shadow is None:
+                timeout = None
+            else:
+                timeout = self.sync_interval
+            woken = self.wakeup.wait(timeout)
+            self.wakeup.clear()
+            if self._stopped():
+                return
+            try:
+                if self.lost:
+                    self._recover()
+                    if self._stopped():
+                        return
+                self._updateRole()
+                if not woken and not self.primary.is_set():
+                    self._syncShadow()
+            except Exception as e:
+                if self._stopped():
+                    return
+                if self._connectionLost(e):
+                    # Recovered on the next iteration
+                    self._setLost()
+                    continue
+                # Nothing else wakes the thread up, e.g. when a takeover
+                # fails while the stream stays up
+                print("%s: %r, retrying in %.2fs" % (self.sw.name or self.sw.address, e, backoff))
+                self.closing.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                self.wakeup.set()
+            else:
+                backoff = self.initial_backoff
+
+    def _updateRole(self):
+        name = self.sw.name or self.sw.address
+        if self.sw.is_primary:
+            self.claimed = False
+            if not self.primary.is_set():
+                self._takeover()
+        elif self.primary.is_set():
+            self.primary.clear()
+            print("%s: no longer primary (primary election id %s)" % (
+                name, self.sw.primary_election_id))
+            if self.on_backup is not None:
+                self.on_backup(self)
+        elif self.sw.primary_election_id is None:
+            # Claimed once per primary loss, so that a switch refusing this
+            # controller is not flooded with arbitration updates
+            if not self.claimed:
+                self.claimed = True
+                print("%s: no primary, claiming the primary role" % name)
+                self.sw.MasterArbitrationUpdate()
+        else:
+            self.claimed = False
+
+    def _takeover(self):
+        started = monotonic()
+        if self.sw.shadow is not None:
+            # The previous primary may have written since the last sync
+            self._syncShadow()
+        if self.desired is not None:
+            self._replay(pushed=False)
+        self.primary.set()
+        self.takeovers += 1
+        self.last_takeover = monotonic() - started
+        print("%s: primary (election id %d), took over in %.3fs" % (
+            self.sw.name or self.sw.address, self.sw.election_id, self.last_takeover))
+        if self.on_primary is not None:
+            self.on_primary(self)
+
+    def _syncShadow(self):
+        if self.sw.shadow is not None:
+            self.sw.shadow.load(reconcile.readEntities(self.sw).values())
+
+    def _recover(self):
+        self.up.clear()
+        self.down_since = monotonic()
+        self.outages += 1
+        print("%s: connection lost, reconnecting..." % (self.sw.name or self.sw.address))
+        backoff = self.initial_backoff
+        while not self._stopped():
+            self.reconnect_attempts += 1
+            try:
+                # Waits at most `backoff` seconds for the switch to come back
+                if self.sw.Reconnect(timeout=backoff):
+                    self.lost = False
+                    self.sw.MasterArbitrationUpdate()
+                    self._watch()
+                    # Backups leave the switch state to the primary
+                    if self.sw.is_primary:
+                        self._restore()
+                    break
+            except Exception as e:
+                if self._stopped():
+                    break
+                if not self._connectionLost(e):
+                    # The switch is reachable, so Reconnect did not wait
+                    print("%s: recovery failed: %r, retrying in %.2fs" % (
+                        self.sw.name or self.sw.address, e, backoff))
+                    self.lost = True
+                    self.closing.wait(backoff)
+            backoff = min(backoff * 2, self.max_backoff) * random.uniform(0.8, 1.0)
+        if self._stopped():
+            return
+        self.last_downtime = monotonic() - self.down_since
+        self.downtime += self.last_downtime
+        self.down_since = None
+        print("%s: recovered after %.2fs" % (self.sw.name or self.sw.address, self.last_downtime))
+        self.up.set()
+        if self.on_recovered is not None:
+            self.on_recovered(self)
+
+    def _restore(self):
+        # Taken before the push, which clears the shadow store
+        recorded = self._recorded()
+        pushed = False
+        if self.pipeline is not None:
+            pushed = self.sw.SetForwardingPipelineConfig(skip_unchanged=True, **self.pipeline)
+            if pushed:
+                self.pipeline_pushes += 1
+        self._replay(pushed, recorded)
+
+    def _recorded(self):
+        if self.sw.shadow is None:
+            return None
+        return self.sw.shadow.tableEntries() + self.sw.shadow.preEntries()
+
+    def _replay(self, pushed, recorded=None):
+        if self.desired is not None:
+            desired = self.desired() if callable(self.desired) else self.desired
+            delete = True
+        elif self.sw.shadow is not None:
+            desired = recorded if recorded is not None else self._recorded()
+            # Entries not written through this connection are left alone
+            delete = False
+        else:
+            return
+        # A new pipeline starts empty
+        current = {} if pushed else reconcile.readEntities(self.sw)
+        diff = reconcile.diffEntities(desired, current, delete=delete)
+        reconcile.applyDiff(self.sw, diff)
+        self.replayed_updates += len(diff)
@@ -0,0 +1,209 @@
+# Copyright 2017-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import random
+import threading
+
+from p4.v1 import p4runtime_pb2
+
+from .convert import encode, toCanonical
+from . import reconcile
+from .switch import entityKey
+
+class ShadowStore(object):
+    """In-memory copy of the table and PRE entries written to a switch.
+
+    Pass it to a switch connection (shadow=...) and every successful write
+    is recorded, so the switch state can be queried without reading it back.
+    Entries are kept serialized, indexed by entityKey, and by table, action,
+    action param value and LPM prefix for the queries below.
+    """
+
+    def __init__(self, p4info_helper):
+        self.p4info_helper = p4info_helper
+        # entityKey -> serialized entity
+        self.entries = {}
+        # index term -> set of entityKeys, see _terms
+        self.index = {}
+        # (table_id, field_id) -> {prefix length: number of entries using it}
+        self.prefix_lens = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def record(self, updates):
+        "Applies successfully written p4runtime_pb2.Update messages"
+        with self.lock:
+            for update in updates:
+                field = update.entity.WhichOneof('entity')
+                if field not in ('table_entry', 'packet_replication_engine_entry'):
+                    continue # counters and meters are not tracked
+                entity = getattr(update.entity, field)
+                key = entityKey(entity)
+                self._remove(key)
+                if update.type != p4runtime_pb2.Update.DELETE:
+                    self._add(key, entity)
+
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+            self.index = {}
+            self.prefix_lens = {}
+
+    def load(self, entities):
+        """Replaces the recorded entries with `entities`, e.g. read from the
+        switch (see reconcile.readEntities). The recorded default actions
+        are kept, since wildcard reads don't return them."""
+        with self.lock:
+            defaults = [(key, self._decode(key, data)) for key, data in self.entries.items()
+                        if key[0] == 'table' and key[2]]
+            self.entries = {}
+            self.index = {}
+            self.prefix_lens = {}
+            for key, entity in defaults:
+                self._add(key, entity)
+            for entity in entities:
+                key = entityKey(entity)
+                self._remove(key)
+                self._add(key, entity)
+
+    def _terms(self, entity):
+        if not isinstance(entity, p4runtime_pb2.TableEntry):
+            return [('pre',)]
+        terms = [('table', entity.table_id)]
+        for m in entity.match:
+            if m.HasField('lpm'):
+                terms.append(('lpm', entity.table_id, m.field_id, m.lpm.prefix_len,
+                              int.from_bytes(m.lpm.value, 'big')))
+        if entity.action.HasField('action'):
+            action = entity.action.action
+            terms.append(('action', action.action_id))
+            for p in action.params:
+                terms.append(('param', action.action_id, p.param_id, toCanonical(p.value)))
+        return terms
+
+    def _add(self, key, entity):
+        self.entries[key] = entity.SerializeToString()
+        for term in self._terms(entity):
+            self.index.setdefault(term, set()).add(key)
+            if term[0] == 'lpm':
+                counts = self.prefix_lens.setdefault(term[1:3], {})
+                counts[term[3]] = counts.get(term[3], 0) + 1
+
+    def _remove(self, key):
+        data = self.entries.pop(key, None)
+        if data is None:
+            return
+        for term in self._terms(self._decode(key, data)):
+            keys = self.index[term]
+            keys.discard(key)
+            if not keys:
+                del self.index[term]
+            if term[0] == 'lpm':
+                counts = self.prefix_lens[term[1:3]]
+                counts[term[3]] -= 1
+                if not counts[term[3]]:
+                    del counts[term[3]]
+                    if not counts:
+                        del self.prefix_lens[term[1:3]]
+
+    def _decode(self, key, data):
+        if key[0] == 'table':
+            entity = p4runtime_pb2.TableEntry()
+        else:
+            entity = p4runtime_pb2.PacketReplicationEngineEntry()
+        entity.ParseFromString(data)
+        return entity
+
+    def _lookup(self, term):
+        with self.lock:
+            return [self._decode(key, self.entries[key]) for key in self.index.get(term, ())]
+
+    def get(self, entity):
+        "Returns the recorded entry with the same entityKey as `entity`, or None"
+        key = entityKey(entity)
+        with self.lock:
+            data = self.entries.get(key)
+        return None if data is None else self._decode(key, data)
+
+    def tableEntries(self, table_name=None):
+        "Returns the entries of a table, or of all tables"
+        if table_name is not None:
+            return self._lookup(('table', self.p4info_helper.get_tables_id(table_name)))
+        with self.lock:
+            return [self._decode(key, data) for key, data in self.entries.items()
+                    if key[0] == 'table']
+
+    def preEntries(self):
+        "Returns the multicast groups and clone sessions"
+        return self._lookup(('pre',))
+
+    def entriesByAction(self, action_name):
+        return self._lookup(('action', self.p4info_helper.get_actions_id(action_name)))
+
+    def entriesByParam(self, action_name, param_name, value):
+        "Returns the entries using `action_name` with `param_name` set to `value`"
+        param = self.p4info_helper.get_action_param(action_name, param_name)
+        return self._lookup(('param', self.p4info_helper.get_actions_id(action_name),
+                             param.id, toCanonical(encode(value, param.bitwidth))))
+
+    def entriesByPort(self, port, param_name='port'):
+        "Returns the entries of all the actions whose `param_name` param is `port`"
+        entries = []
+        for action in self.p4info_helper.p4info.actions:
+            if any(p.name == param_name for p in action.params):
+                entries.extend(self.entriesByParam(action.preamble.name, param_name, port))
+        return entries
+
+    def lookupPrefix(self, table_name, match_field_name, address):
+        """Returns the entries of an LPM table matching `address`, longest
+        prefix first"""
+        table_id = self.p4info_helper.get_tables_id(table_name)
+        match_field = self.p4info_helper.get_match_field(table_name, match_field_name)
+        bitwidth = match_field.bitwidth
+        value = int.from_bytes(encode(address, bitwidth), 'big')
+        with self.lock:
+            prefix_lens = sorted(self.prefix_lens.get((table_id, match_field.id), ()),
+                                 reverse=True)
+        entries = []
+        for prefix_len in prefix_lens:
+            masked = value & ~((1 << (bitwidth - prefix_len)) - 1)
+            entries.extend(self._lookup(('lpm', table_id, match_field.id, prefix_len,
+                                         masked)))
+        return entries
+
+    def verify(self, sw, sample=None):
+        """Compares the recorded entries with the switch. Reads all the
+        switch entries, or only `sample` randomly chosen recorded ones.
+        Returns the updates that would bring the switch back to the recorded
+        state (see reconcile.diffEntities), so an empty list means no
+        difference was found."""
+        with self.lock:
+            items = list(self.entries.items())
+        if sample is not None and sample < len(items):
+            items = random.sample(items, sample)
+        expected = [self._decode(key, data) for key, data in items]
+        if sample is None:
+            # Wildcard reads don't return default actions
+            expected = [e for e in expected if not getattr(e, 'is_default_action', False)]
+            return reconcile.diffEntities(expected, reconcile.readEntities(sw))
+
+        current = {}
+        if expected:
+            for response in sw.ReadEntities(expected):
+                for entity in response.entities:
+                    entity = getattr(entity, entity.WhichOneof('entity'))
+                    current[entityKey(entity)] = entity
+        return reconcile.diffEntities(expected, current, delete=False)
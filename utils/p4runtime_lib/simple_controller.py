@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+#
+# Copyright 2017-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import argparse
+import os
+import sys
+
+from . import bmv2
+from . import helper
+from . import reconcile
+from .runtime_conf import CloneRule, GroupRule, TableRule, loadRuntimeConf
+from .switch import pipelineCookie
+
+
+def error(msg):
+    print(' - ERROR! ' + msg, file=sys.stderr)
+
+def info(msg):
+    print(' - ' + msg, file=sys.stdout)
+
+
+class ConfException(Exception):
+    pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='P4Runtime Simple Controller')
+
+    parser.add_argument('-a', '--p4runtime-server-addr',
+                        help='address and port of the switch\'s P4Runtime server (e.g. 192.168.0.1:50051)',
+                        type=str, action="store", required=True)
+    parser.add_argument('-d', '--device-id',
+                        help='Internal device ID to use in P4Runtime messages',
+                        type=int, action="store", required=True)
+    parser.add_argument('-p', '--proto-dump-file',
+                        help='path to file where to dump protobuf messages sent to the switch',
+                        type=str, action="store", required=True)
+    parser.add_argument("-c", '--runtime-conf-file',
+                        help="path to input runtime configuration file (JSON)",
+                        type=str, action="store", required=True)
+    parser.add_argument('--dry-run',
+                        help='only print the updates needed to bring the switch to the runtime configuration',
+                        action="store_true", required=False)
+    parser.add_argument('-v', '--verbose',
+                        help='print every entry written to the switch',
+                        action="store_true", required=False)
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.runtime_conf_file):
+        parser.error("File %s does not exist!" % args.runtime_conf_file)
+    workdir = os.path.dirname(os.path.abspath(args.runtime_conf_file))
+    with open(args.runtime_conf_file, 'r') as sw_conf_file:
+        program_switch(addr=args.p4runtime_server_addr,
+                       device_id=args.device_id,
+                       sw_conf_file=sw_conf_file,
+                       workdir=workdir,
+                       proto_dump_fpath=args.proto_dump_file,
+                       dry_run=args.dry_run,
+                       verbose=args.verbose)
+
+
+def check_switch_conf(sw_conf, workdir):
+    required_keys = ["p4info"]
+    files_to_check = ["p4info"]
+    target_choices = ["bmv2"]
+
+    if "target" not in sw_conf:
+        raise ConfException("missing key 'target'")
+    target = sw_conf['target']
+    if target not in target_choices:
+        raise ConfException("unknown target '%s'" % target)
+
+    if target == 'bmv2':
+        required_keys.append("bmv2_json")
+        files_to_check.append("bmv2_json")
+
+    for conf_key in required_keys:
+        if conf_key not in sw_conf or len(sw_conf[conf_key]) == 0:
+            raise ConfException("missing key '%s' or empty value" % conf_key)
+
+    for conf_key in files_to_check:
+        real_path = os.path.join(workdir, sw_conf[conf_key])
+        if not os.path.exists(real_path):
+            raise ConfException("file does not exist %s" % real_path)
+
+
+def program_switch(addr, device_id, sw_conf_file, workdir, proto_dump_fpath, dry_run=False,
+                   verbose=False, connections=None):
+    """Programs a switch with a runtime JSON configuration. With a
+    switch.ConnectionManager as `connections`, the connection to the switch
+    is taken from it and left open for later calls, instead of being opened
+    and shut down by this call."""
+    sw_conf = loadRuntimeConf(sw_conf_file)
+    try:
+        check_switch_conf(sw_conf=sw_conf, workdir=workdir)
+    except ConfException as e:
+        error("While parsing input runtime configuration: %s" % str(e))
+        return
+
+    info('Using P4Info file %s...' % sw_conf['p4info'])
+    p4info_fpath = os.path.join(workdir, sw_conf['p4info'])
+    p4info_helper = helper.P4InfoHelper(p4info_fpath)
+
+    target = sw_conf['target']
+
+    info("Connecting to P4Runtime server on %s (%s)..." % (addr, target))
+
+    if target == "bmv2":
+        connection_class = bmv2.Bmv2SwitchConnection
+    else:
+        raise Exception("Don't know how to connect to target %s" % target)
+    if connections is not None:
+        sw = connections.get(addr, device_id, connection_class,
+                             proto_dump_file=proto_dump_fpath)
+    else:
+        sw = connection_class(address=addr, device_id=device_id,
+                              proto_dump_file=proto_dump_fpath)
+
+    try:
+        sw.MasterArbitrationUpdate()
+
+        if target == "bmv2":
+            bmv2_json_fpath = os.path.join(workdir, sw_conf['bmv2_json'])
+            if dry_run:
+                cookie = pipelineCookie(p4info_helper.p4info, sw.serializeDeviceConfig(
+                    bmv2_json_file_path=bmv2_json_fpath))
+                pushed = sw.GetPipelineCookie() != cookie
+                if pushed:
+                    info("Would set pipeline config (%s)..." % sw_conf['bmv2_json'])
+            else:
+                info("Setting pipeline config (%s)..." % sw_conf['bmv2_json'])
+                pushed = sw.SetForwardingPipelineConfig(p4info=p4info_helper.p4info,
+                                                        bmv2_json_file_path=bmv2_json_fpath,
+                                                        skip_unchanged=True)
+        else:
+            raise Exception("Should not be here")
+
+        def entities():
+            # Each entity is built when it is about to be written, so that the
+            # protobufs of all the rules are never held at once
+            for key, kind in (('table_entries', 'table'),
+                              ('multicast_group_entries', 'group'),
+                              ('clone_session_entries', 'clone')):
+                if key in sw_conf:
+                    rules = sw_conf[key]
+                    info("Inserting %d %s entries..." % (len(rules), kind))
+                    for rule in rules:
+                        # Only formatted when it is printed
+                        if verbose:
+                            info(str(rule))
+                        yield rule.build(p4info_helper)
+
+        if pushed:
+            # A new pipeline starts empty, no need to read it
+            current = {}
+        else:
+            # The switch kept its state: only what changed is written
+            info("Pipeline config unchanged, reconciling the switch state...")
+            current = reconcile.readEntities(sw)
+
+        counts = {reconcile.INSERT: 0, reconcile.MODIFY: 0, reconcile.DELETE: 0}
+        def counted(diff):
+            for update_type, entity in diff:
+                counts[update_type] += 1
+                yield update_type, entity
+
+        diff = counted(reconcile.streamDiff(entities(), current))
+        if dry_run:
+            info("Dry run, the following updates would be written:")
+            for update_type, entity in diff:
+                print(reconcile.updateToString(p4info_helper, update_type, entity))
+        else:
+            # All entries are sent in batched WriteRequests instead of one RPC each
+            reconcile.applyDiff(sw, diff)
+        info("%d inserts, %d modifies, %d deletes" % (
+            counts[reconcile.INSERT], counts[reconcile.MODIFY], counts[reconcile.DELETE]))
+
+    finally:
+        if connections is None:
+            sw.shutdown()
+
+
+def _toRule(rule_class, rule):
+    # Rules may also be given as parsed runtime JSON dicts
+    return rule_class.fromJson(rule) if isinstance(rule, dict) else rule
+
+
+def insertTableEntry(sw, flow, p4info_helper):
+    sw.WriteTableEntry(_toRule(TableRule, flow).build(p4info_helper))
+
+
+def insertMulticastGroupEntry(sw, rule, p4info_helper):
+    sw.WritePREEntry(_toRule(GroupRule, rule).build(p4info_helper))
+
+def insertCloneGroupEntry(sw, rule, p4info_helper):
+    sw.WritePREEntry(_toRule(CloneRule, rule).build(p4info_helper))
+
+
+if __name__ == '__main__':
+    main()
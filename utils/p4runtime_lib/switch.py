@@ -0,0 +1,963 @@
+# Copyright 2017-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from queue import Queue, Empty, Full
+from abc import abstractmethod
+import hashlib
+from collections import deque
+from datetime import datetime
+from time import monotonic
+import atexit
+import threading
+import traceback
+
+from google.rpc import code_pb2
+import grpc
+from p4.v1 import p4runtime_pb2
+from p4.v1 import p4runtime_pb2_grpc
+from p4.tmp import p4config_pb2
+
+from .channel import channel_pool
+from .convert import toCanonical
+from . import metrics as metrics_lib
+from .error_utils import P4RuntimeWriteException, parseGrpcErrorBinaryDetails
+
+MSG_LOG_MAX_LEN = 1024
+
+# Messages queued by a GrpcRequestLogger before the oldest are dropped, and
+# seconds between its batched writes
+LOG_BUFFER_SIZE = 10000
+LOG_FLUSH_INTERVAL = 0.1
+
+# Default caps for a single batched WriteRequest. The byte cap stays below the
+# 4MB default gRPC max message size.
+WRITE_BATCH_MAX_UPDATES = 1000
+WRITE_BATCH_MAX_BYTES = 3 * 1024 * 1024
+
+# SetForwardingPipelineConfig actions after which the switch has no entries
+PIPELINE_RESET_ACTIONS = (p4runtime_pb2.SetForwardingPipelineConfigRequest.VERIFY_AND_COMMIT,
+                          p4runtime_pb2.SetForwardingPipelineConfigRequest.COMMIT)
+
+# List of all active connections
+connections = []
+
+def ShutdownAllSwitchConnections():
+    for c in list(connections):
+        c.shutdown()
+
+class ConnectionManager(object):
+    """Keeps one open connection per (address, device_id), so that repeated
+    controller operations on a switch reuse it instead of connecting again.
+    All its connections share the channels of `pool` (see ChannelPool).
+    """
+
+    def __init__(self, connection_class=None, pool=None):
+        self.connection_class = connection_class
+        self.pool = channel_pool if pool is None else pool
+        self.connections = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.connections)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    def get(self, address, device_id=0, connection_class=None, **kwargs):
+        """Returns the connection to a device, creating it with
+        connection_class(address=address, device_id=device_id, **kwargs) if
+        there is none yet. kwargs are ignored when the connection is reused.
+        A connection whose stream channel has failed is replaced by a new
+        one, which is not master until MasterArbitrationUpdate is called."""
+        key = (address, device_id)
+        with self.lock:
+            sw = self.connections.get(key)
+            if sw is not None and sw.IsHealthy():
+                return sw
+            if sw is not None:
+                sw.shutdown()
+            connection_class = connection_class or self.connection_class or SwitchConnection
+            sw = connection_class(address=address, device_id=device_id, pool=self.pool, **kwargs)
+            self.connections[key] = sw
+            return sw
+
+    def close(self, address, device_id=0):
+        with self.lock:
+            sw = self.connections.pop((address, device_id), None)
+        if sw is not None:
+            sw.shutdown()
+
+    def shutdown(self):
+        with self.lock:
+            switches = list(self.connections.values())
+            self.connections = {}
+        for sw in switches:
+            sw.shutdown()
+
+class SwitchConnectionBase(object):
+    """Builds the P4Runtime requests sent by SwitchConnection and
+    AsyncSwitchConnection, so that both send exactly the same messages."""
+
+    def __init__(self, name=None, address='127.0.0.1:50051', device_id=0,
+                 proto_dump_file=None, shadow=None, election_id=1, metrics=None):
+        self.name = name
+        self.address = address
+        self.device_id = device_id
+        self.p4info = None
+        self.proto_dump_file = proto_dump_file
+        # Optional ShadowStore recording the successful writes
+        self.shadow = shadow
+        # 128-bit election id of this controller. The controller with the
+        # highest one connected to a device is its primary, the others are
+        # backups which can only read.
+        self.election_id = election_id
+        # Set from the arbitration updates received from the switch
+        self.is_primary = False
+        self.primary_election_id = None
+        # MetricsRegistry recording the RPCs, see metrics.MetricsInterceptor
+        self.metrics = metrics_lib.registry if metrics is None else metrics
+        self.metrics_switch = name or address
+
+    def _setElectionId(self, election_id):
+        election_id.high = self.election_id >> 64
+        election_id.low = self.election_id & 0xffffffffffffffff
+
+    def _onArbitration(self, arbitration):
+        self.metrics.inc('p4runtime_arbitration_updates_total', switch=self.metrics_switch,
+                         code=code_pb2.Code.Name(arbitration.status.code))
+        # OK means this controller is the primary. Otherwise election_id is
+        # the primary's, unless there is no primary (NOT_FOUND).
+        self.is_primary = arbitration.status.code == code_pb2.OK
+        if arbitration.status.code == code_pb2.NOT_FOUND:
+            self.primary_election_id = None
+        else:
+            self.primary_election_id = (arbitration.election_id.high << 64) | arbitration.election_id.low
+
+    def _recordWrite(self, request, failed=()):
+        if self.shadow is not None:
+            self.shadow.record(update for idx, update in enumerate(request.updates)
+                               if idx not in failed)
+
+    def _recordPipeline(self, request):
+        # A committed pipeline starts without entries, a reconciled one
+        # keeps them (and VERIFY/VERIFY_AND_SAVE change nothing yet)
+        if self.shadow is not None and request.action in PIPELINE_RESET_ACTIONS:
+            self.shadow.clear()
+
+    @abstractmethod
+    def buildDeviceConfig(self, **kwargs):
+        return p4config_pb2.P4DeviceConfig()
+
+    def serializeDeviceConfig(self, **kwargs):
+        """Returns the serialized device config. Subclasses can override it
+        to reuse the same encoded config for many switches."""
+        return self.buildDeviceConfig(**kwargs).SerializeToString()
+
+    def _arbitrationRequest(self):
+        request = p4runtime_pb2.StreamMessageRequest()
+        request.arbitration.device_id = self.device_id
+        self._setElectionId(request.arbitration.election_id)
+        return request
+
+    def _pipelineConfigRequest(self, p4info,
+                               action=p4runtime_pb2.SetForwardingPipelineConfigRequest.VERIFY_AND_COMMIT,
+                               **kwargs):
+        request = p4runtime_pb2.SetForwardingPipelineConfigRequest()
+        self._setElectionId(request.election_id)
+        request.device_id = self.device_id
+        config = request.config
+
+        config.p4info.CopyFrom(p4info)
+        config.p4_device_config = self.serializeDeviceConfig(**kwargs)
+        config.cookie.cookie = pipelineCookie(p4info, config.p4_device_config)
+
+        request.action = action
+        return request
+
+    def _pipelineCookieRequest(self):
+        request = p4runtime_pb2.GetForwardingPipelineConfigRequest()
+        request.device_id = self.device_id
+        request.response_type = p4runtime_pb2.GetForwardingPipelineConfigRequest.COOKIE_ONLY
+        return request
+
+    def _writeRequest(self, updates):
+        request = p4runtime_pb2.WriteRequest()
+        request.device_id = self.device_id
+        self._setElectionId(request.election_id)
+        request.updates.extend(updates)
+        return request
+
+    def _tableEntryWriteRequest(self, table_entry):
+        update = p4runtime_pb2.Update()
+        if table_entry.is_default_action:
+            update.type = p4runtime_pb2.Update.MODIFY
+        else:
+            update.type = p4runtime_pb2.Update.INSERT
+        update.entity.table_entry.CopyFrom(table_entry)
+        return self._writeRequest([update])
+
+    def _preEntryWriteRequest(self, pre_entry):
+        update = p4runtime_pb2.Update()
+        update.type = p4runtime_pb2.Update.INSERT
+        update.entity.packet_replication_engine_entry.CopyFrom(pre_entry)
+        return self._writeRequest([update])
+
+    def _readTableEntriesRequest(self, table_id=None):
+        request = p4runtime_pb2.ReadRequest()
+        request.device_id = self.device_id
+        entity = request.entities.add()
+        table_entry = entity.table_entry
+        if table_id is not None:
+            table_entry.table_id = table_id
+        else:
+            table_entry.table_id = 0
+        return request
+
+    def _readPREEntriesRequest(self):
+        # Wildcard reads of all multicast groups and clone sessions
+        request = p4runtime_pb2.ReadRequest()
+        request.device_id = self.device_id
+        request.entities.add().packet_replication_engine_entry.multicast_group_entry.multicast_group_id = 0
+        request.entities.add().packet_replication_engine_entry.clone_session_entry.session_id = 0
+        return request
+
+    def _readEntitiesRequest(self, entities):
+        # Reads the given table entries (by match key) and PRE entries (by id)
+        request = p4runtime_pb2.ReadRequest()
+        request.device_id = self.device_id
+        for entity in entities:
+            if isinstance(entity, p4runtime_pb2.TableEntry):
+                table_entry = request.entities.add().table_entry
+                table_entry.table_id = entity.table_id
+                table_entry.match.extend(entity.match)
+                table_entry.priority = entity.priority
+                table_entry.is_default_action = entity.is_default_action
+            else:
+                request.entities.add().packet_replication_engine_entry.CopyFrom(entity)
+        return request
+
+    def _readCountersRequest(self, counter_id=None, index=None):
+        request = p4runtime_pb2.ReadRequest()
+        request.device_id = self.device_id
+        entity = request.entities.add()
+        counter_entry = entity.counter_entry
+        if counter_id is not None:
+            counter_entry.counter_id = counter_id
+        else:
+            counter_entry.counter_id = 0
+        if index is not None:
+            counter_entry.index.index = index
+        return request
+
+    def _readCounterArraysRequest(self, counter_ids):
+        # One wildcard (no index) entity per counter, to read whole arrays
+        request = p4runtime_pb2.ReadRequest()
+        request.device_id = self.device_id
+        for counter_id in counter_ids:
+            request.entities.add().counter_entry.counter_id = counter_id
+        return request
+
+def pipelineCookie(p4info, device_config):
+    """Returns the cookie identifying a pipeline config: the first 64 bits
+    of the sha256 of the P4Info and the serialized device config"""
+    digest = hashlib.sha256(p4info.SerializeToString(deterministic=True))
+    digest.update(device_config)
+    return int.from_bytes(digest.digest()[:8], 'big')
+
+def requestLogger(proto_dump_file):
+    """Returns (logger, owned): the GrpcRequestLogger for a connection's
+    proto_dump_file, which is either a path or an already configured
+    GrpcRequestLogger, and whether the connection created it. A logger given
+    to the connection may be shared with others, and is left to its owner
+    (or its atexit hook) to close."""
+    if proto_dump_file is None or isinstance(proto_dump_file, GrpcRequestLogger):
+        return proto_dump_file, False
+    return GrpcRequestLogger(proto_dump_file), True
+
+def writeException(grpc_error, request):
+    """Returns a P4RuntimeWriteException listing the updates of `request`
+    rejected by the switch, or None if the error has no per-update details"""
+    p4_errors = parseGrpcErrorBinaryDetails(grpc_error)
+    if p4_errors is None:
+        return None
+    return P4RuntimeWriteException(grpc_error, [
+        (idx, request.updates[idx], p4_error)
+        for idx, p4_error in p4_errors
+    ])
+
+class SwitchConnection(SwitchConnectionBase):
+
+    def __init__(self, name=None, address='127.0.0.1:50051', device_id=0,
+                 proto_dump_file=None, shadow=None, pool=None, election_id=1, metrics=None):
+        super(SwitchConnection, self).__init__(name, address, device_id, proto_dump_file, shadow,
+                                               election_id, metrics)
+        # The channel is shared with the other connections to the same server
+        self.pool = channel_pool if pool is None else pool
+        self.channel = self.pool.acquire(self.address)
+        interceptors = [metrics_lib.MetricsInterceptor(self.metrics, self.metrics_switch)]
+        self.request_logger, self.owns_logger = requestLogger(proto_dump_file)
+        if self.request_logger is not None:
+            interceptors.append(self.request_logger)
+        self.channel = grpc.intercept_channel(self.channel, *interceptors)
+        self.client_stub = p4runtime_pb2_grpc.P4RuntimeStub(self.channel)
+        self.dispatcher = None
+        self.closed = False
+        # Notified on each arbitration update read by the dispatcher
+        self.arbitration = None
+        self.arbitration_cond = threading.Condition()
+        self._openStream()
+        connections.append(self)
+
+    def _openStream(self):
+        self.requests_stream = IterableQueue()
+        self.stream_msg_resp = self.client_stub.StreamChannel(iter(self.requests_stream))
+
+    def shutdown(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.requests_stream.close()
+        self.stream_msg_resp.cancel()
+        if self.dispatcher is not None:
+            self.dispatcher.join()
+        self.pool.release(self.address)
+        self.metrics.removeGauges(switch=self.metrics_switch)
+        if self.owns_logger:
+            # Writes out the requests still queued
+            self.request_logger.close()
+        if self in connections:
+            connections.remove(self)
+
+    def IsHealthy(self):
+        "True if the channel is usable and the stream channel still open"
+        return (not self.closed and self.pool.isHealthy(self.address)
+                and not self.stream_msg_resp.done())
+
+    def Reconnect(self, timeout=None):
+        """Waits for the channel to the switch to be ready again and reopens
+        the stream channel (and the stream dispatcher, if started). The
+        mastership must be requested again with MasterArbitrationUpdate.
+        Returns False if the switch is not reachable after `timeout` seconds."""
+        if not self.pool.waitReady(self.address, timeout):
+            return False
+        self.requests_stream.close()
+        self.stream_msg_resp.cancel()
+        if self.dispatcher is not None:
+            self.dispatcher.join()
+        self._openStream()
+        if self.dispatcher is not None:
+            self.dispatcher.start()
+        return True
+
+    def StartStreamDispatcher(self, **kwargs):
+        """Starts reading the stream channel in a background thread, see
+        StreamDispatcher. Once started, stream_msg_resp must not be read
+        directly anymore."""
+        if self.dispatcher is None:
+            self.dispatcher = StreamDispatcher(self, **kwargs)
+        return self.dispatcher
+
+    def MasterArbitrationUpdate(self, dry_run=False, **kwargs):
+        request = self._arbitrationRequest()
+
+        if dry_run:
+            print("P4Runtime MasterArbitrationUpdate: ", request)
+            return None
+        started = monotonic()
+        response = None
+        if self.dispatcher is not None:
+            with self.arbitration_cond:
+                last = self.arbitration
+                self.requests_stream.put(request)
+                self.arbitration_cond.wait_for(
+                    lambda: self.arbitration is not last or self.dispatcher.done)
+                if self.arbitration is not last:
+                    response = self.arbitration
+        else:
+            self.requests_stream.put(request)
+            for item in self.stream_msg_resp:
+                if item.HasField('arbitration'):
+                    self._onArbitration(item.arbitration)
+                response = item
+                break # just one
+        self.metrics.observe('p4runtime_arbitration_seconds', monotonic() - started,
+                             switch=self.metrics_switch)
+        return response
+
+    def _onArbitrationMessage(self, msg):
+        # Called by the dispatcher thread
+        with self.arbitration_cond:
+            self._onArbitration(msg.arbitration)
+            self.arbitration = msg
+            self.arbitration_cond.notify_all()
+
+    def _onStreamDone(self):
+        with self.arbitration_cond:
+            self.arbitration_cond.notify_all()
+
+    def SetForwardingPipelineConfig(self, p4info, dry_run=False, skip_unchanged=False,
+                                    reconcile=False, **kwargs):
+        """Pushes the pipeline config. The config carries a cookie identifying
+        it (see pipelineCookie); with skip_unchanged=True, the switch's cookie
+        is read first and, if it matches, the config is not pushed again so
+        that the switch keeps its state. With reconcile=True the matching
+        config is pushed with RECONCILE_AND_COMMIT instead of being skipped.
+        Returns False if the push was skipped."""
+        request = self._pipelineConfigRequest(p4info, **kwargs)
+        if dry_run:
+            print("P4Runtime SetForwardingPipelineConfig:", request)
+            return True
+        if skip_unchanged and self.GetPipelineCookie() == request.config.cookie.cookie:
+            if not reconcile:
+                return False
+            request.action = p4runtime_pb2.SetForwardingPipelineConfigRequest.RECONCILE_AND_COMMIT
+        self.client_stub.SetForwardingPipelineConfig(request)
+        self._recordPipeline(request)
+        return True
+
+    def GetPipelineCookie(self):
+        """Returns the cookie of the switch's current pipeline config, or None
+        if it has no pipeline config (or does not support the request)"""
+        try:
+            response = self.client_stub.GetForwardingPipelineConfig(self._pipelineCookieRequest())
+        except grpc.RpcError as e:
+            if e.code() in (grpc.StatusCode.FAILED_PRECONDITION,
+                            grpc.StatusCode.NOT_FOUND,
+                            grpc.StatusCode.UNIMPLEMENTED):
+                return None
+            raise
+        if not response.config.HasField('cookie'):
+            return None
+        return response.config.cookie.cookie
+
+    def WriteTableEntry(self, table_entry, dry_run=False):
+        request = self._tableEntryWriteRequest(table_entry)
+        if dry_run:
+            print("P4Runtime Write:", request)
+        else:
+            self.client_stub.Write(request)
+            self._recordWrite(request)
+
+    def WriteUpdates(self, updates, dry_run=False):
+        """Sends all the given p4runtime_pb2.Update messages in one WriteRequest.
+        If the switch rejects some of them, a P4RuntimeWriteException listing
+        the failed updates is raised."""
+        request = self._writeRequest(updates)
+        if dry_run:
+            print("P4Runtime Write:", request)
+            return
+        try:
+            self.client_stub.Write(request)
+        except grpc.RpcError as e:
+            write_error = writeException(e, request)
+            if write_error is None:
+                raise
+            # The updates not listed in the error were applied
+            self._recordWrite(request, set(idx for idx, _, _ in write_error.errors))
+            raise write_error
+        self._recordWrite(request)
+
+    def WriteBatch(self, **kwargs):
+        return WriteBatch(self, **kwargs)
+
+    def ReadTableEntries(self, table_id=None, dry_run=False):
+        request = self._readTableEntriesRequest(table_id)
+        if dry_run:
+            print("P4Runtime Read:", request)
+        else:
+            for response in self.client_stub.Read(request):
+                yield response
+
+    def ReadCounters(self, counter_id=None, index=None, dry_run=False):
+        request = self._readCountersRequest(counter_id, index)
+        if dry_run:
+            print("P4Runtime Read:", request)
+        else:
+            for response in self.client_stub.Read(request):
+                yield response
+
+    def ReadCounterArrays(self, counter_ids, dry_run=False):
+        "Reads all the cells of the given counters in a single ReadRequest"
+        request = self._readCounterArraysRequest(counter_ids)
+        if dry_run:
+            print("P4Runtime Read:", request)
+        else:
+            for response in self.client_stub.Read(request):
+                yield response
+
+    def ReadEntities(self, entities, dry_run=False):
+        """Reads the switch's version of the given table entries (looked up by
+        match key) and PRE entries, in a single ReadRequest"""
+        request = self._readEntitiesRequest(entities)
+        if dry_run:
+            print("P4Runtime Read:", request)
+        else:
+            for response in self.client_stub.Read(request):
+                yield response
+
+    def ReadPREEntries(self, dry_run=False):
+        "Reads all the multicast groups and clone sessions"
+        request = self._readPREEntriesRequest()
+        if dry_run:
+            print("P4Runtime Read:", request)
+        else:
+            for response in self.client_stub.Read(request):
+                yield response
+
+    def WritePREEntry(self, pre_entry, dry_run=False):
+        request = self._preEntryWriteRequest(pre_entry)
+        if dry_run:
+            print("P4Runtime Write:", request)
+        else:
+            self.client_stub.Write(request)
+            self._recordWrite(request)
+
+# Maps the protobuf type of an entity to its field in p4runtime_pb2.Entity
+ENTITY_FIELDS = {
+    p4runtime_pb2.TableEntry.DESCRIPTOR.full_name: 'table_entry',
+    p4runtime_pb2.PacketReplicationEngineEntry.DESCRIPTOR.full_name: 'packet_replication_engine_entry',
+    p4runtime_pb2.CounterEntry.DESCRIPTOR.full_name: 'counter_entry',
+    p4runtime_pb2.DirectCounterEntry.DESCRIPTOR.full_name: 'direct_counter_entry',
+    p4runtime_pb2.MeterEntry.DESCRIPTOR.full_name: 'meter_entry',
+    p4runtime_pb2.DirectMeterEntry.DESCRIPTOR.full_name: 'direct_meter_entry',
+}
+
+def _matchKey(m):
+    # Values are compared in canonical form, since switches may return them
+    # without the leading zeros that the encoder adds
+    kind = m.WhichOneof('field_match_type')
+    if kind == 'exact':
+        values = (toCanonical(m.exact.value),)
+    elif kind == 'lpm':
+        values = (toCanonical(m.lpm.value), m.lpm.prefix_len)
+    elif kind == 'ternary':
+        values = (toCanonical(m.ternary.value), toCanonical(m.ternary.mask))
+    elif kind == 'range':
+        values = (toCanonical(m.range.low), toCanonical(m.range.high))
+    elif kind == 'optional':
+        values = (toCanonical(m.optional.value),)
+    else:
+        values = (m.SerializeToString(deterministic=True),)
+    return (m.field_id, kind) + values
+
+def _replicasKey(replicas):
+    return tuple(sorted((r.egress_port, r.instance) for r in replicas))
+
+def entityKey(entity):
+    """Returns a hashable key identifying a table entry or PRE entry on the
+    switch (its table and match, or its group/session id), regardless of its
+    action or replicas"""
+    if isinstance(entity, p4runtime_pb2.TableEntry):
+        return ('table', entity.table_id, entity.is_default_action, entity.priority,
+                tuple(sorted(_matchKey(m) for m in entity.match)))
+    if isinstance(entity, p4runtime_pb2.PacketReplicationEngineEntry):
+        if entity.HasField('multicast_group_entry'):
+            return ('multicast_group', entity.multicast_group_entry.multicast_group_id)
+        return ('clone_session', entity.clone_session_entry.session_id)
+    raise Exception("Cannot key entity of type %s" % entity.DESCRIPTOR.full_name)
+
+def entityValue(entity):
+    """Returns a hashable value of what a table entry or PRE entry does (its
+    action or replicas). Two entries with the same entityKey and entityValue
+    are equivalent."""
+    if isinstance(entity, p4runtime_pb2.TableEntry):
+        kind = entity.action.WhichOneof('type')
+        if kind == 'action':
+            action = entity.action.action
+            return (kind, action.action_id,
+                    tuple(sorted((p.param_id, toCanonical(p.value)) for p in action.params)))
+        if kind is None:
+            return None
+        return (kind, entity.action.SerializeToString(deterministic=True))
+    if isinstance(entity, p4runtime_pb2.PacketReplicationEngineEntry):
+        if entity.HasField('multicast_group_entry'):
+            return _replicasKey(entity.multicast_group_entry.replicas)
+        clone = entity.clone_session_entry
+        return (_replicasKey(clone.replicas), clone.class_of_service, clone.packet_length_bytes)
+    raise Exception("Cannot compare entity of type %s" % entity.DESCRIPTOR.full_name)
+
+class WriteBatch(object):
+    """Collects INSERT/MODIFY/DELETE updates and sends them to the switch in
+    batched WriteRequests of at most max_updates updates (and max_bytes bytes).
+
+    A WriteRequest is sent automatically once the current batch is full, unless
+    auto_flush is False, and whatever is pending is sent by Flush(). When used
+    as a context manager, the batch is flushed on exit. Updates rejected by the
+    switch are reported with a P4RuntimeWriteException.
+    """
+
+    def __init__(self, sw, max_updates=WRITE_BATCH_MAX_UPDATES,
+                 max_bytes=WRITE_BATCH_MAX_BYTES, auto_flush=True, dry_run=False):
+        self.sw = sw
+        self.max_updates = max_updates
+        self.max_bytes = max_bytes
+        self.auto_flush = auto_flush
+        self.dry_run = dry_run
+        self.updates = []
+        self.pending_bytes = 0
+        self.requests_sent = 0
+        self.updates_sent = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.Flush()
+
+    def __len__(self):
+        return len(self.updates)
+
+    def Update(self, update_type, entity):
+        update = p4runtime_pb2.Update()
+        update.type = update_type
+        field = ENTITY_FIELDS.get(entity.DESCRIPTOR.full_name)
+        if field is None:
+            raise Exception("Cannot write entity of type %s" % entity.DESCRIPTOR.full_name)
+        getattr(update.entity, field).CopyFrom(entity)
+        size = update.ByteSize()
+        if self.updates and (len(self.updates) >= self.max_updates or
+                             self.pending_bytes + size > self.max_bytes):
+            if not self.auto_flush:
+                raise Exception("Write batch is full (%d updates, %d bytes)" % (
+                    len(self.updates), self.pending_bytes))
+            self.Flush()
+        self.updates.append(update)
+        self.pending_bytes += size
+
+    def Insert(self, entity):
+        self.Update(p4runtime_pb2.Update.INSERT, entity)
+
+    def Modify(self, entity):
+        self.Update(p4runtime_pb2.Update.MODIFY, entity)
+
+    def Delete(self, entity):
+        self.Update(p4runtime_pb2.Update.DELETE, entity)
+
+    def WriteTableEntry(self, table_entry):
+        # Same semantics as SwitchConnection.WriteTableEntry
+        if table_entry.is_default_action:
+            self.Modify(table_entry)
+        else:
+            self.Insert(table_entry)
+
+    def WritePREEntry(self, pre_entry):
+        self.Insert(pre_entry)
+
+    def WriteCounterEntry(self, counter_entry):
+        # Counter and meter entries can only be modified
+        self.Modify(counter_entry)
+
+    def WriteMeterEntry(self, meter_entry):
+        self.Modify(meter_entry)
+
+    def Flush(self):
+        if not self.updates:
+            return
+        updates = self.updates
+        self.updates = []
+        self.pending_bytes = 0
+        self.sw.WriteUpdates(updates, dry_run=self.dry_run)
+        self.requests_sent += 1
+        self.updates_sent += len(updates)
+
+# Types of StreamMessageResponse updates handled by StreamDispatcher
+STREAM_UPDATE_TYPES = ['arbitration', 'packet', 'digest',
+                       'idle_timeout_notification', 'error', 'other']
+
+class StreamDispatcher(object):
+    """Reads the stream channel of a switch connection in a background thread
+    and demultiplexes the messages by update type (see STREAM_UPDATE_TYPES).
+
+    Messages of a type with registered callbacks are passed to them as
+    callback(sw, msg), on the reader thread. Other messages are put in a
+    bounded queue per type, read with get(); when a queue is full the oldest
+    message is dropped and counted in `dropped`, so slow consumers never
+    stall the stream. Arbitration updates are not queued: they update the
+    primary/backup state of the connection (see MasterArbitrationUpdate).
+    """
+
+    def __init__(self, sw, queue_size=1024):
+        self.sw = sw
+        self.queues = dict((t, Queue(maxsize=queue_size)) for t in STREAM_UPDATE_TYPES)
+        self.callbacks = dict((t, []) for t in STREAM_UPDATE_TYPES)
+        self.dropped = dict((t, 0) for t in STREAM_UPDATE_TYPES)
+        self.error = None
+        # Serializes dispatching with callback registration
+        self.lock = threading.RLock()
+        for t, q in self.queues.items():
+            sw.metrics.setGauge('p4runtime_stream_queue_depth', q.qsize,
+                                switch=sw.metrics_switch, type=t)
+        self.start()
+
+    def start(self):
+        "Starts reading the current stream channel of the connection"
+        self.error = None
+        self.done = False
+        self.thread = threading.Thread(target=self._run,
+                                       name='stream-%s' % (self.sw.name or self.sw.address))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def on(self, update_type, callback):
+        """Registers callback(sw, msg) for messages of the given update type.
+        Messages of that type already waiting in the queue are passed to the
+        callback right away."""
+        with self.lock:
+            self.callbacks[update_type].append(callback)
+            q = self.queues[update_type]
+            while True:
+                try:
+                    msg = q.get_nowait()
+                except Empty:
+                    break
+                self._call(callback, msg)
+        return self
+
+    def get(self, update_type, timeout=None):
+        """Returns the next message of the given update type, waiting at most
+        `timeout` seconds (forever if None). Raises queue.Empty on timeout."""
+        return self.queues[update_type].get(timeout=timeout)
+
+    def join(self, timeout=None):
+        if threading.current_thread() is not self.thread:
+            self.thread.join(timeout)
+
+    def _run(self):
+        stream = self.sw.stream_msg_resp
+        try:
+            for msg in stream:
+                self._dispatch(msg)
+        except grpc.RpcError as e:
+            if e.code() != grpc.StatusCode.CANCELLED:
+                self.error = e
+        finally:
+            self.done = True
+            self.sw._onStreamDone()
+
+    def _call(self, callback, msg):
+        try:
+            callback(self.sw, msg)
+        except Exception:
+            # A failing callback must not stop the stream
+            traceback.print_exc()
+
+    def _dispatch(self, msg):
+        update_type = msg.WhichOneof('update')
+        self.sw.metrics.inc('p4runtime_stream_messages_total', switch=self.sw.metrics_switch,
+                            type=update_type)
+        if update_type == 'arbitration':
+            # Keeps the primary/backup state of the connection up to date
+            self.sw._onArbitrationMessage(msg)
+        if update_type not in self.queues:
+            update_type = 'other'
+        with self.lock:
+            callbacks = self.callbacks[update_type]
+            if callbacks:
+                for callback in callbacks:
+                    self._call(callback, msg)
+                return
+            if update_type == 'arbitration':
+                return
+            q = self.queues[update_type]
+            while True:
+                try:
+                    q.put_nowait(msg)
+                    return
+                except Full:
+                    try:
+                        q.get_nowait()
+                        self.dropped[update_type] += 1
+                        self.sw.metrics.inc('p4runtime_stream_dropped_total',
+                                            switch=self.sw.metrics_switch, type=update_type)
+                    except Empty:
+                        pass
+
+class GrpcRequestLogger(grpc.UnaryUnaryClientInterceptor,
+                        grpc.UnaryStreamClientInterceptor):
+    """Implementation of a gRPC interceptor that logs request to a file.
+
+    Requests are only queued on the calling thread; a background thread
+    formats them and appends them to the file in batches, so logging never
+    blocks the RPCs. The queue is a ring buffer of `buffer_size` messages:
+    when the writer falls behind, the oldest messages are dropped (and
+    counted in `dropped`). Call flush() to write out everything queued.
+
+    :param binary: write varint length-delimited records (a "<timestamp>
+                   <method>" header followed by the serialized request)
+                   instead of text, see readBinaryLog
+    :param sample_rate: fraction of the requests to log
+    :param max_rate: maximum number of requests logged per second
+    """
+
+    def __init__(self, log_file, binary=False, sample_rate=1.0, max_rate=None,
+                 buffer_size=LOG_BUFFER_SIZE, flush_interval=LOG_FLUSH_INTERVAL):
+        self.log_file = log_file
+        self.binary = binary
+        self.sample_rate = sample_rate
+        self.max_rate = max_rate
+        self.flush_interval = flush_interval
+        self.buffer = deque(maxlen=buffer_size)
+        self.dropped = 0
+        self.skipped = 0
+        self._sampled = 0.0
+        self._tokens = max_rate
+        self._last_refill = monotonic()
+        # Clear content if it exists.
+        self.file = open(self.log_file, 'wb' if binary else 'w')
+        self.write_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        # Set by close(), cuts the wait for more requests short
+        self.closing = threading.Event()
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, daemon=True,
+                                       name='GrpcRequestLogger(%s)' % log_file)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def _accept(self):
+        # Keeps every 1/sample_rate-th message, so that sampling is even
+        self._sampled += self.sample_rate
+        if self._sampled < 1.0:
+            return False
+        self._sampled -= 1.0
+        if self.max_rate is not None:
+            now = monotonic()
+            self._tokens = min(self.max_rate,
+                               self._tokens + (now - self._last_refill) * self.max_rate)
+            self._last_refill = now
+            if self._tokens < 1.0:
+                return False
+            self._tokens -= 1.0
+        return True
+
+    def log_message(self, method_name, body):
+        if self.closed:
+            return
+        if not self._accept():
+            self.skipped += 1
+            return
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append((datetime.utcnow(), method_name, body))
+        self.wakeup.set()
+
+    def _format(self, ts, method_name, body):
+        ts = ts.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+        if self.binary:
+            header = ("%s %s" % (ts, method_name)).encode('utf-8')
+            data = body.SerializeToString()
+            return b''.join((_varint(len(header)), header, _varint(len(data)), data))
+        # Check the size before formatting, so that large messages
+        # (e.g. pipeline configs) are never converted to text
+        size = body.ByteSize()
+        if size < MSG_LOG_MAX_LEN:
+            msg = str(body)
+        else:
+            msg = "Message too long (%d bytes)! Skipping log...\n" % size
+        return "\n[%s] %s\n---\n%s---\n" % (ts, method_name, msg)
+
+    def flush(self):
+        "Writes all the queued messages to the file"
+        with self.write_lock:
+            if self.file.closed:
+                return
+            records = []
+            while self.buffer:
+                records.append(self._format(*self.buffer.popleft()))
+            if records:
+                self.file.write((b'' if self.binary else '').join(records))
+            self.file.flush()
+
+    def _run(self):
+        while not self.closed:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            # Let a burst of requests accumulate into one write
+            self.closing.wait(self.flush_interval)
+            self.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        atexit.unregister(self.close)
+        self.closing.set()
+        self.wakeup.set()
+        self.thread.join()
+        self.flush()
+        with self.write_lock:
+            self.file.close()
+
+    def intercept_unary_unary(self, continuation, client_call_details, request):
+        self.log_message(client_call_details.method, request)
+        return continuation(client_call_details, request)
+
+    def intercept_unary_stream(self, continuation, client_call_details, request):
+        self.log_message(client_call_details.method, request)
+        return continuation(client_call_details, request)
+
+def _varint(value):
+    out = bytearray()
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+def _readVarint(f):
+    value = shift = 0
+    while True:
+        b = f.read(1)
+        if not b:
+            return None
+        value |= (b[0] & 0x7f) << shift
+        if not b[0] & 0x80:
+            return value
+        shift += 7
+
+# Request type of each logged P4Runtime method, to decode binary logs
+LOGGED_REQUEST_TYPES = {
+    '/p4.v1.P4Runtime/Write': p4runtime_pb2.WriteRequest,
+    '/p4.v1.P4Runtime/Read': p4runtime_pb2.ReadRequest,
+    '/p4.v1.P4Runtime/SetForwardingPipelineConfig': p4runtime_pb2.SetForwardingPipelineConfigRequest,
+    '/p4.v1.P4Runtime/GetForwardingPipelineConfig': p4runtime_pb2.GetForwardingPipelineConfigRequest,
+    '/p4.v1.P4Runtime/Capabilities': p4runtime_pb2.CapabilitiesRequest,
+}
+
+def readBinaryLog(log_file):
+    """Yields the (timestamp, method name, request) records of a log written
+    by GrpcRequestLogger(binary=True)"""
+    with open(log_file, 'rb') as f:
+        while True:
+            length = _readVarint(f)
+            if length is None:
+                return
+            ts_date, ts_time, method_name = f.read(length).decode('utf-8').split(' ', 2)
+            data = f.read(_readVarint(f))
+            request = LOGGED_REQUEST_TYPES[method_name]()
+            request.ParseFromString(data)
+            yield ('%s %s' % (ts_date, ts_time), method_name, request)
+
+class IterableQueue(Queue):
+    _sentinel = object()
+
+    def __iter__(self):
+        return iter(self.get, self._sentinel)
+
+    def close(self):
+        self.put(self._sentinel)
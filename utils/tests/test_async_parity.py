@@ -0,0 +1,358 @@
+# Copyright 2017-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Parity tests of AsyncSwitchConnection and SwitchConnection: both clients
+run the same calls against their own FakeP4RuntimeServer, and must return
+the same responses, raise the same errors and end up with the same switch
+and shadow store state.
+
+    cd utils && python3 -m unittest tests.test_async_parity
+"""
+import asyncio
+import os
+import queue
+import shutil
+import tempfile
+import unittest
+
+import google.protobuf.text_format
+import grpc
+from google.protobuf.message import Message
+from p4.config.v1 import p4info_pb2
+from p4.v1 import p4runtime_pb2
+
+from p4runtime_lib import async_switch, benchmark, helper
+from p4runtime_lib.async_switch import AsyncSwitchConnection
+from p4runtime_lib.error_utils import P4RuntimeWriteException
+from p4runtime_lib.fake_server import FakeP4RuntimeServer
+from p4runtime_lib.metrics import MetricsRegistry
+from p4runtime_lib.shadow import ShadowStore
+from p4runtime_lib.switch import SwitchConnection, SwitchConnectionBase
+
+# Calls returning an iterator (an async generator for AsyncSwitchConnection)
+STREAMING_CALLS = ('ReadTableEntries', 'ReadCounters', 'ReadCounterArrays',
+                   'ReadEntities', 'ReadPREEntries')
+
+def normalize(value):
+    "Returns a comparable form of a call result"
+    if isinstance(value, Message):
+        return (type(value).__name__, value.SerializeToString(deterministic=True))
+    if isinstance(value, (list, tuple)):
+        return [normalize(v) for v in value]
+    return value
+
+def describeError(e):
+    "Returns a comparable form of an error raised by a call"
+    if isinstance(e, P4RuntimeWriteException):
+        return ('P4RuntimeWriteException', e.grpc_error.code(),
+                [(idx, normalize(update), p4_error.canonical_code)
+                 for idx, update, p4_error in e.errors])
+    if isinstance(e, grpc.RpcError):
+        return ('RpcError', e.code())
+    return (type(e).__name__, str(e))
+
+def runSync(sw, calls):
+    results = []
+    for name, args, kwargs in calls:
+        try:
+            result = getattr(sw, name)(*args, **kwargs)
+            if name in STREAMING_CALLS:
+                result = list(result)
+            results.append(('ok', normalize(result)))
+        except Exception as e:
+            results.append(('error', describeError(e)))
+    return results
+
+class RecordingStub(object):
+    "Records the requests instead of sending them"
+
+    def __init__(self, is_async):
+        self.is_async = is_async
+        self.requests = []
+
+    def _call(self, request):
+        self.requests.append(request)
+        if not self.is_async:
+            return iter([])
+        async def respond():
+            return None
+        return respond()
+
+    def _stream(self, request):
+        self.requests.append(request)
+        if not self.is_async:
+            return iter([])
+        async def respond():
+            return
+            yield
+        return respond()
+
+    Write = SetForwardingPipelineConfig = _call
+    Read = _stream
+
+def recordingConnection(cls, is_async):
+    sw = cls.__new__(cls)
+    SwitchConnectionBase.__init__(sw, 's1', device_id=3, election_id=(1 << 64) + 5)
+    sw.client_stub = RecordingStub(is_async)
+    sw.buildDeviceConfig = lambda **kwargs: SwitchConnectionBase.buildDeviceConfig(sw)
+    return sw
+
+async def runAsync(sw, calls):
+    results = []
+    for name, args, kwargs in calls:
+        try:
+            if name in STREAMING_CALLS:
+                result = [r async for r in getattr(sw, name)(*args, **kwargs)]
+            else:
+                result = await getattr(sw, name)(*args, **kwargs)
+            results.append(('ok', normalize(result)))
+        except Exception as e:
+            results.append(('error', describeError(e)))
+    return results
+
+
+class AsyncParityTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.workdir = tempfile.mkdtemp(prefix='p4runtime-parity-')
+        cls.p4info_path = os.path.join(cls.workdir, 'parity.p4info.txt')
+        cls.bmv2_json_path = os.path.join(cls.workdir, 'parity.json')
+        with open(cls.p4info_path, 'w') as f:
+            f.write(google.protobuf.text_format.MessageToString(benchmark.buildP4Info()))
+        with open(cls.bmv2_json_path, 'w') as f:
+            f.write('{}')
+        cls.p4info_helper = helper.P4InfoHelper(cls.p4info_path)
+        cls.entries = benchmark.buildEntries(cls.p4info_helper, 3)
+        # grpc.aio binds to the first event loop it runs on, so all the
+        # tests share one
+        cls.loop = asyncio.new_event_loop()
+
+    @classmethod
+    def tearDownClass(cls):
+        # Lets grpc.aio finish the bookkeeping tasks of the closed channels
+        pending = asyncio.all_tasks(cls.loop)
+        for task in pending:
+            task.cancel()
+        if pending:
+            cls.loop.run_until_complete(asyncio.wait(pending))
+        cls.loop.close()
+        shutil.rmtree(cls.workdir, ignore_errors=True)
+
+    def pipeline(self, **kwargs):
+        return ('SetForwardingPipelineConfig', (self.p4info_helper.p4info,),
+                dict(bmv2_json_file_path=self.bmv2_json_path, **kwargs))
+
+    def update(self, update_type, entry):
+        update = p4runtime_pb2.Update(type=update_type)
+        update.entity.table_entry.CopyFrom(entry)
+        return update
+
+    def cloneSession(self, session_id):
+        entry = p4runtime_pb2.PacketReplicationEngineEntry()
+        entry.clone_session_entry.session_id = session_id
+        entry.clone_session_entry.replicas.add(egress_port=1, instance=1)
+        return entry
+
+    def assertParity(self, calls, arbitrate=True):
+        """Runs the calls on a SwitchConnection and on an AsyncSwitchConnection
+        and checks that they give the same results. Returns the results."""
+        with FakeP4RuntimeServer() as server:
+            sw = SwitchConnection(name='sync', address=server.address,
+                                  shadow=ShadowStore(self.p4info_helper),
+                                  metrics=MetricsRegistry())
+            try:
+                prefix = [('MasterArbitrationUpdate', (), {})] if arbitrate else []
+                sync_results = runSync(sw, prefix + calls)
+                sync_shadow = normalize(sw.shadow.tableEntries() + sw.shadow.preEntries())
+            finally:
+                sw.shutdown()
+            sync_state = self.deviceState(server)
+
+        with FakeP4RuntimeServer() as server:
+            async def run():
+                sw = AsyncSwitchConnection(name='async', address=server.address,
+                                           shadow=ShadowStore(self.p4info_helper),
+                                           metrics=MetricsRegistry())
+                try:
+                    prefix = [('MasterArbitrationUpdate', (), {})] if arbitrate else []
+                    results = await runAsync(sw, prefix + calls)
+                    return results, normalize(sw.shadow.tableEntries() + sw.shadow.preEntries())
+                finally:
+                    await sw.shutdown()
+            async_results, async_shadow = self.loop.run_until_complete(run())
+            async_state = self.deviceState(server)
+
+        self.assertEqual(sync_results, async_results)
+        self.assertEqual(sync_shadow, async_shadow)
+        self.assertEqual(sync_state, async_state)
+        return sync_results
+
+    def deviceState(self, server):
+        device = server.device(0)
+        return (device.cookie, sorted(normalize(entry) for _, entry in device.entries.values()))
+
+    def test_requests(self):
+        "Both connection classes send the same requests"
+        table_entry = p4runtime_pb2.TableEntry(table_id=1, priority=10)
+        pre_entry = self.cloneSession(100)
+        calls = [
+            ('SetForwardingPipelineConfig', (p4info_pb2.P4Info(),), {}),
+            ('WriteTableEntry', (table_entry,), {}),
+            ('WritePREEntry', (pre_entry,), {}),
+            ('WriteUpdates', ([self.update(p4runtime_pb2.Update.DELETE, table_entry)],), {}),
+            ('ReadTableEntries', (), {'table_id': 1}),
+            ('ReadCounters', (), {'counter_id': 2, 'index': 7}),
+            ('ReadCounterArrays', ([2, 3],), {}),
+            ('ReadPREEntries', (), {}),
+            ('ReadEntities', ([table_entry, pre_entry],), {}),
+        ]
+        sync_sw = recordingConnection(SwitchConnection, False)
+        runSync(sync_sw, calls)
+        async_sw = recordingConnection(AsyncSwitchConnection, True)
+        self.loop.run_until_complete(runAsync(async_sw, calls))
+
+        self.assertEqual(len(sync_sw.client_stub.requests), len(calls))
+        self.assertEqual(sync_sw.client_stub.requests, async_sw.client_stub.requests)
+        self.assertEqual(sync_sw._arbitrationRequest(), async_sw._arbitrationRequest())
+
+    def test_async_shutdown(self):
+        "shutdown() can be called again, and forgets the connection"
+        with FakeP4RuntimeServer() as server:
+            async def run():
+                sw = AsyncSwitchConnection(name='async', address=server.address,
+                                           metrics=MetricsRegistry())
+                self.assertIn(sw, async_switch.async_connections)
+                await sw.shutdown()
+                await sw.shutdown()
+                await async_switch.ShutdownAllAsyncSwitchConnections()
+                return sw
+            sw = self.loop.run_until_complete(run())
+        self.assertTrue(sw.closed)
+        self.assertNotIn(sw, async_switch.async_connections)
+
+    def test_pipeline(self):
+        results = self.assertParity([
+            ('GetPipelineCookie', (), {}),
+            self.pipeline(),
+            ('GetPipelineCookie', (), {}),
+            self.pipeline(skip_unchanged=True),
+        ])
+        self.assertEqual(results[1], ('ok', None))
+        self.assertEqual(results[4], ('ok', False))
+
+    def test_write_and_read(self):
+        e0, e1, e2 = self.entries
+        session = self.cloneSession(100)
+        results = self.assertParity([
+            self.pipeline(),
+            ('WriteTableEntry', (e0,), {}),
+            ('WriteUpdates', ([self.update(p4runtime_pb2.Update.INSERT, e1),
+                               self.update(p4runtime_pb2.Update.INSERT, e2)],), {}),
+            ('WritePREEntry', (session,), {}),
+            ('ReadTableEntries', (), {}),
+            ('ReadTableEntries', (), {'table_id': e0.table_id}),
+            ('ReadEntities', ([e1, session],), {}),
+            ('ReadPREEntries', (), {}),
+            ('WriteUpdates', ([self.update(p4runtime_pb2.Update.DELETE, e1)],), {}),
+            ('ReadTableEntries', (), {}),
+        ])
+        self.assertTrue(all(status == 'ok' for status, _ in results), results)
+
+    def test_pipeline_clears_shadow(self):
+        results = self.assertParity([
+            self.pipeline(),
+            ('WriteTableEntry', (self.entries[0],), {}),
+            self.pipeline(skip_unchanged=True),
+            self.pipeline(),
+            ('ReadTableEntries', (), {}),
+        ])
+        self.assertEqual(results[3:], [('ok', False), ('ok', True),
+                                       ('ok', [('ReadResponse', b'')])])
+
+    def test_write_errors(self):
+        e0, e1, e2 = self.entries
+        results = self.assertParity([
+            self.pipeline(),
+            ('WriteTableEntry', (e0,), {}),
+            # Duplicate single insert: the RpcError is not mapped
+            ('WriteTableEntry', (e0,), {}),
+            # Partially applied batch: e1 is inserted, e0 and the missing e2
+            # are reported per update
+            ('WriteUpdates', ([self.update(p4runtime_pb2.Update.INSERT, e0),
+                               self.update(p4runtime_pb2.Update.INSERT, e1),
+                               self.update(p4runtime_pb2.Update.DELETE, e2)],), {}),
+            ('ReadTableEntries', (), {}),
+        ])
+        self.assertEqual(results[3], ('error', ('RpcError', grpc.StatusCode.UNKNOWN)))
+        status, error = results[4]
+        self.assertEqual(status, 'error')
+        self.assertEqual(error[0], 'P4RuntimeWriteException')
+        self.assertEqual([(idx, code) for idx, _, code in error[2]], [(0, 6), (2, 5)])
+
+    def test_not_primary(self):
+        results = self.assertParity([
+            ('WriteTableEntry', (self.entries[0],), {}),
+            ('ReadTableEntries', (), {}),
+        ], arbitrate=False)
+        self.assertEqual(results[0], ('error', ('RpcError', grpc.StatusCode.PERMISSION_DENIED)))
+
+    def test_stream_arbitration(self):
+        """A client with a higher election id takes over: both clients are
+        told on their stream, and become backups"""
+        def takeover(server):
+            other = SwitchConnection(name='other', address=server.address, election_id=10,
+                                     metrics=MetricsRegistry())
+            other.MasterArbitrationUpdate()
+            return other
+
+        with FakeP4RuntimeServer() as server:
+            sw = SwitchConnection(name='sync', address=server.address, metrics=MetricsRegistry())
+            updates = queue.Queue()
+            try:
+                first = sw.MasterArbitrationUpdate()
+                was_primary = sw.is_primary
+                sw.StartStreamDispatcher().on('arbitration', lambda sw, msg: updates.put(msg))
+                other = takeover(server)
+                msg = updates.get(timeout=5)
+                sync_result = (normalize(first), was_primary, normalize(msg),
+                               sw.is_primary, sw.primary_election_id)
+                other.shutdown()
+            finally:
+                sw.shutdown()
+
+        with FakeP4RuntimeServer() as server:
+            async def run():
+                sw = AsyncSwitchConnection(name='async', address=server.address,
+                                           metrics=MetricsRegistry())
+                try:
+                    first = await sw.MasterArbitrationUpdate()
+                    was_primary = sw.is_primary
+                    other = await asyncio.get_running_loop().run_in_executor(None, takeover, server)
+                    messages = sw.StreamMessages()
+                    msg = await asyncio.wait_for(messages.__anext__(), 5)
+                    await messages.aclose()
+                    other.shutdown()
+                    return (normalize(first), was_primary, normalize(msg),
+                            sw.is_primary, sw.primary_election_id)
+                finally:
+                    await sw.shutdown()
+            async_result = self.loop.run_until_complete(run())
+
+        self.assertEqual(sync_result, async_result)
+        self.assertEqual(sync_result[1], True)
+        self.assertEqual(sync_result[3:], (False, 10))
+
+if __name__ == '__main__':
+    unittest.main()
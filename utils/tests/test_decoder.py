@@ -0,0 +1,89 @@
+# Copyright 2017-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Tests of TableEntryDecoder against a FakeP4RuntimeServer.
+
+    cd utils && python3 -m unittest tests.test_decoder
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import google.protobuf.text_format
+from p4.config.v1 import p4info_pb2
+
+from p4runtime_lib import decoder, helper
+from p4runtime_lib.fake_server import FakeP4RuntimeServer
+from p4runtime_lib.metrics import MetricsRegistry
+from p4runtime_lib.switch import SwitchConnection
+
+
+def buildP4Info():
+    "A table matching on 'port' whose action also takes a 'port' param"
+    p4info = p4info_pb2.P4Info()
+    table = p4info.tables.add()
+    table.preamble.id = 1
+    table.preamble.name = 'MyIngress.port_table'
+    match_field = table.match_fields.add()
+    match_field.id = 1
+    match_field.name = 'port'
+    match_field.bitwidth = 9
+    match_field.match_type = p4info_pb2.MatchField.EXACT
+    action = p4info.actions.add()
+    action.preamble.id = 2
+    action.preamble.name = 'MyIngress.forward'
+    param = action.params.add()
+    param.id = 1
+    param.name = 'port'
+    param.bitwidth = 9
+    table.action_refs.add().id = action.preamble.id
+    return p4info
+
+
+@unittest.skipIf(decoder.np is None, "NumPy is not installed")
+class TableEntryDecoderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix='p4runtime-decoder-')
+        self.server = FakeP4RuntimeServer().start()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def test_param_named_like_match_field(self):
+        "Match fields and action params of the same name get their own columns"
+        p4info_path = os.path.join(self.workdir, 'switch.p4info.txt')
+        with open(p4info_path, 'w') as f:
+            f.write(google.protobuf.text_format.MessageToString(buildP4Info()))
+        p4info_helper = helper.P4InfoHelper(p4info_path)
+        sw = SwitchConnection(name='s1', address=self.server.address, metrics=MetricsRegistry())
+        try:
+            sw.MasterArbitrationUpdate()
+            for port in (1, 2, 3):
+                sw.WriteTableEntry(p4info_helper.buildTableEntry(
+                    table_name='MyIngress.port_table', match_fields={'port': port},
+                    action_name='MyIngress.forward', action_params={'port': port + 10}))
+            batches = list(decoder.TableEntryDecoder(p4info_helper).readBatches(
+                sw, 'MyIngress.port_table', batch_size=2))
+        finally:
+            sw.shutdown()
+        self.assertEqual([len(b['port']) for b in batches], [2, 1])
+        self.assertEqual(list(batches[0]), ['port', 'action', 'param.port', 'priority'])
+        rows = sorted((int(m), int(p)) for b in batches for m, p in zip(b['port'], b['param.port']))
+        self.assertEqual(rows, [(1, 11), (2, 12), (3, 13)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+# Copyright 2017-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Tests of p4runtime_lib.reconcile against a FakeP4RuntimeServer.
+
+    cd utils && python3 -m unittest tests.test_reconcile
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import google.protobuf.text_format
+
+from p4runtime_lib import benchmark, helper, reconcile
+from p4runtime_lib.fake_server import FakeP4RuntimeServer
+from p4runtime_lib.metrics import MetricsRegistry
+from p4runtime_lib.reconcile import DELETE, INSERT, MODIFY
+from p4runtime_lib.switch import SwitchConnection, entityKey
+
+
+def describe(diff):
+    "Returns a comparable form of a diff, ignoring the order of the updates"
+    return sorted((update_type, entity.SerializeToString()) for update_type, entity in diff)
+
+
+class ReconcileTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.workdir = tempfile.mkdtemp(prefix='p4runtime-reconcile-')
+        p4info_path = os.path.join(cls.workdir, 'reconcile.p4info.txt')
+        with open(p4info_path, 'w') as f:
+            f.write(google.protobuf.text_format.MessageToString(benchmark.buildP4Info()))
+        cls.p4info_helper = helper.P4InfoHelper(p4info_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.workdir, ignore_errors=True)
+
+    def setUp(self):
+        self.server = FakeP4RuntimeServer().start()
+        self.sw = SwitchConnection(name='s1', address=self.server.address,
+                                   metrics=MetricsRegistry())
+        self.sw.MasterArbitrationUpdate()
+
+    def tearDown(self):
+        self.sw.shutdown()
+        self.server.stop()
+
+    def entry(self, i, port=None):
+        rule = benchmark.rule(i)
+        params = dict(rule['action_params'])
+        if port is not None:
+            params['port'] = port
+        return self.p4info_helper.buildTableEntry(
+            table_name=rule['table'],
+            match_fields={'hdr.ipv4.dstAddr': (benchmark.address(i), 32)},
+            action_name=rule['action_name'], action_params=params)
+
+    def deviceEntries(self):
+        return sorted(entry.SerializeToString()
+                      for _, entry in self.server.device(0).entries.values())
+
+    def write(self, entries):
+        with self.sw.WriteBatch() as batch:
+            for entry in entries:
+                batch.Insert(entry)
+
+    def test_diff(self):
+        e0, e1, e2, e3 = [self.entry(i) for i in range(4)]
+        e1_changed = self.entry(1, port=99)
+        current = dict((entityKey(e), e) for e in (e0, e1, e3))
+        desired = [e0, e1_changed, e2]
+        expected = [(DELETE, e3), (MODIFY, e1_changed), (INSERT, e2)]
+
+        diff = reconcile.diffEntities(desired, current)
+        self.assertEqual(describe(diff), describe(expected))
+        # Deletes first, then modifies, then inserts
+        self.assertEqual([update_type for update_type, _ in diff], [DELETE, MODIFY, INSERT])
+        self.assertEqual(describe(reconcile.streamDiff(iter(desired), current)),
+                         describe(expected))
+        self.assertEqual(describe(reconcile.diffEntities(desired, current, delete=False)),
+                         describe(expected[1:]))
+
+    def test_stream_diff_duplicates(self):
+        "The last of the desired entities with the same key wins"
+        e0, e1 = self.entry(0), self.entry(1)
+        e0_changed = self.entry(0, port=99)
+        self.assertEqual(describe(reconcile.streamDiff(iter([e0, e1, e0_changed]), {})),
+                         describe([(INSERT, e0), (INSERT, e1), (MODIFY, e0_changed)]))
+        current = {entityKey(e0): e0}
+        self.assertEqual(describe(reconcile.streamDiff(iter([e0_changed, e0]), current)), [])
+
+    def test_reconcile(self):
+        self.write([self.entry(i) for i in range(10)])
+        desired = [self.entry(i) for i in range(5)] + \
+                  [self.entry(i, port=99) for i in range(5, 8)] + \
+                  [self.entry(i) for i in range(20, 22)]
+
+        dry_diff = reconcile.reconcile(self.sw, desired, dry_run=True)
+        self.assertEqual(len(self.deviceEntries()), 10)
+        diff = reconcile.reconcile(self.sw, desired)
+        self.assertEqual(describe(diff), describe(dry_diff))
+        self.assertEqual(sorted(t for t, _ in diff), [INSERT] * 2 + [MODIFY] * 3 + [DELETE] * 2)
+        self.assertEqual(self.deviceEntries(), sorted(e.SerializeToString() for e in desired))
+        self.assertEqual(reconcile.reconcile(self.sw, desired), [])
+
+    def test_stream_diff_applied(self):
+        self.write([self.entry(i) for i in range(10)])
+        desired = [self.entry(i, port=99) for i in range(5)] + [self.entry(i) for i in range(20, 25)]
+        reconcile.applyDiff(self.sw, reconcile.streamDiff(
+            iter(desired), reconcile.readEntities(self.sw)), max_updates=3)
+        self.assertEqual(self.deviceEntries(), sorted(e.SerializeToString() for e in desired))
+
+    def test_deletes_sent_first(self):
+        "The deletes go in their own WriteRequests, before the other updates"
+        self.write([self.entry(i) for i in range(5)])
+        requests = []
+        write_updates = self.sw.WriteUpdates
+        def recordingWriteUpdates(updates, **kwargs):
+            requests.append([update.type for update in updates])
+            return write_updates(updates, **kwargs)
+        self.sw.WriteUpdates = recordingWriteUpdates
+
+        desired = [self.entry(0, port=99)] + [self.entry(i) for i in range(10, 13)]
+        reconcile.applyDiff(self.sw, reconcile.diffEntities(
+            desired, reconcile.readEntities(self.sw)), max_updates=3)
+        self.assertEqual(requests, [[DELETE] * 3, [DELETE], [MODIFY, INSERT, INSERT], [INSERT]])
+        self.assertEqual(self.deviceEntries(), sorted(e.SerializeToString() for e in desired))
+
+if __name__ == '__main__':
+    unittest.main()
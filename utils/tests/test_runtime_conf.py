@@ -0,0 +1,129 @@
+# Copyright 2017-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Tests of the streaming runtime JSON parser, p4runtime_lib.runtime_conf.
+
+    cd utils && python3 -m unittest tests.test_runtime_conf
+"""
+import io
+import json
+import unittest
+from unittest import mock
+
+from p4runtime_lib import runtime_conf
+from p4runtime_lib.runtime_conf import RULE_CLASSES, loadRuntimeConf
+
+CONF = {
+    "target": "bmv2",
+    "p4info": "build/basic.p4.p4info.txt",
+    "bmv2_json": "build/basic.json",
+    "table_entries": [
+        {
+            "table": "MyIngress.ipv4_lpm",
+            "default_action": True,
+            "action_name": "MyIngress.drop",
+            "action_params": {}
+        },
+        {
+            "table": "MyIngress.ipv4_lpm",
+            "match": {"hdr.ipv4.dstAddr": ["10.0.1.1", 32]},
+            "action_name": "MyIngress.ipv4_forward",
+            "action_params": {"dstAddr": "08:00:00:00:01:11", "port": 1234567}
+        },
+        {
+            "table": "MyIngress.acl",
+            "match": {"hdr.ipv4.srcAddr": ["10.0.0.0", "255.0.0.0"]},
+            "priority": 1000,
+            "action_name": "MyIngress.drop",
+            "action_params": {}
+        }
+    ],
+    "multicast_group_entries": [
+        {"multicast_group_id": 1,
+         "replicas": [{"egress_port": 1, "instance": 1}, {"egress_port": 2, "instance": 1}]}
+    ],
+    "clone_session_entries": [
+        {"clone_session_id": 100, "replicas": [{"egress_port": 3, "instance": 1}],
+         "packet_length_bytes": 128}
+    ],
+    "extra": {"nested": [1, 2.5, "three", None]}
+}
+
+def ruleFields(rule):
+    return (type(rule).__name__,) + tuple(getattr(rule, name) for name in rule.__slots__)
+
+def normalize(conf):
+    "Returns a comparable form of a loaded runtime configuration"
+    return dict((key, [ruleFields(rule) for rule in value] if key in RULE_CLASSES else value)
+                for key, value in conf.items())
+
+def expected(conf):
+    "Returns the configuration the streaming parser must produce"
+    return normalize(dict(
+        (key, [RULE_CLASSES[key].fromJson(rule) for rule in value] if key in RULE_CLASSES else value)
+        for key, value in conf.items()))
+
+
+class RuntimeConfTest(unittest.TestCase):
+
+    def load(self, text, read_size=runtime_conf.READ_SIZE):
+        with mock.patch.object(runtime_conf, 'READ_SIZE', read_size):
+            return loadRuntimeConf(io.StringIO(text))
+
+    def test_chunk_boundaries(self):
+        "Values split across reads (numbers, strings, rules) are parsed whole"
+        for indent in (None, 2):
+            text = json.dumps(CONF, indent=indent)
+            for read_size in (1, 2, 3, 7, 64, len(text), 1 << 16):
+                self.assertEqual(normalize(self.load(text, read_size)), expected(CONF),
+                                 (indent, read_size))
+
+    def test_empty(self):
+        self.assertEqual(self.load('{}'), {})
+        self.assertEqual(self.load(' \n{ }\n', read_size=1), {})
+        self.assertEqual(self.load('{"table_entries": [ ]}', read_size=2),
+                         {'table_entries': []})
+
+    def test_rule_objects(self):
+        conf = self.load(json.dumps(CONF), read_size=5)
+        default, route, acl = conf['table_entries']
+        self.assertTrue(default.default_action)
+        self.assertEqual(route.match, (('hdr.ipv4.dstAddr', ('10.0.1.1', 32)),))
+        self.assertEqual(dict(route.action_params)['port'], 1234567)
+        self.assertEqual(acl.priority, 1000)
+        self.assertEqual(str(conf['clone_session_entries'][0]),
+                         'Clone Session 100 => (3) (128B)')
+
+    def test_malformed(self):
+        text = json.dumps(CONF)
+        bad_inputs = [
+            '',
+            '[]',
+            text[:len(text) // 2],
+            text[:-1],
+            text.replace('}, {', '} {', 1),
+            text.replace('"target": "bmv2",', '"target" "bmv2",'),
+            '{"table_entries": [{"table": "t", "action_name": "a", "action_params": {}},]}',
+        ]
+        for bad in bad_inputs:
+            for read_size in (1, 16, 1 << 16):
+                with self.assertRaises(ValueError, msg=(bad[:40], read_size)):
+                    self.load(bad, read_size)
+
+    def test_missing_rule_key(self):
+        with self.assertRaises(KeyError):
+            self.load('{"table_entries": [{"match": {}}]}')
+
+if __name__ == '__main__':
+    unittest.main()
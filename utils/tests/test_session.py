@@ -0,0 +1,146 @@
+# Copyright 2017-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Tests of SwitchSession against a FakeP4RuntimeServer.
+
+    cd utils && python3 -m unittest tests.test_session
+"""
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import google.protobuf.text_format
+import grpc
+
+from p4runtime_lib import benchmark, helper, reconcile
+from p4runtime_lib.fake_server import FakeP4RuntimeServer
+from p4runtime_lib.metrics import MetricsRegistry
+from p4runtime_lib.session import SwitchSession
+from p4runtime_lib.shadow import ShadowStore
+from p4runtime_lib.switch import SwitchConnection
+
+# Seconds waited for the sessions to react
+TIMEOUT = 10
+
+
+class InternalError(grpc.RpcError):
+
+    def code(self):
+        return grpc.StatusCode.INTERNAL
+
+
+class SwitchSessionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix='p4runtime-session-')
+        self.server = FakeP4RuntimeServer().start()
+        p4info_path = os.path.join(self.workdir, 'switch.p4info.txt')
+        with open(p4info_path, 'w') as f:
+            f.write(google.protobuf.text_format.MessageToString(benchmark.buildP4Info()))
+        self.bmv2_json_path = os.path.join(self.workdir, 'switch.json')
+        with open(self.bmv2_json_path, 'w') as f:
+            f.write('{}')
+        self.p4info_helper = helper.P4InfoHelper(p4info_path)
+        self.entries = benchmark.buildEntries(self.p4info_helper, 3)
+        self.sessions = []
+
+    def tearDown(self):
+        for session in self.sessions:
+            session.close()
+            session.sw.shutdown()
+        self.server.stop()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def start(self, election_id, shadow=True, **kwargs):
+        sw = SwitchConnection(name='s1', address=self.server.address, election_id=election_id,
+                              shadow=ShadowStore(self.p4info_helper) if shadow else None,
+                              metrics=MetricsRegistry())
+        session = SwitchSession(sw, initial_backoff=0.05, **kwargs)
+        self.sessions.append(session)
+        return session.start()
+
+    def leave(self, session):
+        session.close()
+        session.sw.shutdown()
+        self.sessions.remove(session)
+
+    def test_recovery_after_restart(self):
+        "A restarted switch gets the pipeline and the recorded entries back"
+        recovered = threading.Event()
+        pipeline = dict(p4info=self.p4info_helper.p4info,
+                        bmv2_json_file_path=self.bmv2_json_path)
+        session = self.start(1, pipeline=pipeline, on_recovered=lambda s: recovered.set())
+        self.assertTrue(session.isPrimary())
+        session.sw.SetForwardingPipelineConfig(**pipeline)
+        for entry in self.entries:
+            session.call(session.sw.WriteTableEntry, entry)
+
+        # Restarted on the same port, without any state
+        address = self.server.address
+        self.server.stop()
+        self.server = FakeP4RuntimeServer(address=address).start()
+        self.assertTrue(recovered.wait(TIMEOUT))
+
+        self.assertEqual(len(self.server.device(0).entries), 3)
+        self.assertEqual(session.sw.shadow.verify(session.sw), [])
+        stats = session.stats()
+        self.assertEqual(stats['outages'], 1)
+        self.assertEqual(stats['pipeline_pushes'], 1)
+        self.assertEqual(stats['replayed_updates'], 3)
+        self.assertTrue(stats['up'] and stats['primary'])
+
+    def test_takeover(self):
+        "A backup takes over with the entries the primary wrote"
+        took_over = threading.Event()
+        primary = self.start(2)
+        backup = self.start(1, on_primary=lambda s: took_over.set())
+        self.assertTrue(primary.isPrimary())
+        self.assertFalse(backup.isPrimary())
+        for entry in self.entries:
+            primary.sw.WriteTableEntry(entry)
+
+        self.leave(primary)
+        self.assertTrue(took_over.wait(TIMEOUT))
+        self.assertTrue(backup.isPrimary())
+        self.assertEqual(len(backup.sw.shadow), 3)
+        self.assertEqual(backup.stats()['takeovers'], 1)
+        # The switch now takes the backup's writes
+        backup.sw.WriteTableEntry(benchmark.buildEntries(self.p4info_helper, 4)[3])
+        self.assertEqual(len(self.server.device(0).entries), 4)
+
+    def test_failed_takeover_retried(self):
+        "A takeover failing while the stream stays up is retried"
+        primary = self.start(2)
+        backup = self.start(1, shadow=False, desired=self.entries)
+        read_entities = reconcile.readEntities
+        failures = []
+
+        def failOnce(sw):
+            if not failures:
+                failures.append(sw)
+                raise InternalError()
+            return read_entities(sw)
+
+        with mock.patch.object(reconcile, 'readEntities', failOnce):
+            self.leave(primary)
+            self.assertTrue(backup.waitPrimary(TIMEOUT))
+        self.assertEqual(len(failures), 1)
+        self.assertTrue(backup.isUp())
+        self.assertEqual(len(self.server.device(0).entries), 3)
+
+if __name__ == '__main__':
+    unittest.main()
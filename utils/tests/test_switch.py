@@ -0,0 +1,105 @@
+# Copyright 2017-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Tests of SwitchConnection against a FakeP4RuntimeServer.
+
+    cd utils && python3 -m unittest tests.test_switch
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import google.protobuf.text_format
+
+from p4runtime_lib import benchmark, helper
+from p4runtime_lib.fake_server import FakeP4RuntimeServer
+from p4runtime_lib.metrics import MetricsRegistry
+from p4runtime_lib.shadow import ShadowStore
+from p4runtime_lib.switch import GrpcRequestLogger, SwitchConnection
+
+
+class SwitchConnectionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix='p4runtime-switch-')
+        self.server = FakeP4RuntimeServer().start()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def connect(self, name, **kwargs):
+        return SwitchConnection(name=name, address=self.server.address,
+                                metrics=MetricsRegistry(), **kwargs)
+
+    def test_shared_request_logger(self):
+        "A logger given to several connections outlives their shutdown"
+        log_path = os.path.join(self.workdir, 'requests.txt')
+        logger = GrpcRequestLogger(log_path)
+        s1 = self.connect('s1', proto_dump_file=logger)
+        s2 = self.connect('s2', proto_dump_file=logger)
+        s1.MasterArbitrationUpdate()
+        s1.shutdown()
+        self.assertFalse(logger.closed)
+        s2.GetPipelineCookie()
+        s2.shutdown()
+        self.assertFalse(logger.closed)
+        logger.close()
+        with open(log_path) as f:
+            self.assertIn('GetForwardingPipelineConfig', f.read())
+
+    def test_pipeline_push_clears_shadow(self):
+        "The shadow store forgets the entries a new pipeline removed"
+        p4info_path = os.path.join(self.workdir, 'switch.p4info.txt')
+        with open(p4info_path, 'w') as f:
+            f.write(google.protobuf.text_format.MessageToString(benchmark.buildP4Info()))
+        bmv2_json_path = os.path.join(self.workdir, 'switch.json')
+        with open(bmv2_json_path, 'w') as f:
+            f.write('{}')
+        p4info_helper = helper.P4InfoHelper(p4info_path)
+        entry = benchmark.buildEntries(p4info_helper, 1)[0]
+        sw = self.connect('s1', shadow=ShadowStore(p4info_helper))
+        try:
+            sw.MasterArbitrationUpdate()
+            self.assertTrue(sw.SetForwardingPipelineConfig(
+                p4info_helper.p4info, bmv2_json_file_path=bmv2_json_path))
+            sw.WriteTableEntry(entry)
+            self.assertEqual(len(sw.shadow), 1)
+
+            # Skipped and reconciled pushes keep the entries
+            self.assertFalse(sw.SetForwardingPipelineConfig(
+                p4info_helper.p4info, bmv2_json_file_path=bmv2_json_path, skip_unchanged=True))
+            self.assertTrue(sw.SetForwardingPipelineConfig(
+                p4info_helper.p4info, bmv2_json_file_path=bmv2_json_path,
+                skip_unchanged=True, reconcile=True))
+            self.assertEqual(len(sw.shadow), 1)
+            self.assertEqual(len(self.server.device(0).entries), 1)
+
+            self.assertTrue(sw.SetForwardingPipelineConfig(
+                p4info_helper.p4info, bmv2_json_file_path=bmv2_json_path))
+            self.assertEqual(len(self.server.device(0).entries), 0)
+            self.assertEqual(len(sw.shadow), 0)
+            self.assertEqual(sw.shadow.verify(sw), [])
+        finally:
+            sw.shutdown()
+
+    def test_owned_request_logger(self):
+        "A logger created from a path is closed with its connection"
+        sw = self.connect('s1', proto_dump_file=os.path.join(self.workdir, 'requests.txt'))
+        sw.shutdown()
+        self.assertTrue(sw.request_logger.closed)
+
+if __name__ == '__main__':
+    unittest.main()